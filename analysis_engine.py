@@ -1,128 +1,176 @@
-import requests
-import json
-import google.generativeai as genai
-import re
+import os
 import time
+import google.generativeai as genai
+from gemini_scheduler import GeminiBatchScheduler
+from llm_json import SENTIMENT_LABELS, count as count_parse_event, parse_labeled_items
+from news_client import NewsApiError, get_default_client
+from prompt_packer import estimate_tokens, get_default_packer
+from sentiment_cache import classify_with_cache
 
 def get_news_from_api(keyword, api_key):
     """
-    ฟังก์ชันนี้จะดึงข้อมูลข่าวโดยตรงผ่าน NewsAPI
+    ฟังก์ชันนี้จะดึงข้อมูลข่าวโดยตรงผ่าน NewsAPI (ผ่าน NewsApiClient ที่ใช้ร่วมกัน)
     และคืนค่าเป็น list ของ dictionary ที่มีทั้ง 'title' และ 'url'
     """
-    url = (
-        'https://newsapi.org/v2/everything?'
-        f'q={keyword}&'
-        'language=th&'
-        'sortBy=publishedAt&'
-        f'apiKey={api_key}'
-    )
     print(f"Engine: Fetching data for keyword: '{keyword}'...")
 
 
     try:
-        response = requests.get(url)
-        data = response.json()
-
-
-        if data['status'] == 'ok':
-            articles_raw = data.get('articles', [])
-            articles = [
-                {'title': article['title'], 'url': article['url']}
-                for article in articles_raw if article.get('title') and article.get('url')
-            ]
-            print(f"Engine: Fetch successful. Got {len(articles)} articles.")
-            return articles
-        else:
-            print(f"Engine: API Error: {data.get('message')}")
-            return []
+        articles_raw = get_default_client(api_key).fetch_articles(keyword)
+        articles = [
+            {'title': article['title'], 'url': article['url']}
+            for article in articles_raw if article.get('title') and article.get('url')
+        ]
+        print(f"Engine: Fetch successful. Got {len(articles)} articles.")
+        return articles
 
 
+    except NewsApiError as e:
+        print(f"Engine: API Error: {e}")
+        return []
     except Exception as e:
         print(f"Engine: Connection error: {e}")
         return []
 
 
-def analyze_sentiment_with_gemini(articles, model):
-    """
-    ฟังก์ชันวิเคราะห์ความรู้สึกด้วย Gemini API ที่มีการแบ่งข้อมูลเป็นชุดเล็กๆ (Batching)
-    """
-    print("\nEngine: Sending data to Gemini AI for analysis...")
-
-
-    if not articles:
-        return []
-   
-    # ===== บรรทัดที่แก้ไข: จำกัดจำนวนข่าวที่จะวิเคราะห์ =====
-    # เพื่อป้องกัน Timeout เราจะวิเคราะห์แค่ 20 ข่าวล่าสุดเท่านั้น
-    articles_to_analyze = articles[:20]
-    print(f"   -> Analyzing the latest {len(articles_to_analyze)} articles to prevent timeout.")
-    # ===================================================
+# จำนวนรอบที่ส่งเฉพาะข่าวที่หายไปจากคำตอบของ Gemini กลับไปวิเคราะห์ใหม่
+DEFAULT_REREQUEST_ATTEMPTS = 1
+# เปลี่ยนเวอร์ชันทุกครั้งที่แก้ prompt เพื่อไม่ให้ใช้ผลจากแคชของ prompt เก่า
+PROMPT_VERSION = 'v2'
 
+CLASSIFICATION_PROMPT = """Classify the sentiment of each Thai news headline toward the brand's public image (PR context).
+Return one item per headline: "i" is the headline number, "s" is POSITIVE, NEGATIVE or NEUTRAL.
+Headlines:
+{headlines}"""
 
-    BATCH_SIZE = 20
-    all_results_with_sentiment = []
-   
-    for i in range(0, len(articles_to_analyze), BATCH_SIZE):
-        batch = articles_to_analyze[i:i + BATCH_SIZE]
-        print(f"...Processing batch {i//BATCH_SIZE + 1}")
+# ให้ Gemini ตอบเป็น JSON ตาม schema (ไม่มีข้อความนำหรือ code fence) และใช้ key สั้นเพื่อลด output token
+RESPONSE_SCHEMA = {
+    'type': 'ARRAY',
+    'items': {
+        'type': 'OBJECT',
+        'properties': {
+            'i': {'type': 'INTEGER'},
+            's': {'type': 'STRING', 'format': 'enum', 'enum': sorted(SENTIMENT_LABELS)},
+        },
+        'required': ['i', 's'],
+    },
+}
+GENERATION_CONFIG = {'response_mime_type': 'application/json', 'response_schema': RESPONSE_SCHEMA}
+# token ของ prompt ที่ไม่ขึ้นกับหัวข้อข่าว + schema + วงเล็บของคำตอบ
+PROMPT_OVERHEAD_TOKENS = estimate_tokens(CLASSIFICATION_PROMPT.format(headlines='')) + 40
 
+SAFETY_SETTINGS = {
+    'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE',
+    'HARM_CATEGORY_HATE_SPEECH': 'BLOCK_NONE',
+    'HARM_CATEGORY_SEXUALLY_EXPLICIT': 'BLOCK_NONE',
+    'HARM_CATEGORY_DANGEROUS_CONTENT': 'BLOCK_NONE',
+}
 
-        headlines_text = "\n".join([f"{idx+1}. {article['title']}" for idx, article in enumerate(batch)])
 
+def _model_name(model):
+    return getattr(model, 'model_name', None) or type(model).__name__
 
-        prompt = f"""
-        Analyze the sentiment of the following Thai news headlines, considering the context of public relations and brand image.
-        Classify each headline as only 'POSITIVE', 'NEGATIVE', or 'NEUTRAL'.
 
+def build_classification_prompt(batch):
+    return CLASSIFICATION_PROMPT.format(headlines="\n".join(f"{idx+1}. {title}" for idx, title in enumerate(batch)))
 
-        Please respond ONLY with a valid JSON Array in this format: [{{"id": 1, "sentiment": "SENTIMENT_LABEL"}}, {{"id": 2, "sentiment": "SENTIMENT_LABEL"}}, ...]
 
+def plan_batches(titles, packer=None):
+    """แบ่งหัวข้อข่าวเป็น batch ตามงบ token ของ PromptPacker คืนค่า list ของ index ใน titles"""
+    return (packer or get_default_packer()).pack(titles, PROMPT_OVERHEAD_TOKENS)
 
-        Headlines to analyze:
-        {headlines_text}
-        """
 
+def _classify_batch(batch, model, packer):
+    """
+    ส่งหัวข้อข่าว 1 ชุดไปให้ Gemini วิเคราะห์ และคืนค่า list ของ sentiment ตามลำดับข่าวในชุด
+    รายการที่หายไปหรือไม่ถูกต้องในคำตอบจะได้ None (ผู้เรียกจะส่งไปวิเคราะห์ใหม่เฉพาะข่าวเหล่านั้น)
+    ถ้าเกิดข้อผิดพลาดหรือไม่มีรายการใดใช้ได้เลย จะโยน exception ออกไปให้ตัวจัดคิวตัดสินใจ (เช่น ลองใหม่เมื่อโดน 429)
+    """
+    prompt = build_classification_prompt(batch)
+    estimated_tokens = PROMPT_OVERHEAD_TOKENS + sum(packer.item_tokens(title) for title in batch)
 
-        try:
-            safety_settings = {
-                'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE',
-                'HARM_CATEGORY_HATE_SPEECH': 'BLOCK_NONE',
-                'HARM_CATEGORY_SEXUALLY_EXPLICIT': 'BLOCK_NONE',
-                'HARM_CATEGORY_DANGEROUS_CONTENT': 'BLOCK_NONE',
-            }
-            response = model.generate_content(prompt, safety_settings=safety_settings)
-           
-            match = re.search(r'\[.*\]', response.text, re.DOTALL)
-            if match:
-                json_string = match.group(0)
-                analysis_results_batch = json.loads(json_string)
-               
-                sentiment_map = {item['id']: item['sentiment'] for item in analysis_results_batch}
+    started = time.perf_counter()
+    response = model.generate_content(prompt, safety_settings=SAFETY_SETTINGS, generation_config=GENERATION_CONFIG)
+    packer.record(len(batch), estimated_tokens, time.perf_counter() - started, getattr(response, 'usage_metadata', None))
 
+    sentiment_map = parse_labeled_items(response.text, range(1, len(batch) + 1), label_key='s', id_key='i')
+    if not sentiment_map:
+        raise ValueError("No valid JSON items found in AI response")
+    return [sentiment_map.get(idx + 1) for idx in range(len(batch))]
 
-                for idx, article in enumerate(batch):
-                    sentiment = sentiment_map.get(idx + 1, "NEUTRAL")
-                    all_results_with_sentiment.append({
-                        'title': article['title'],
-                        'url': article['url'],
-                        'sentiment': sentiment.upper()
-                    })
-            else:
-                raise ValueError("No JSON found in AI response")
 
+def _classify_titles(titles, model, scheduler, packer):
+    """
+    แบ่งหัวข้อข่าวเป็นชุดตามงบ token แล้วส่งผ่านตัวจัดคิว คืนค่า sentiment ตามลำดับ (None = วิเคราะห์ไม่สำเร็จ)
+    ข่าวที่หายไปจากคำตอบที่ใช้ได้บางส่วน จะถูกรวมเป็นชุดใหม่แล้วส่งไปอีกครั้ง (ไม่ส่งทั้งชุดเดิมซ้ำ)
+    ชุดที่ล้มเหลวทั้งชุดจะไม่ถูกส่งซ้ำที่นี่ เพราะตัวจัดคิวลองใหม่กรณีโดน 429 ให้แล้ว
+    """
+    attempts = int(os.environ.get('GEMINI_REREQUEST_ATTEMPTS', DEFAULT_REREQUEST_ATTEMPTS))
+    sentiments = [None] * len(titles)
+    pending = list(range(len(titles)))
+    for attempt in range(attempts + 1):
+        batches = [[pending[i] for i in batch] for batch in plan_batches([titles[i] for i in pending], packer)]
+        if attempt == 0:
+            print(f"   -> Analyzing {len(titles)} headlines in {len(batches)} batches "
+                  f"(token budget={packer.token_budget}, concurrency={scheduler.max_concurrency}, "
+                  f"rpm={scheduler.requests_per_minute}).")
+        else:
+            print(f"   -> Re-requesting {len(pending)} headlines missing from Gemini responses "
+                  f"in {len(batches)} batches.")
+            count_parse_event('re_requested_items', len(pending))
+            count_parse_event('re_request_batches', len(batches))
+
+        batch_sentiments = scheduler.run(
+            batches, lambda batch: _classify_batch([titles[index] for index in batch], model, packer))
+
+        missing = []
+        for batch, batch_result in zip(batches, batch_sentiments):
+            if batch_result is None:
+                continue
+            for index, sentiment in zip(batch, batch_result):
+                if sentiment is None:
+                    missing.append(index)
+                else:
+                    sentiments[index] = sentiment
+        if attempt:
+            count_parse_event('re_request_recovered', len(pending) - len(missing))
+        pending = missing
+        if not pending:
+            break
+    return sentiments
+
+
+def analyze_sentiment_with_gemini(articles, model, scheduler=None, cache=None, default_sentiment="NEUTRAL",
+                                  packer=None):
+    """
+    ฟังก์ชันวิเคราะห์ความรู้สึกด้วย Gemini API ที่มีการแบ่งข้อมูลเป็นชุดตามงบ token (PromptPacker)
+    ทุกข่าวจะถูกวิเคราะห์ โดยส่งหลายชุดพร้อมกันภายใต้งบ requests-per-minute ของ GeminiBatchScheduler
+    หัวข้อข่าวที่เคยวิเคราะห์แล้วจะดึงจาก SentimentCache และส่งเฉพาะข่าวที่ไม่อยู่ในแคชไปยัง Gemini
+    ข่าวที่วิเคราะห์ไม่สำเร็จจะได้ default_sentiment (ส่ง None เพื่อให้ผู้เรียกเลือกแผนสำรองเอง)
+    ถ้า model เป็น GuardedModel ที่วงจรเปิดอยู่ จะโยน CircuitOpenError ทันทีให้ผู้เรียกไปใช้แผนสำรอง
+    """
+    print("\nEngine: Sending data to Gemini AI for analysis...")
 
-            time.sleep(1)
 
+    if not articles:
+        return []
+    breaker = getattr(model, 'breaker', None)
+    if breaker is not None:
+        breaker.raise_if_open()
+
+    scheduler = scheduler or GeminiBatchScheduler()
+    packer = packer or get_default_packer()
+    titles = [article['title'] for article in articles]
+    sentiments = classify_with_cache(
+        titles, lambda miss_titles: _classify_titles(miss_titles, model, scheduler, packer),
+        _model_name(model), PROMPT_VERSION, cache=cache
+    )
 
-        except Exception as e:
-            print(f"Engine: Error during batch analysis: {e}")
-            for article in batch:
-                all_results_with_sentiment.append({'title': article['title'], 'url': article['url'], 'sentiment': 'NEUTRAL'})
-   
-    # เพิ่มข่าวที่เหลือ (ที่ไม่ได้วิเคราะห์) เข้าไปในผลลัพธ์โดยให้เป็น NEUTRAL
-    remaining_articles = articles[20:]
-    for article in remaining_articles:
-        all_results_with_sentiment.append({'title': article['title'], 'url': article['url'], 'sentiment': 'NEUTRAL'})
+    # ข่าวที่วิเคราะห์ไม่สำเร็จหลังลองใหม่ครบแล้ว ให้เป็น NEUTRAL เหมือนเดิม (ค่าเริ่มต้นของ default_sentiment)
+    all_results_with_sentiment = [
+        {'title': article['title'], 'url': article['url'], 'sentiment': sentiment or default_sentiment}
+        for article, sentiment in zip(articles, sentiments)
+    ]
 
 
     print("Engine: Gemini sentiment analysis finished.")
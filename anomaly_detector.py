@@ -0,0 +1,282 @@
+import argparse
+import csv
+import math
+import time
+from datetime import datetime, timezone
+
+from rolling_stats import RunningStats
+
+# ==============================================================================
+# ตัวตรวจจับความผิดปกติแบบต่อเนื่อง (Streaming Anomaly Detector)
+# รับข่าวทีละรายการ อัปเดตจำนวนข่าวเชิงลบรายชั่วโมงและ baseline ใน O(1)
+# และแจ้งเตือนทันทีที่ชั่วโมงปัจจุบันเกินเกณฑ์ (ไม่ต้องรอให้ชั่วโมงจบ)
+# ==============================================================================
+METHODS = ('rollup', 'ewma', 'seasonal')
+MAX_GAP_BUCKETS = 24 * 7
+# ค่าต่ำสุดของ std (หน่วย: จำนวนข่าวต่อชั่วโมง) คีย์เวิร์ดที่เงียบจะมี std ~ 0 ข่าวลบข่าวเดียวก็เกินเกณฑ์
+MIN_STD = 1.0
+DEFAULT_MIN_COUNT = 3
+
+
+def to_epoch_seconds(value):
+    """แปลง datetime / ISO string / ตัวเลข epoch เป็นวินาที (UTC)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class EwmaStats:
+    """ค่าเฉลี่ยและความแปรปรวนแบบถ่วงน้ำหนักเลขชี้กำลัง (EWMA) อัปเดตใน O(1)"""
+
+    __slots__ = ('alpha', 'count', 'mean', 'variance')
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def add(self, value):
+        if self.count == 0:
+            self.mean = float(value)
+        else:
+            delta = value - self.mean
+            self.mean += self.alpha * delta
+            self.variance = (1 - self.alpha) * (self.variance + self.alpha * delta * delta)
+        self.count += 1
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count >= 2 else None
+
+
+class StreamingAnomalyDetector:
+    """
+    method:
+      - 'rollup'   ใช้ mean + sigmas*std ของทุกชั่วโมงที่ผ่านมา (เหมือน detect_anomalies เดิม)
+      - 'ewma'     baseline แบบ EWMA ให้น้ำหนักชั่วโมงล่าสุดมากกว่า
+      - 'seasonal' baseline EWMA แยกตามชั่วโมงของวัน (0-23) ถอยไปใช้ EWMA รวมจนกว่าจะมีข้อมูลพอ
+    on_alert(event) จะถูกเรียกทันทีที่ชั่วโมงใดเกินเกณฑ์ (แจ้งครั้งเดียวต่อชั่วโมง)
+    ชั่วโมงที่มีข่าวเชิงลบน้อยกว่า min_count ไม่แจ้งเตือน และ std ของ baseline ไม่ต่ำกว่า min_std
+    """
+
+    def __init__(self, method='ewma', sigmas=2.0, alpha=0.3, min_buckets=2, min_count=DEFAULT_MIN_COUNT,
+                 min_std=MIN_STD, bucket_seconds=3600, seasonal_min_samples=3, on_alert=None, keyword=None):
+        if method not in METHODS:
+            raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+        self.method = method
+        self.sigmas = sigmas
+        self.min_buckets = min_buckets
+        self.min_count = min_count
+        self.min_std = min_std
+        self.bucket_seconds = bucket_seconds
+        self.seasonal_min_samples = seasonal_min_samples
+        self.on_alert = on_alert
+        self.keyword = keyword
+        self.rollup = RunningStats()
+        self.ewma = EwmaStats(alpha)
+        self.seasonal = [EwmaStats(alpha) for _ in range(24)]
+        self.current_bucket = None
+        self.current_count = 0
+        self.alerted_bucket = None
+        self.events = []
+        self.stats = {'articles': 0, 'negative': 0, 'late': 0, 'buckets': 0, 'alerts': 0}
+
+    # ------------------------------------------------------------------ baseline
+    def _close_bucket(self, bucket, count):
+        self.rollup.add(count)
+        self.ewma.add(count)
+        self.seasonal[self._hour_of_day(bucket)].add(count)
+        self.stats['buckets'] += 1
+
+    def _hour_of_day(self, bucket):
+        return int((bucket * self.bucket_seconds) // 3600) % 24
+
+    def baseline(self, bucket=None):
+        """คืนค่า (mean, std) ของ baseline ที่ใช้ตัดสินชั่วโมง bucket (ไม่รวมชั่วโมงนั้นเอง)"""
+        if self.rollup.count < self.min_buckets:
+            return None, None
+        stats = self.rollup if self.method == 'rollup' else self.ewma
+        if self.method == 'seasonal' and bucket is not None:
+            slot = self.seasonal[self._hour_of_day(bucket)]
+            if slot.count >= self.seasonal_min_samples:
+                stats = slot
+        if stats.std is None:
+            return stats.mean, None
+        # std จริงแกว่งใกล้ 0 ได้ง่าย (EWMA หรือคีย์เวิร์ดที่เงียบ) จึงใช้ค่าที่มากที่สุดระหว่าง std,
+        # sqrt(mean) แบบ Poisson และ min_std
+        return stats.mean, max(stats.std, math.sqrt(max(stats.mean, 0.0)), self.min_std)
+
+    def threshold(self, bucket=None):
+        mean, std = self.baseline(bucket)
+        if mean is None or std is None:
+            return None
+        return mean + self.sigmas * std
+
+    # ------------------------------------------------------------------ stream
+    def _advance_to(self, bucket):
+        if self.current_bucket is None:
+            self.current_bucket = bucket
+            return
+        # ปิดชั่วโมงปัจจุบัน และชั่วโมงที่ว่างระหว่างทาง (นับเป็น 0) สูงสุด MAX_GAP_BUCKETS ชั่วโมง
+        self._close_bucket(self.current_bucket, self.current_count)
+        gap = bucket - self.current_bucket - 1
+        for empty in range(bucket - min(gap, MAX_GAP_BUCKETS), bucket):
+            self._close_bucket(empty, 0)
+        self.current_bucket = bucket
+        self.current_count = 0
+
+    def add(self, timestamp, sentiment, emit=True):
+        """
+        เพิ่มข่าว 1 รายการ (timestamp, sentiment) และคืนค่า event แจ้งเตือนถ้าชั่วโมงนี้เพิ่งเกินเกณฑ์
+        ข่าวที่มาช้ากว่าชั่วโมงปัจจุบันจะถูกนับไว้ใน stats['late'] แต่ไม่แก้ baseline ย้อนหลัง
+        emit=False อัปเดต baseline อย่างเดียวโดยไม่ตรวจเกณฑ์ (ใช้กับข่าวย้อนหลังตอน warm_up)
+        """
+        self.stats['articles'] += 1
+        bucket = int(to_epoch_seconds(timestamp) // self.bucket_seconds)
+        if self.current_bucket is not None and bucket < self.current_bucket:
+            self.stats['late'] += 1
+            return None
+        if self.current_bucket is None or bucket > self.current_bucket:
+            self._advance_to(bucket)
+        if sentiment != 'NEGATIVE':
+            return None
+
+        self.stats['negative'] += 1
+        self.current_count += 1
+        if not emit:
+            return None
+        if self.alerted_bucket == bucket or self.current_count < self.min_count:
+            return None
+        threshold = self.threshold(bucket)
+        if threshold is None or self.current_count <= threshold:
+            return None
+
+        mean, std = self.baseline(bucket)
+        self.alerted_bucket = bucket
+        event = {
+            'keyword': self.keyword,
+            'bucket_start': datetime.fromtimestamp(bucket * self.bucket_seconds, tz=timezone.utc).isoformat(),
+            'negative_count': self.current_count,
+            'threshold': round(threshold, 3),
+            'baseline_mean': round(mean, 3),
+            'baseline_std': round(std, 3),
+            'method': self.method,
+        }
+        self.events.append(event)
+        self.stats['alerts'] += 1
+        if self.on_alert:
+            self.on_alert(event)
+        return event
+
+    def add_many(self, items):
+        """เพิ่มข่าวเป็นชุดเล็ก (micro-batch) ของ (timestamp, sentiment) คืนค่า list ของ event ที่เกิดขึ้น"""
+        events = []
+        for timestamp, sentiment in items:
+            event = self.add(timestamp, sentiment)
+            if event:
+                events.append(event)
+        return events
+
+    def warm_up(self, items):
+        """ป้อนข่าวย้อนหลัง (timestamp, sentiment) เพื่อสร้าง baseline โดยไม่แจ้งเตือนชั่วโมงที่ผ่านไปแล้ว"""
+        for timestamp, sentiment in items:
+            self.add(timestamp, sentiment, emit=False)
+
+
+# ==============================================================================
+# Backtest: เล่นไฟล์แบบ pr_crisis_data.csv ซ้ำเร็วกว่าเวลาจริง
+# ==============================================================================
+def read_articles_csv(path):
+    """อ่านไฟล์ CSV (timestamp, title, sentiment) แล้วคืนค่า list เรียงตามเวลา"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = [(to_epoch_seconds(row['timestamp']), row.get('sentiment', '').upper())
+                for row in csv.DictReader(f) if row.get('timestamp')]
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
+def make_scenario(name, start=1735689600, hours=48):
+    """
+    ข่าวจำลองสำหรับตรวจว่าเกณฑ์แจ้งเตือนทำงานตามที่ตั้งใจ คืนค่า (rows, ควรแจ้งเตือนหรือไม่)
+      - quiet:  ข่าวกลางๆ ชั่วโมงละ 3 ข่าวนาน hours ชั่วโมง แล้วมีข่าวลบ 1 ข่าว -> ต้องไม่แจ้งเตือน
+      - sparse: ข่าวลบ 1 ข่าวทุก 6 ชั่วโมง แล้วมีข่าวลบอีก 1 ข่าว -> ต้องไม่แจ้งเตือน
+      - burst:  เหมือน sparse แต่ชั่วโมงสุดท้ายมีข่าวลบ 8 ข่าว -> ต้องแจ้งเตือน
+    """
+    rows = []
+    for hour in range(hours):
+        ts = start + hour * 3600
+        rows += [(ts + minute * 60, 'NEUTRAL') for minute in (5, 25, 45)]
+        if name != 'quiet' and hour % 6 == 0:
+            rows.append((ts + 30 * 60, 'NEGATIVE'))
+    last = start + hours * 3600
+    negatives = 8 if name == 'burst' else 1
+    rows += [(last + minute * 60, 'NEGATIVE') for minute in range(negatives)]
+    return rows, name == 'burst'
+
+
+SCENARIOS = ('quiet', 'sparse', 'burst')
+
+
+def backtest(rows, method='ewma', speedup=None, **detector_options):
+    """
+    เล่นข่าวตามลำดับเวลาผ่าน StreamingAnomalyDetector
+    speedup=None คือเร็วที่สุดเท่าที่ทำได้ ส่วน speedup=3600 คือ 1 ชั่วโมงข้อมูลใช้เวลาจริง 1 วินาที
+    """
+    detector = StreamingAnomalyDetector(method=method, **detector_options)
+    started = time.perf_counter()
+    first_ts = rows[0][0] if rows else 0
+    for ts, sentiment in rows:
+        if speedup:
+            due = (ts - first_ts) / speedup - (time.perf_counter() - started)
+            if due > 0:
+                time.sleep(due)
+        detector.add(ts, sentiment)
+    elapsed = time.perf_counter() - started
+    span_hours = (rows[-1][0] - first_ts) / 3600 if rows else 0
+    return {
+        'method': method,
+        'articles': len(rows),
+        'span_hours': round(span_hours, 1),
+        'seconds': round(elapsed, 4),
+        'articles_per_second': round(len(rows) / elapsed, 1) if elapsed else None,
+        'speedup_vs_realtime': round(span_hours * 3600 / elapsed, 1) if elapsed else None,
+        'stats': detector.stats,
+        'events': detector.events,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the streaming anomaly detector on a CSV file")
+    parser.add_argument('path', nargs='?', default='pr_crisis_data.csv')
+    parser.add_argument('--method', choices=METHODS + ('all',), default='all')
+    parser.add_argument('--sigmas', type=float, default=2.0)
+    parser.add_argument('--alpha', type=float, default=0.3)
+    parser.add_argument('--speedup', type=float, default=None)
+    parser.add_argument('--scenarios', action='store_true', help='รันข่าวจำลอง quiet/sparse/burst แทนไฟล์ CSV')
+    args = parser.parse_args()
+
+    if args.scenarios:
+        failed = 0
+        for name in (METHODS if args.method == 'all' else (args.method,)):
+            for scenario in SCENARIOS:
+                rows, expected = make_scenario(scenario)
+                report = backtest(rows, method=name, sigmas=args.sigmas, alpha=args.alpha)
+                alerted = bool(report['events'])
+                failed += alerted != expected
+                print(f"[{name}] {scenario:<6} alerts={len(report['events'])} expected={'yes' if expected else 'no'} "
+                      f"{'ok' if alerted == expected else 'FAIL'}")
+        raise SystemExit(1 if failed else 0)
+
+    articles = read_articles_csv(args.path)
+    for name in (METHODS if args.method == 'all' else (args.method,)):
+        report = backtest(articles, method=name, speedup=args.speedup, sigmas=args.sigmas, alpha=args.alpha)
+        print(f"[{name}] {report['articles']} articles over {report['span_hours']}h "
+              f"replayed in {report['seconds']}s ({report['speedup_vs_realtime']}x real time), "
+              f"{len(report['events'])} alerts")
+        for event in report['events']:
+            print(f"   🚨 {event['bucket_start']}: {event['negative_count']} negative > {event['threshold']}")
@@ -1,21 +1,33 @@
 # ==============================================================================
 # ส่วนที่ 1: Import ไลบรารีที่จำเป็นทั้งหมด
 # ==============================================================================
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for, flash
 import json
-import pandas as pd
-import time
-from wordcloud import WordCloud
-from pythainlp.tokenize import word_tokenize
-from pythainlp.corpus import thai_stopwords
-import collections
-from analysis_engine import get_news_from_api, analyze_sentiment_with_gemini
-import sqlite3
+from analysis_engine import SAFETY_SETTINGS, get_news_from_api, analyze_sentiment_with_gemini
+import model_registry
+import sentiment_cache
+import sentiment_cascade
+from sentiment_rules import apply_sentiment_rules
+from jobs import JobQueueFull, create_job_manager
+import history_store
+from circuit_breaker import GuardedModel, get_all_stats as get_breaker_stats, get_breaker
+from llm_gateway import LLMGateway
+from llm_json import get_parse_stats, parse_json_object
+from prompt_packer import get_default_packer
+from telegram_notifier import TelegramNotifier
+from dedup import classify_with_dedup, cluster_articles, expand_cluster_results
+from text_processing import FrequencyTable
+from wordcloud_store import WordCloudStore
+from status_store import create_status_store
+from anomaly_detector import StreamingAnomalyDetector
+from news_client import get_default_client
+from watchlist import WatchlistScheduler, acquire_process_lock, get_watchlist_status, normalize_keyword, parse_keywords
 from datetime import datetime, timedelta
 import google.generativeai as genai
 import os
-import requests
-from functools import wraps
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 
 # ==============================================================================
 # ส่วนที่ 2: ตั้งค่าต่างๆ
@@ -31,57 +43,46 @@ TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 TELEGRAM_CHAT_ID = os.environ.get('TELEGRAM_CHAT_ID')
 
 genai.configure(api_key=GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
+# ทุกการเรียก Gemini ผ่าน circuit breaker ตัวเดียวกัน: ช่วงที่ Gemini ล่มจะไปใช้แผนสำรอง/แคชทันที
+model = GuardedModel(genai.GenerativeModel('gemini-2.0-flash'), get_breaker('gemini'))
 
+# โหลดโมเดลสำรองล่วงหน้าเมื่อเปิด WARM_SENTIMENT_MODEL=1 (ค่าเริ่มต้นคือโหลดเมื่อใช้งานครั้งแรก)
+model_registry.add_stats_hook(lambda stats: print(f"Model stats: {stats}"))
+model_registry.warm_up_if_enabled()
 
 
-# ===== START: เพิ่มหน่วยความจำสำหรับเก็บสถานะล่าสุด =====
-latest_analysis_status = {
-    "keyword": None,
-    "status": "normal",
-    "timestamp": 0 # เพิ่มนาฬิกาจับเวลา
-}
+# ===== START: ที่เก็บสถานะล่าสุด (ใช้ร่วมกันทุก worker เมื่อ STATUS_STORE=sqlite) =====
+status_store = create_status_store()
+CRISIS_STATUS_MAX_WAIT_SECONDS = 30
 # =======================================================
 
-# --- พจนานุกรมคำศัพท์สำหรับแผนสำรอง ---
-NEGATIVE_KEYWORDS = [
-    "ล่ม", "ร้องเรียน", "ข้อมูลรั่ว", "ตกต่ำ", "วิกฤต", "ปัญหา", "ขัดข้อง", "ฟ้อง", "เสียหาย",
-    "แฉ", "โกง", "ทุจจริต", "ดราม่า", "ร้องทุกข์", "ตกฮวบ", "ขาดทุน", "หนี้สิน", "ล้มละลาย",
-    "ถดถอย", "ซบเซา", "ลดลง", "ต่ำสุด", "ติดลบ", "ย่ำแย่", "หดตัว", "ชะลอตัว", "ผันผวน",
-    "เสี่ยง", "ฟองสบู่", "ฉ้อโกง", "ยักยอก", "ฟอกเงิน", "ผิดนัดชำระ", "ถูกปรับ", "คว่ำบาตร",
-    "ภาษีเพิ่ม", "เงินเฟ้อ", "ว่างงาน", "ห่วย", "แย่", "ไม่ดี", "ช้า", "ล่าช้า", "มีตำหนิ",
-    "ใช้งานไม่ได้", "อันตราย", "ไม่ปลอดภัย", "คุณภาพต่ำ", "ของปลอม", "ไม่ได้มาตรฐาน",
-    "ยกเลิกบริการ", "ปิดปรับปรุง", "ไม่พอใจ", "โวย", "ประท้วง", "เรียกร้อง", "เดือดร้อน",
-    "ถูกหลอก", "เอาเปรียบ", "บริการแย่", "อื้อฉาว", "ข่าวฉาว", "เสื่อมเสีย", "ถูกวิจารณ์",
-    "ตำหนิ", "โจมตี", "ขัดแย้ง", "ถูกสอบสวน", "ดำเนินคดี", "ละเมิด", "ผิดกฎหมาย", "ปกปิด",
-    "ปิดบัง", "ซ่อนเร้น", "ปฏิเสธ", "ปลดออก", "เลิกจ้าง", "ปิดกิจการ", "ยุติ", "ล้มเหลว",
-    "อุปสรรค", "ผลกระทบ", "วุ่นวาย", "กังวล", "น่าเป็นห่วง", "เลวร้าย", "หนัก", "สาหัส",
-    "รุนแรง", "สูญเสีย", "เสียชีวิต", "บาดเจ็บ", "ภัยพิบัติ", "ฉุกเฉิน", "เตือนภัย"
-]
-POSITIVE_KEYWORDS = [
-    "กำไร", "สูงสุด", "เปิดตัว", "สำเร็จ", "รางวัล", "ชื่นชม", "ขยาย", "พัฒนา", "ร่วมมือ",
-    "อันดับ 1", "เติบโต", "สถิติใหม่", "พุ่ง", "ทะยาน", "เพิ่มขึ้น", "ขยายตัว", "แข็งแกร่ง",
-    "มั่นคง", "ผลประกอบการดี", "โบนัส", "ปันผล", "เกินคาด", "ฟื้นตัว", "ตลาดกระทิง",
-    "ลงทุนเพิ่ม", "ซื้อกิจการ", "ระดมทุน", "ยอดเยี่ยม", "ดีเลิศ", "คุณภาพสูง", "นวัตกรรม",
-    "รุ่นใหม่", "ทันสมัย", "สะดวก", "รวดเร็ว", "ปลอดภัย", "ได้มาตรฐาน", "เป็นที่ยอมรับ",
-    "ได้รับความนิยม", "ขายดี", "หมดเกลี้ยง", "พึงพอใจ", "ประทับใจ", "ตอบรับดี", "แห่ซื้อ",
-    "ยอดจองถล่มทลาย", "สนับสนุน", "เชื่อมั่น", "ภักดี", "ภาพลักษณ์ดี", "เป็นผู้นำ",
-    "สร้างชื่อเสียง", "ได้รับการยกย่อง", "ผ่านการรับรอง", "มาตรฐานสากล", "MOU", "พันธมิตร",
-    "วิสัยทัศน์", "บรรลุเป้าหมาย", "ฉลอง", "ครบรอบ", "แต่งตั้ง", "โปรโมท", "เลื่อนตำแหน่ง",
-    "วิสัยทัศน์กว้างไกล", "โอกาส", "อนาคต", "สดใส", "ก้าวหน้า", "ยกระดับ", "ส่งเสริม",
-    "ช่วยเหลือ", "บริจาค", "คืนสู่สังคม", "CSR", "สร้างสรรค์", "ยิ่งใหญ่", "ประสบความสำเร็จ",
-    "น่ายินดี", "ข่าวดี", "ศักยภาพ", "แข็งแกร่ง", "โดดเด่น"
-]
-NEGATION_WORDS = [
-    "ไม่", "มิ", "มิใช่", "หามิได้", "ไม่ใช่", "ไม่มี", "ไร้", "ปราศจาก", "ยังไม่", "ไม่ได้",
-    "ไม่เคย", "ไม่เคยมี", "มิได้", "ปฏิเสธ", "ไม่ยอม", "ไม่ยอมรับ", "คัดค้าน", "ไม่เห็นด้วย",
-    "โต้แย้ง", "ขัดขวาง", "ยับยั้ง", "ขาด", "ขาดแคลน", "ว่างเปล่า", "สูญ", "สิ้น", "หมด",
-    "หมดสิ้น", "สูญสิ้น", "ปราศจากซึ่ง", "หยุด", "ยุติ", "ยกเลิก", "งด", "ละเว้น", "เลิก",
-    "เพิกถอน", "ชะงัก", "ระงับ", "เลื่อน", "ป้องกัน", "หลีกเลี่ยง", "ห้าม", "เว้น", "ปลอดจาก",
-    "พ้นจาก", "ไม่แน่ใจ", "ไม่ชัดเจน", "คลุมเครือ", "น่าสงสัย", "ไม่ยืนยัน", "ไม่ใช่ว่า",
-    "ไม่เชิงว่า", "ไม่ได้หมายความว่า", "ไม่จำเป็นต้อง", "ยากที่จะ", "เป็นไปไม่ได้", "ยังไม่มี",
-    "ไร้วี่แวว", "นอกเหนือจาก", "ยกเว้น", "โดยไม่มี", "โดยปราศจาก"
-]
+# ===== START: ภาพ Word Cloud (ใช้ภาพเดิมซ้ำเมื่อคำเหมือนเดิม และลบภาพเก่าอัตโนมัติ) =====
+wordcloud_store = WordCloudStore()
+# ============================================
+
+# ===== START: แคช/รวมคำขอของ route ที่ขอคำแนะนำจาก Gemini =====
+llm_gateway = LLMGateway()
+# คำตอบที่ขาด key เหล่านี้ถือว่าใช้ไม่ได้ (ไม่เก็บลงแคช)
+parse_root_cause_response = partial(parse_json_object, required_keys=('category', 'reason'))
+parse_simulation_response = partial(parse_json_object, required_keys=('key_concerns', 'viral_score', 'first_action'))
+# ============================================
+
+# ===== START: คิวส่ง Telegram เบื้องหลัง (ข้อความค้างส่งเก็บใน history.db ส่งต่อได้หลังรีสตาร์ต) =====
+telegram_notifier = TelegramNotifier(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+if telegram_notifier.configured:
+    telegram_notifier.start()
+# ============================================
+
+# ===== START: คิวงานวิเคราะห์เบื้องหลัง (สถานะงานใช้ร่วมกันทุก worker เมื่อ JOB_STORE=sqlite) =====
+analysis_jobs = create_job_manager()
+ANALYSIS_STAGE_MESSAGES = {
+    'fetch': 'กำลังดึงข่าวจาก NewsAPI',
+    'classify': 'กำลังวิเคราะห์ความรู้สึกของข่าว',
+    'history': 'กำลังเปรียบเทียบกับข้อมูลย้อนหลัง',
+    'wordcloud': 'กำลังสร้าง Word Cloud และประเด็นร้อน',
+    'notify': 'กำลังส่งการแจ้งเตือน',
+}
+# ============================================
 
 # ==============================================================================
 # ส่วนที่ 3: ฟังก์ชันเสริมต่างๆ
@@ -111,83 +112,41 @@ def check_session_timeout():
         # Update last activity time as a string
         session['last_activity'] = datetime.now().isoformat()
 
-def apply_sentiment_rules(initial_label, text):
-    final_label = initial_label
-    text_lower = text.lower()
-    def has_negation(keyword, text_segment):
-        for neg in NEGATION_WORDS:
-            if f"{neg}{keyword}" in text_segment or f"{neg} {keyword}" in text_segment:
-                return True
-        return False
-    for keyword in NEGATIVE_KEYWORDS:
-        if keyword in text_lower and not has_negation(keyword, text_lower):
-            return "NEGATIVE"
-    if initial_label == "NEUTRAL":
-        for keyword in POSITIVE_KEYWORDS:
-            if keyword in text_lower and not has_negation(keyword, text_lower):
-                return "POSITIVE"
-    return final_label
-
-def create_wordcloud(text):
-    if not text.strip(): return None
-    # กรณีออนไลน์
-    # font_path = 'fonts/Sarabun-Regular.ttf'
-     # กรณีออฟไลน์
-    font_path = 'C:/Windows/Fonts/tahoma.ttf' # กลับมาใช้ Path เดิมที่แน่นอนกว่า
-
+def create_wordcloud(frequency_table):
+    """
+    ส่งความถี่คำไปวาด Word Cloud เบื้องหลัง และคืนค่า key ของภาพทันที (None ถ้าสร้างไม่ได้)
+    หน้าเว็บโหลดภาพผ่าน /wordcloud/<key>.png ซึ่งจะรอจนวาดเสร็จ
+    """
     try:
-        words = word_tokenize(text, engine='newmm')
-        text_for_cloud = " ".join(words)
-        wordcloud = WordCloud(font_path=font_path, width=800, height=400, background_color="white", regexp=r"[ก-๙]+").generate(text_for_cloud)
-        timestamp = int(time.time())
-        image_path = f'images/wordcloud_{timestamp}.png'
-        full_path = f'static/{image_path}'
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        wordcloud.to_file(full_path)
-        return image_path
+        return wordcloud_store.submit(frequency_table.wordcloud_frequencies())
     except Exception as e:
         print(f"Error: ไม่สามารถสร้าง Word Cloud ได้: {e}")
         return None
 
-def extract_keywords(text):
-    words = word_tokenize(text, engine='newmm')
-    stopwords_list = thai_stopwords()
-    keywords = [word for word in words if word not in stopwords_list and not word.isnumeric() and len(word) > 1]
-    counter = collections.Counter(keywords)
-    return [item[0] for item in counter.most_common(5)]
+def extract_keywords(frequency_table):
+    return frequency_table.top_keywords(5)
 
 def save_to_history(keyword, percentages):
-    conn = sqlite3.connect('history.db')
-    cursor = conn.cursor()
-    today = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    cursor.execute("INSERT INTO analysis_history (keyword, analysis_date, negative_percent, positive_percent, neutral_percent) VALUES (?, ?, ?, ?, ?)", (keyword, today, percentages.get('NEGATIVE', 0), percentages.get('POSITIVE', 0), percentages.get('NEUTRAL', 0)))
-    conn.commit()
-    conn.close()
+    history_store.save_analysis(keyword, percentages)
+
+def save_many_to_history(entries):
+    history_store.save_analyses(entries)
 
 def get_historical_average(keyword):
-    conn = sqlite3.connect('history.db')
-    query = "SELECT AVG(negative_percent) FROM analysis_history WHERE keyword = ? AND analysis_date >= date('now', '-7 days')"
-    df = pd.read_sql_query(query, conn, params=(keyword,))
-    conn.close()
-    historical_avg = df.iloc[0, 0]
-    return historical_avg if pd.notna(historical_avg) else None
-
-def send_telegram_notification(message):
-    if not all([TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID]) or "HERE" in TELEGRAM_BOT_TOKEN:
+    return history_store.get_negative_average(keyword, days=7)
+
+def send_telegram_notification(message, coalesce_key=None):
+    """
+    ส่งข้อความเข้าคิว Telegram (ไม่รอ Telegram ตอบ) คืนค่า True ถ้าเข้าคิวได้
+    alert ที่ระบุ coalesce_key (keyword) เดียวกันภายในช่วงเวลาที่กำหนดจะถูกรวมเป็นข้อความเดียว
+    """
+    if not telegram_notifier.configured:
         print("Warning: ไม่ได้ตั้งค่า Telegram Bot Token หรือ Chat ID")
         return False
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {'chat_id': TELEGRAM_CHAT_ID, 'text': message, 'parse_mode': 'Markdown'}
     try:
-        response = requests.post(url, json=payload)
-        if response.status_code == 200:
-            print("ส่งการแจ้งเตือนผ่าน Telegram สำเร็จ")
-            return True
-        else:
-            print(f"Error: ไม่สามารถส่ง Telegram Bot ได้: {response.status_code}, {response.text}")
-            return False
+        return telegram_notifier.notify(message, coalesce_key=coalesce_key)
     except Exception as e:
-        print(f"Error: เกิดข้อผิดพลาดในการเชื่อมต่อกับ Telegram: {e}")
+        print(f"Error: ไม่สามารถเพิ่มข้อความเข้าคิว Telegram ได้: {e}")
         return False
 
 # ==============================================================================
@@ -203,106 +162,392 @@ def index():
 def about():
     return render_template('about.html')
 
+def classify_articles(articles):
+    """
+    วิเคราะห์ความรู้สึกของข่าว ใช้ร่วมกันทั้ง /analyze และ Watchlist Scheduler
+    ข่าวที่เกือบซ้ำกัน (ข่าวเดียวกันจากหลายสำนัก) จะถูกวิเคราะห์เพียงครั้งเดียวแล้วใช้ผลร่วมกัน
+    ผลลัพธ์แต่ละข่าวมี cluster_size และ representative เพิ่มเติม
+    """
+    return classify_with_dedup(articles, classify_unique_articles)
+
+def classify_unique_articles(articles):
+    """
+    วิเคราะห์ความรู้สึกของข่าวด้วย Gemini และถอยไปใช้โมเดลสำรอง + กฎภาษาไทยเมื่อ Gemini ล้มเหลว
+    เมื่อเปิด SENTIMENT_CASCADE=1 จะใช้โมเดลในเครื่องก่อน และส่งให้ Gemini เฉพาะข่าวที่ไม่มั่นใจ
+    """
+    if sentiment_cascade.is_enabled():
+        try:
+            return sentiment_cascade.classify_with_cascade(
+                articles, partial(analyze_sentiment_with_gemini, model=model, default_sentiment=None))
+        except Exception as e:
+            print(f"Warning: Cascade failed ({e}), sending every headline to Gemini...")
+    try:
+        analysis_results = analyze_sentiment_with_gemini(articles, model)
+        print("Analysis successful using Gemini AI.")
+        sentiments_set = {res['sentiment'] for res in analysis_results}
+        if len(sentiments_set) == 1 and 'NEUTRAL' in sentiments_set:
+            raise ValueError("Gemini analysis returned all NEUTRAL, likely an error.")
+    except Exception as e:
+        print(f"Warning: Gemini failed ({e}), using Rule-based system as fallback...")
+        headlines = [article['title'] for article in articles]
+        initial_labels = model_registry.predict_labels(headlines)
+        analysis_results = [{'title': article['title'], 'url': article['url'], 'sentiment': apply_sentiment_rules(initial_labels[i], article['title'])} for i, article in enumerate(articles)]
+    return analysis_results
+
+LABEL_MAP_THAI = {"POSITIVE": "ข่าวเชิงบวก", "NEGATIVE": "ข่าวเชิงลบ", "NEUTRAL": "ข่าวเป็นกลาง"}
+
+def tally_results(analysis_results):
+    """
+    นับและแสดงเฉพาะข่าวตัวแทนของแต่ละเรื่อง สัดส่วนจึงไม่เอียงตามจำนวนสำนักข่าวที่ลงข่าวซ้ำ
+    คืนค่า dict ของ results (เรียงข่าวเชิงลบก่อน), sentiment_summary, percentages และ negative_headlines
+    """
+    results_data, negative_headlines = [], []
+    sentiment_summary = {'POSITIVE': 0, 'NEGATIVE': 0, 'NEUTRAL': 0}
+    for result in analysis_results:
+        if not result['representative']:
+            continue
+        final_label = result['sentiment']
+        sentiment_summary[final_label] += 1
+        results_data.append({
+            'title': result['title'], 'url': result['url'], 'sentiment': final_label,
+            'sentiment_thai': LABEL_MAP_THAI.get(final_label, "ไม่ระบุ"),
+            'cluster_size': result['cluster_size']
+        })
+        if final_label == 'NEGATIVE':
+            negative_headlines.append(result['title'])
+
+    sort_order = {"NEGATIVE": 0, "NEUTRAL": 1, "POSITIVE": 2}
+    results_data.sort(key=lambda x: sort_order.get(x['sentiment'], 3))
+
+    total_articles = len(results_data) if results_data else 1
+    percentages = {label: (count / total_articles) * 100 for label, count in sentiment_summary.items()}
+    return dict(results=results_data, sentiment_summary=sentiment_summary, percentages=percentages,
+                negative_headlines=negative_headlines)
+
+def empty_analysis_result(keyword):
+    """ผลลัพธ์เมื่อไม่เจอข่าว: รีเซ็ต status เป็น normal"""
+    status_store.update(keyword, "normal", make_current=False)
+    print("No articles found. Setting status to normal.")
+    return dict(keyword=keyword, results=[], article_count=0, labels=json.dumps([]), values=json.dumps([]),
+                wordcloud_image=None, top_keywords=None, trend_message=None, trend_status=None,
+                sentiment_summary={'POSITIVE': 0, 'NEGATIVE': 0, 'NEUTRAL': 0}, negative_headlines_for_js=[])
+
+def complete_analysis(keyword, article_count, tally, report):
+    """
+    ขั้นตอนหลังบันทึกประวัติแล้ว (เทียบค่าเฉลี่ย 7 วัน → status → Word Cloud → Telegram)
+    คืนค่า dict ที่ใช้ render หน้า index.html
+    """
+    sentiment_summary = tally['sentiment_summary']
+    negative_headlines_for_js = tally['negative_headlines']
+    wordcloud_image, top_keywords = None, None
+    current_negative_percent = tally['percentages'].get('NEGATIVE', 0)
+    historical_avg = get_historical_average(keyword)
+    if historical_avg is not None and historical_avg > 0:
+        if current_negative_percent > historical_avg * 1.2: trend_message, trend_status = f"สูงกว่าค่าเฉลี่ย 7 วันล่าสุด ({historical_avg:.1f}%)", "alert"
+        elif current_negative_percent < historical_avg * 0.8: trend_message, trend_status = f"ต่ำกว่าค่าเฉลี่ย 7 วันล่าสุด ({historical_avg:.1f}%)", "good"
+        else: trend_message, trend_status = f"ใกล้เคียงกับค่าเฉลี่ย 7 วันล่าสุด ({historical_avg:.1f}%)", "normal"
+    else:
+        trend_message, trend_status = "ยังไม่มีข้อมูลย้อนหลังเพียงพอ", "normal"
+
+    is_volume_crisis = sentiment_summary['NEGATIVE'] > sentiment_summary['POSITIVE']
+    if trend_status != 'alert' and is_volume_crisis:
+        print("Volume crisis detected, overriding status to alert.")
+        trend_status = 'alert'
+        trend_message = f"สัดส่วนข่าวเชิงลบ ({sentiment_summary['NEGATIVE']}) มากกว่าข่าวเชิงบวก ({sentiment_summary['POSITIVE']})"
+
+    # ===== START: อัปเดต status หลังวิเคราะห์เสร็จ =====
+    status_store.update(keyword, trend_status, make_current=False)
+    print(f"Analysis complete. Final status: {status_store.get(keyword)}")
+    # ===============================================
+
+    if negative_headlines_for_js:
+        report('wordcloud', 75, ANALYSIS_STAGE_MESSAGES['wordcloud'])
+        # ตัดคำหัวข้อข่าวเชิงลบครั้งเดียว แล้วใช้ตารางความถี่เดียวกันทั้ง Word Cloud และประเด็นร้อน
+        frequency_table = FrequencyTable.from_headlines(negative_headlines_for_js)
+        wordcloud_image = create_wordcloud(frequency_table)
+        top_keywords = extract_keywords(frequency_table)
+
+    if trend_status == 'alert':
+        report('notify', 90, ANALYSIS_STAGE_MESSAGES['notify'])
+        notification_message = f"Crisis Alert: {keyword}\nสถานการณ์: {trend_message}\nประเด็นร้อน: {', '.join(top_keywords)}"
+        send_telegram_notification(notification_message, coalesce_key=keyword)
+
+    labels = [LABEL_MAP_THAI.get(label) for label in sentiment_summary.keys()]
+    values = list(sentiment_summary.values())
+
+    return dict(keyword=keyword, results=tally['results'], article_count=article_count,
+                labels=json.dumps(labels), values=json.dumps(values),
+                wordcloud_image=wordcloud_image, top_keywords=top_keywords,
+                trend_message=trend_message, trend_status=trend_status,
+                sentiment_summary=sentiment_summary,
+                negative_headlines_for_js=negative_headlines_for_js)
+
+def run_analysis(keyword, report=lambda stage, progress, message=None: None):
+    """
+    ขั้นตอนวิเคราะห์ทั้งหมด (ดึงข่าว → Gemini → แผนสำรอง → ประวัติ → Word Cloud → Telegram)
+    ทำงานบน thread ของ JobManager และคืนค่า dict ที่ใช้ render หน้า index.html
+    """
+    report('fetch', 5, ANALYSIS_STAGE_MESSAGES['fetch'])
+    articles = get_news_from_api(keyword, NEWS_API_KEY)
+    if not articles:
+        return empty_analysis_result(keyword)
+
+    report('classify', 20, ANALYSIS_STAGE_MESSAGES['classify'])
+    tally = tally_results(classify_articles(articles))
+    report('history', 60, ANALYSIS_STAGE_MESSAGES['history'])
+    save_to_history(keyword, tally['percentages'])
+    return complete_analysis(keyword, len(articles), tally, report)
+
+# ===== START: วิเคราะห์หลาย keyword ในงานเดียว (เช่น แบรนด์เทียบคู่แข่ง) =====
+ANALYZE_BATCH_MAX_KEYWORDS = int(os.environ.get('ANALYZE_BATCH_MAX_KEYWORDS', 10))
+ANALYZE_BATCH_FETCH_WORKERS = int(os.environ.get('ANALYZE_BATCH_FETCH_WORKERS', 4))
+
+def classify_keyword_articles(articles_by_keyword):
+    """
+    วิเคราะห์ข่าวของหลาย keyword ด้วยการเรียก classify_unique_articles ครั้งเดียว
+    - จัดกลุ่มข่าวเกือบซ้ำภายในแต่ละ keyword เหมือน classify_articles
+    - ข่าวตัวแทน URL เดียวกันที่ถูกดึงมาจากหลาย keyword ถูกวิเคราะห์ครั้งเดียว
+    - หัวข้อข่าวจากทุก keyword ถูกแบ่ง batch ตามงบ token ร่วมกัน (batch ของ Gemini จึงไม่ว่างครึ่งๆ กลางๆ)
+    คืนค่า (ผลลัพธ์ต่อ keyword ในรูปแบบเดียวกับ classify_articles, จำนวนข่าวตัวแทนที่ส่งวิเคราะห์จริง)
+    """
+    clusters_by_keyword, unique_articles, index_by_url = {}, [], {}
+    for keyword, articles in articles_by_keyword.items():
+        clusters = clusters_by_keyword[keyword] = cluster_articles(articles)
+        for cluster in clusters:
+            article = articles[cluster[0]]
+            if article['url'] not in index_by_url:
+                index_by_url[article['url']] = len(unique_articles)
+                unique_articles.append(article)
+
+    unique_results = classify_unique_articles(unique_articles) if unique_articles else []
+    results_by_keyword = {}
+    for keyword, articles in articles_by_keyword.items():
+        clusters = clusters_by_keyword[keyword]
+        representative_results = [unique_results[index_by_url[articles[cluster[0]]['url']]] for cluster in clusters]
+        results_by_keyword[keyword] = expand_cluster_results(articles, clusters, representative_results)
+    return results_by_keyword, len(unique_articles)
+
+def run_batch_analysis(keywords, report=lambda stage, progress, message=None: None):
+    """
+    วิเคราะห์หลาย keyword ในงานเดียว: ดึงข่าวพร้อมกัน → วิเคราะห์ข่าวของทุก keyword ร่วมกัน
+    → บันทึกประวัติทุก keyword ใน transaction เดียว → trend/status/Word Cloud/Telegram ราย keyword
+    ผลของแต่ละ keyword เหมือนกับ run_analysis (ยกเว้นไม่ต้องดึงข่าวและเรียก Gemini แยกกัน)
+    """
+    report('fetch', 5, ANALYSIS_STAGE_MESSAGES['fetch'])
+    workers = max(1, min(ANALYZE_BATCH_FETCH_WORKERS, len(keywords)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch-fetch') as executor:
+        fetched = list(executor.map(lambda keyword: get_news_from_api(keyword, NEWS_API_KEY) or [], keywords))
+    articles_by_keyword = {keyword: articles for keyword, articles in zip(keywords, fetched) if articles}
+
+    report('classify', 20, ANALYSIS_STAGE_MESSAGES['classify'])
+    results_by_keyword, classified = classify_keyword_articles(articles_by_keyword)
+    tallies = {keyword: tally_results(results) for keyword, results in results_by_keyword.items()}
+    total_articles = sum(len(articles) for articles in articles_by_keyword.values())
+    print(f"Batch analysis: {len(keywords)} keywords, {total_articles} articles, {classified} stories classified")
+
+    report('history', 60, ANALYSIS_STAGE_MESSAGES['history'])
+    if tallies:
+        save_many_to_history([(keyword, tally['percentages']) for keyword, tally in tallies.items()])
+
+    summaries = []
+    for keyword in keywords:
+        if keyword not in tallies:
+            summaries.append(empty_analysis_result(keyword))
+            continue
+        summaries.append(complete_analysis(keyword, len(articles_by_keyword[keyword]), tallies[keyword], report))
+    return dict(keywords=keywords, summaries=summaries, article_count=total_articles, stories_classified=classified)
+# ============================================
+
 @app.route('/analyze', methods=['POST'])
 @login_required
 def analyze():
-    keyword = request.form.get('keyword', '').strip()
+    """
+    รับคำค้นหาแล้วส่งงานวิเคราะห์เข้าคิวเบื้องหลังทันที (ไม่รอให้วิเคราะห์เสร็จ)
+    - เรียกแบบ JSON: คืนค่า 202 พร้อม job_id และ URL สำหรับติดตามสถานะ
+    - ส่งจากฟอร์มหน้าเว็บ: redirect ไปหน้าผลลัพธ์ที่แสดงความคืบหน้าจนเสร็จ
+    คำค้นหาเดียวกันที่กำลังวิเคราะห์อยู่จะถูกรวมเป็นงานเดียว
+    """
+    # ใช้รูปเดียวกันทั้ง job key, สถานะ และการวิเคราะห์ ค้นหา "ais" ระหว่างที่งาน "AIS" รันอยู่จึงรวมเป็นงานเดียว
+    keyword = normalize_keyword(request.form.get('keyword') or (request.get_json(silent=True) or {}).get('keyword'))
+    if not keyword:
+        return jsonify({'error': 'Missing keyword'}), 400
 
     # ===== START: อัปเดต keyword ทันที =====
     # เพื่อให้ ESP32 เห็นคำค้นหาล่าสุดเสมอ แม้ว่าจะไม่เจอข่าวก็ตาม
-    latest_analysis_status["keyword"] = keyword
-    # latest_analysis_status["timestamp"] = int(time.time()) # บันทึกเวลาปัจจุบัน
+    status_store.set_current(keyword)
     print(f"Received search for '{keyword}', updating global keyword.")
     # ======================================
-    
-    articles = get_news_from_api(keyword, NEWS_API_KEY)
-    
-    results_data, labels, values = [], [], []
-    wordcloud_image, top_keywords = None, None
-    trend_message, trend_status = None, None
-    sentiment_summary = {'POSITIVE': 0, 'NEGATIVE': 0, 'NEUTRAL': 0}
-    negative_headlines_for_js = []
 
+    try:
+        job, created = analysis_jobs.submit(keyword, lambda report: run_analysis(keyword, report))
+    except JobQueueFull as e:
+        print(f"Warning: Analysis queue is full ({e})")
+        return jsonify({'error': 'ระบบกำลังวิเคราะห์งานอื่นอยู่จำนวนมาก กรุณาลองใหม่อีกครั้ง'}), 503
+
+    if request.is_json or request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'job_id': job.id,
+            'coalesced': not created,
+            'status_url': url_for('analysis_job_status', job_id=job.id),
+            'stream_url': url_for('analysis_job_stream', job_id=job.id),
+        }), 202
+    return redirect(url_for('analysis_result', job_id=job.id))
+
+@app.route('/analyze/<job_id>')
+@login_required
+def analysis_result(job_id):
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        flash('ไม่พบงานวิเคราะห์นี้ หรือผลลัพธ์หมดอายุแล้ว กรุณาค้นหาใหม่อีกครั้ง')
+        return redirect(url_for('index'))
+    if job.status == 'done':
+        return render_template('index.html', **job.result)
+    if job.status == 'error':
+        flash('เกิดข้อผิดพลาดระหว่างการวิเคราะห์ กรุณาลองใหม่อีกครั้ง')
+        return redirect(url_for('index'))
+    return render_template('index.html', job_id=job.id)
+
+@app.route('/api/analyze_batch', methods=['POST'])
+@login_required
+def analyze_batch():
+    """
+    วิเคราะห์หลาย keyword ในงานเดียว รับ JSON {"keywords": ["AIS", "TRUE", ...]} (หรือสตริงคั่นด้วย comma)
+    คืนค่า 202 พร้อม job_id และ URL สำหรับติดตามสถานะเหมือน /analyze
+    เมื่อเสร็จ result.summaries คือผลของแต่ละ keyword ตามลำดับที่ส่งมา (ข้อมูลชุดเดียวกับที่ /analyze ใช้แสดงผล)
+    ไม่เปลี่ยน keyword ล่าสุดที่ ESP32 แสดงอยู่
+    """
+    value = (request.get_json(silent=True) or {}).get('keywords') or request.form.get('keywords')
+    if isinstance(value, list):
+        value = ','.join(str(keyword) for keyword in value)
+    keywords = parse_keywords(value if isinstance(value, str) else None)
+    if not keywords:
+        return jsonify({'error': 'Missing keywords'}), 400
+    if len(keywords) > ANALYZE_BATCH_MAX_KEYWORDS:
+        return jsonify({'error': f'วิเคราะห์ได้ครั้งละไม่เกิน {ANALYZE_BATCH_MAX_KEYWORDS} keyword'}), 400
+
+    key = 'batch:' + ','.join(sorted(keywords))
+    try:
+        job, created = analysis_jobs.submit(key, lambda report: run_batch_analysis(keywords, report))
+    except JobQueueFull as e:
+        print(f"Warning: Analysis queue is full ({e})")
+        return jsonify({'error': 'ระบบกำลังวิเคราะห์งานอื่นอยู่จำนวนมาก กรุณาลองใหม่อีกครั้ง'}), 503
+
+    return jsonify({
+        'job_id': job.id,
+        'coalesced': not created,
+        'keywords': keywords,
+        'status_url': url_for('analysis_job_status', job_id=job.id),
+        'stream_url': url_for('analysis_job_stream', job_id=job.id),
+    }), 202
+
+@app.route('/api/jobs/<job_id>')
+@login_required
+def analysis_job_status(job_id):
+    """
+    API Endpoint สำหรับดูความคืบหน้าของงานวิเคราะห์ (มี result เมื่องานเสร็จแล้ว)
+    """
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.snapshot(include_result=job.status == 'done'))
+
+@app.route('/api/jobs/<job_id>/stream')
+@login_required
+def analysis_job_stream(job_id):
+    """
+    API Endpoint แบบ Server-Sent Events: ส่ง event 'progress' ทุกครั้งที่งานเปลี่ยนขั้นตอน และ 'done' เมื่องานจบ
+    """
+    job = analysis_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def generate():
+        for snapshot in analysis_jobs.stream(job):
+            if snapshot is None:
+                yield ": keep-alive\n\n"
+                continue
+            event = 'done' if snapshot['status'] in ('done', 'error') else 'progress'
+            yield f"event: {event}\ndata: {json.dumps(snapshot, ensure_ascii=False)}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# ===== START: Watchlist เฝ้าระวังหลาย keyword ตลอดเวลา =====
+# เกณฑ์ของ watchlist ตั้งแยกจากค่าเริ่มต้นของ detector เพราะแจ้งเตือนทาง Telegram โดยไม่มีคนสั่งวิเคราะห์
+WATCHLIST_MIN_COUNT = int(os.environ.get('WATCHLIST_MIN_COUNT', 5))
+WATCHLIST_SIGMAS = float(os.environ.get('WATCHLIST_SIGMAS', 3.0))
+watchlist_detectors = {}
+watchlist_detectors_lock = threading.Lock()
+
+def get_watchlist_detector(keyword):
+    with watchlist_detectors_lock:
+        detector = watchlist_detectors.get(keyword)
+        if detector is None:
+            detector = watchlist_detectors[keyword] = StreamingAnomalyDetector(
+                keyword=keyword, min_count=WATCHLIST_MIN_COUNT, sigmas=WATCHLIST_SIGMAS)
+        return detector
+
+def _classify_watchlist_articles(articles):
+    articles = sorted((a for a in articles if a.get('title') and a.get('url')), key=lambda a: a['publishedAt'])
+    return articles, (classify_articles(articles) if articles else [])
+
+def warm_up_watchlist(keyword, articles):
+    """รอบแรกของ keyword: ใช้ข่าวย้อนหลังสร้าง baseline ของ detector โดยไม่แจ้งเตือนชั่วโมงที่ผ่านไปแล้ว"""
+    articles, analysis_results = _classify_watchlist_articles(articles)
+    get_watchlist_detector(keyword).warm_up(
+        (article['publishedAt'], result['sentiment']) for article, result in zip(articles, analysis_results))
+
+def process_watchlist_articles(keyword, articles):
+    """
+    วิเคราะห์เฉพาะข่าวใหม่ของ keyword ใน watchlist แล้วป้อนเข้า StreamingAnomalyDetector ตามลำดับเวลา
+    ถ้าชั่วโมงใดมีข่าวเชิงลบเกินเกณฑ์ จะตั้งสถานะเป็น alert และแจ้งเตือนทาง Telegram
+    (ไม่เปลี่ยน keyword ที่หน้าจอแสดงอยู่ ผู้ใช้ยังเห็น keyword ที่ตัวเองวิเคราะห์ล่าสุด)
+    """
+    articles, analysis_results = _classify_watchlist_articles(articles)
     if not articles:
-        # ถ้าไม่เจอข่าว ให้รีเซ็ต status เป็น normal
-        latest_analysis_status["status"] = "normal"
-        latest_analysis_status["timestamp"] = int(time.time()) # บันทึกเวลาปัจจุบัน
-        print("No articles found. Setting status to normal.")
-    else:
-        try:
-            analysis_results = analyze_sentiment_with_gemini(articles, model)
-            print("Analysis successful using Gemini AI.")
-            sentiments_set = {res['sentiment'] for res in analysis_results}
-            if len(sentiments_set) == 1 and 'NEUTRAL' in sentiments_set:
-                raise ValueError("Gemini analysis returned all NEUTRAL, likely an error.")
-        except Exception as e:
-            print(f"Warning: Gemini failed ({e}), using Rule-based system as fallback...")
-            from transformers import pipeline
-            sentiment_analyzer = pipeline("sentiment-analysis", model="lxyuan/distilbert-base-multilingual-cased-sentiments-student")
-            headlines = [article['title'] for article in articles]
-            initial_analysis = sentiment_analyzer(headlines)
-            analysis_results = [{'title': article['title'], 'url': article['url'], 'sentiment': apply_sentiment_rules(initial_analysis[i]['label'].upper(), article['title'])} for i, article in enumerate(articles)]
-
-        negative_headlines_text = ""
-        label_map_thai = {"POSITIVE": "ข่าวเชิงบวก", "NEGATIVE": "ข่าวเชิงลบ", "NEUTRAL": "ข่าวเป็นกลาง"}
-        
-        for result in analysis_results:
-            final_label = result['sentiment']
-            sentiment_summary[final_label] += 1
-            results_data.append({
-                'title': result['title'], 'url': result['url'], 'sentiment': final_label,
-                'sentiment_thai': label_map_thai.get(final_label, "ไม่ระบุ")
-            })
-            if final_label == 'NEGATIVE':
-                negative_headlines_text += result['title'] + " "
-                negative_headlines_for_js.append(result['title'])
-        
-        sort_order = {"NEGATIVE": 0, "NEUTRAL": 1, "POSITIVE": 2}
-        results_data.sort(key=lambda x: sort_order.get(x['sentiment'], 3))
-
-        total_articles = len(articles) if articles else 1
-        percentages = {label: (count / total_articles) * 100 for label, count in sentiment_summary.items()}
-        current_negative_percent = percentages.get('NEGATIVE', 0)
-        save_to_history(keyword, percentages)
-        historical_avg = get_historical_average(keyword)
-        if historical_avg is not None and historical_avg > 0:
-            if current_negative_percent > historical_avg * 1.2: trend_message, trend_status = f"สูงกว่าค่าเฉลี่ย 7 วันล่าสุด ({historical_avg:.1f}%)", "alert"
-            elif current_negative_percent < historical_avg * 0.8: trend_message, trend_status = f"ต่ำกว่าค่าเฉลี่ย 7 วันล่าสุด ({historical_avg:.1f}%)", "good"
-            else: trend_message, trend_status = f"ใกล้เคียงกับค่าเฉลี่ย 7 วันล่าสุด ({historical_avg:.1f}%)", "normal"
-        else:
-            trend_message, trend_status = "ยังไม่มีข้อมูลย้อนหลังเพียงพอ", "normal"
-        
-        is_volume_crisis = sentiment_summary['NEGATIVE'] > sentiment_summary['POSITIVE']
-        if trend_status != 'alert' and is_volume_crisis:
-            print("Volume crisis detected, overriding status to alert.")
-            trend_status = 'alert'
-            trend_message = f"สัดส่วนข่าวเชิงลบ ({sentiment_summary['NEGATIVE']}) มากกว่าข่าวเชิงบวก ({sentiment_summary['POSITIVE']})"
-
-        # ===== START: อัปเดต status หลังวิเคราะห์เสร็จ =====
-        latest_analysis_status["status"] = trend_status
-        latest_analysis_status["timestamp"] = int(time.time())
-        print(f"Analysis complete. Final status: {latest_analysis_status}")
-        # ===============================================
-
-        if negative_headlines_text:
-            wordcloud_image = create_wordcloud(negative_headlines_text)
-            top_keywords = extract_keywords(negative_headlines_text)
-        
-        if trend_status == 'alert':
-            notification_message = f"Crisis Alert: {keyword}\nสถานการณ์: {trend_message}\nประเด็นร้อน: {', '.join(top_keywords)}"
-            send_telegram_notification(notification_message)
-
-        labels = [label_map_thai.get(label) for label in sentiment_summary.keys()]
-        values = list(sentiment_summary.values())
-
-    return render_template('index.html', 
-                           keyword=keyword, results=results_data,
-                           labels=json.dumps(labels), values=json.dumps(values),
-                           wordcloud_image=wordcloud_image, top_keywords=top_keywords,
-                           trend_message=trend_message, trend_status=trend_status,
-                           sentiment_summary=sentiment_summary,
-                           negative_headlines_for_js=negative_headlines_for_js)
-                        
+        return {'status': 'normal'}
+    detector = get_watchlist_detector(keyword)
+    events = detector.add_many((article['publishedAt'], result['sentiment'])
+                               for article, result in zip(articles, analysis_results))
+    negative_count = sum(1 for result in analysis_results if result['sentiment'] == 'NEGATIVE')
+    if not events:
+        return {'status': 'normal', 'articles': len(articles), 'negative': negative_count}
+
+    status_store.update(keyword, "alert", make_current=False)
+    event = events[-1]
+    print(f"Watchlist: Alert for '{keyword}': {event}")
+    send_telegram_notification(
+        f"Crisis Alert (Watchlist): {keyword}\n"
+        f"สถานการณ์: ข่าวเชิงลบ {event['negative_count']} ข่าวในชั่วโมงเดียว (เกณฑ์ {event['threshold']})",
+        coalesce_key=keyword
+    )
+    return {'status': 'alert', 'articles': len(articles), 'negative': negative_count, 'events': events}
+
+watchlist = None
+WATCHLIST_KEYWORDS = parse_keywords(os.environ.get('WATCHLIST_KEYWORDS'))
+# ใช้ file lock ให้มี scheduler แค่ worker เดียว เมื่อรันด้วย gunicorn หลาย worker
+# ต้องเก็บ handle ไว้ตลอดอายุ process (ถ้าถูก garbage collect ไฟล์จะถูกปิดและล็อกหลุดทันที)
+_watchlist_lock = acquire_process_lock() if WATCHLIST_KEYWORDS else None
+if _watchlist_lock is not None:
+    watchlist = WatchlistScheduler(
+        WATCHLIST_KEYWORDS,
+        fetch=lambda keyword: get_default_client(NEWS_API_KEY).fetch_articles(keyword),
+        process=process_watchlist_articles,
+        warmup=warm_up_watchlist,
+    ).start()
+
+@app.route('/api/watchlist')
+@login_required
+def watchlist_status():
+    """
+    API Endpoint สำหรับดูสถานะของแต่ละ keyword ใน watchlist (รอบถัดไป, high-water mark, ผลล่าสุด)
+    อ่านจาก history.db ทุก worker จึงตอบเหมือนกัน ไม่ว่า scheduler จะรันอยู่ใน worker ไหน
+    """
+    if not WATCHLIST_KEYWORDS:
+        return jsonify({'enabled': False, 'keywords': []})
+    return jsonify(dict(get_watchlist_status(WATCHLIST_KEYWORDS), enabled=True))
+# ===== END: Watchlist =====
+
 # ===== START: เพิ่ม Route สำหรับ Login และ Logout =====
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -320,17 +565,8 @@ def logout():
     return redirect(url_for('login'))
 # ===== END: เพิ่ม Route =====
 
-@app.route('/get_pr_suggestion', methods=['POST'])
-def get_pr_suggestion():
-    data = request.json
-    keyword = data.get('keyword')
-    top_keywords = data.get('top_keywords')
-    negative_headlines = data.get('negative_headlines')
-
-    if not keyword or not top_keywords or not negative_headlines:
-        return jsonify({'error': 'ยังไม่มีข้อมูลย้อนหลังเพียงพอ'}), 400
-
-    prompt = f"""
+def build_pr_suggestion_prompt(keyword, top_keywords, negative_headlines):
+    return f"""
     ในฐานะผู้เชี่ยวชาญด้านการประชาสัมพันธ์และการจัดการภาวะวิกฤต โปรดร่าง "ข้อความชี้แจงเบื้องต้น" สำหรับโพสต์ลงโซเชียลมีเดีย (เช่น Facebook, X) เพื่อสื่อสารกับสาธารณะเกี่ยวกับสถานการณ์เชิงลบที่เกิดขึ้น
 
     **ข้อมูลประกอบ:**
@@ -342,20 +578,9 @@ def get_pr_suggestion():
     **ข้อกำหนดในการร่างข้อความ:**
     1.  ยอมรับปัญหา, 2. แสดงความห่วงใย, 3. แจ้งการดำเนินการ, 4. ระบุช่องทางติดต่อ, 5. ใช้ภาษาที่เป็นกลาง
     """
-    try:
-        safety_settings = {
-            'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE',
-            'HARM_CATEGORY_HATE_SPEECH': 'BLOCK_NONE',
-            'HARM_CATEGORY_SEXUALLY_EXPLICIT': 'BLOCK_NONE',
-            'HARM_CATEGORY_DANGEROUS_CONTENT': 'BLOCK_NONE',
-        }
-        response = model.generate_content(prompt, safety_settings=safety_settings)
-        if not response.text:
-            raise ValueError("Gemini returned an empty response.")
-        return jsonify({'suggestion': response.text})
-    except Exception as e:
-        print(f"Warning: Gemini suggestion failed ({e}), providing a fallback response.")
-        fallback_suggestion = f"""เรียน สื่อมวลชนและผู้ติดตามทุกท่าน,
+
+def pr_suggestion_fallback(keyword, top_keywords):
+    return f"""เรียน สื่อมวลชนและผู้ติดตามทุกท่าน,
 
 จากกรณีที่เกิดขึ้นเกี่ยวกับ [{keyword}] ซึ่งเกี่ยวข้องกับประเด็น [{', '.join(top_keywords)}] ทางเราได้รับทราบถึงปัญหาดังกล่าวแล้ว และไม่ได้นิ่งนอนใจต่อสถานการณ์ที่เกิดขึ้น
 
@@ -365,20 +590,9 @@ def get_pr_suggestion():
 
 ขอขอบพระคุณสำหรับความเข้าใจของท่าน
 ทีมงานประชาสัมพันธ์ [{keyword}]"""
-        return jsonify({'suggestion': fallback_suggestion})
 
-@app.route('/get_executive_summary', methods=['POST'])
-def get_executive_summary():
-    data = request.json
-    keyword = data.get('keyword')
-    sentiment_summary = data.get('sentiment_summary')
-    top_keywords = data.get('top_keywords')
-    trend_message = data.get('trend_message')
-
-    if not all([keyword, sentiment_summary, top_keywords, trend_message]):
-        return jsonify({'error': 'ยังไม่มีข้อมูลย้อนหลังเพียงพอ'}), 400
-
-    prompt = f"""
+def build_executive_summary_prompt(keyword, sentiment_summary, top_keywords, trend_message):
+    return f"""
     ในฐานะนักวิเคราะห์กลยุทธ์อาวุโส โปรดสังเคราะห์ข้อมูลภาพลักษณ์ของแบรนด์ '{keyword}' ต่อไปนี้ และเขียน "บทสรุปสำหรับผู้บริหาร" (Executive Summary) ความยาว 1 ย่อหน้า (ไม่เกิน 4-5 บรรทัด) เพื่อให้ผู้บริหารเข้าใจสถานการณ์ได้อย่างรวดเร็วที่สุด
 
     **ข้อมูลดิบ:**
@@ -394,21 +608,101 @@ def get_executive_summary():
     ---
     [เริ่มต้นบทสรุปที่นี่]
     """
+
+EXECUTIVE_SUMMARY_FALLBACK = "ไม่สามารถสร้างบทสรุปอัตโนมัติได้ในขณะนี้ เนื่องจากเกิดข้อผิดพลาดในการเชื่อมต่อกับ AI กรุณาลองใหม่อีกครั้ง"
+
+def stream_llm_response(route, prompt, fallback):
+    """
+    ส่งคำตอบของ Gemini แบบ Server-Sent Events: event 'chunk' ทุกครั้งที่ได้ข้อความส่วนใหม่
+    ถ้า Gemini ล้มเหลวจะส่ง event 'fallback' พร้อมข้อความสำรอง แล้วจบด้วย event 'done' ที่มีข้อความเต็ม
+    """
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def generate():
+        parts = []
+        try:
+            for text in llm_gateway.stream(route, model, prompt, safety_settings=SAFETY_SETTINGS):
+                parts.append(text)
+                yield sse('chunk', {'text': text})
+            yield sse('done', {'text': ''.join(parts), 'fallback': False})
+        except Exception as e:
+            print(f"Warning: Gemini {route} stream failed ({e}), providing a fallback response.")
+            yield sse('fallback', {'text': fallback})
+            yield sse('done', {'text': fallback, 'fallback': True})
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/get_pr_suggestion', methods=['POST'])
+def get_pr_suggestion():
+    data = request.json
+    keyword = data.get('keyword')
+    top_keywords = data.get('top_keywords')
+    negative_headlines = data.get('negative_headlines')
+
+    if not keyword or not top_keywords or not negative_headlines:
+        return jsonify({'error': 'ยังไม่มีข้อมูลย้อนหลังเพียงพอ'}), 400
+
+    prompt = build_pr_suggestion_prompt(keyword, top_keywords, negative_headlines)
     try:
-        safety_settings = {
-            'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE',
-            'HARM_CATEGORY_HATE_SPEECH': 'BLOCK_NONE',
-            'HARM_CATEGORY_SEXUALLY_EXPLICIT': 'BLOCK_NONE',
-            'HARM_CATEGORY_DANGEROUS_CONTENT': 'BLOCK_NONE',
-        }
-        response = model.generate_content(prompt, safety_settings=safety_settings)
-        if not response.text:
-            raise ValueError("Gemini returned an empty response.")
-        return jsonify({'summary': response.text})
+        suggestion = llm_gateway.generate('pr_suggestion', model, prompt, safety_settings=SAFETY_SETTINGS)
+        return jsonify({'suggestion': suggestion})
+    except Exception as e:
+        print(f"Warning: Gemini suggestion failed ({e}), providing a fallback response.")
+        return jsonify({'suggestion': pr_suggestion_fallback(keyword, top_keywords)})
+
+@app.route('/get_pr_suggestion/stream', methods=['POST'])
+def get_pr_suggestion_stream():
+    """
+    เหมือน /get_pr_suggestion แต่ส่งข้อความทีละส่วนแบบ Server-Sent Events ระหว่างที่ Gemini กำลังเขียน
+    """
+    data = request.json
+    keyword = data.get('keyword')
+    top_keywords = data.get('top_keywords')
+    negative_headlines = data.get('negative_headlines')
+
+    if not keyword or not top_keywords or not negative_headlines:
+        return jsonify({'error': 'ยังไม่มีข้อมูลย้อนหลังเพียงพอ'}), 400
+
+    prompt = build_pr_suggestion_prompt(keyword, top_keywords, negative_headlines)
+    return stream_llm_response('pr_suggestion', prompt, pr_suggestion_fallback(keyword, top_keywords))
+
+@app.route('/get_executive_summary', methods=['POST'])
+def get_executive_summary():
+    data = request.json
+    keyword = data.get('keyword')
+    sentiment_summary = data.get('sentiment_summary')
+    top_keywords = data.get('top_keywords')
+    trend_message = data.get('trend_message')
+
+    if not all([keyword, sentiment_summary, top_keywords, trend_message]):
+        return jsonify({'error': 'ยังไม่มีข้อมูลย้อนหลังเพียงพอ'}), 400
+
+    prompt = build_executive_summary_prompt(keyword, sentiment_summary, top_keywords, trend_message)
+    try:
+        summary = llm_gateway.generate('executive_summary', model, prompt, safety_settings=SAFETY_SETTINGS)
+        return jsonify({'summary': summary})
     except Exception as e:
         print(f"Warning: Gemini executive summary failed ({e}), providing a fallback response.")
-        fallback_summary = "ไม่สามารถสร้างบทสรุปอัตโนมัติได้ในขณะนี้ เนื่องจากเกิดข้อผิดพลาดในการเชื่อมต่อกับ AI กรุณาลองใหม่อีกครั้ง"
-        return jsonify({'summary': fallback_summary})
+        return jsonify({'summary': EXECUTIVE_SUMMARY_FALLBACK})
+
+@app.route('/get_executive_summary/stream', methods=['POST'])
+def get_executive_summary_stream():
+    """
+    เหมือน /get_executive_summary แต่ส่งบทสรุปทีละส่วนแบบ Server-Sent Events
+    """
+    data = request.json
+    keyword = data.get('keyword')
+    sentiment_summary = data.get('sentiment_summary')
+    top_keywords = data.get('top_keywords')
+    trend_message = data.get('trend_message')
+
+    if not all([keyword, sentiment_summary, top_keywords, trend_message]):
+        return jsonify({'error': 'ยังไม่มีข้อมูลย้อนหลังเพียงพอ'}), 400
+
+    prompt = build_executive_summary_prompt(keyword, sentiment_summary, top_keywords, trend_message)
+    return stream_llm_response('executive_summary', prompt, EXECUTIVE_SUMMARY_FALLBACK)
 
 @app.route('/send_summary_telegram', methods=['POST'])
 def send_summary_telegram():
@@ -424,7 +718,7 @@ def send_summary_telegram():
     success = send_telegram_notification(telegram_message)
     
     if success:
-        return jsonify({'success': True, 'message': 'ส่งบทสรุปเข้า Telegram สำเร็จ'})
+        return jsonify({'success': True, 'message': 'ส่งบทสรุปเข้าคิว Telegram แล้ว'})
     else:
         return jsonify({'success': False, 'message': 'ไม่สามารถส่งบทสรุปเข้า Telegram ได้'}), 500
 
@@ -446,17 +740,8 @@ def get_root_cause():
     {"\n".join([f"- {h}" for h in negative_headlines])}
     """
     try:
-        safety_settings = {
-            'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE',
-            'HARM_CATEGORY_HATE_SPEECH': 'BLOCK_NONE',
-            'HARM_CATEGORY_SEXUALLY_EXPLICIT': 'BLOCK_NONE',
-            'HARM_CATEGORY_DANGEROUS_CONTENT': 'BLOCK_NONE',
-        }
-        response = model.generate_content(prompt, safety_settings=safety_settings)
-        
-        cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
-        analysis_result = json.loads(cleaned_response)
-        
+        analysis_result = llm_gateway.generate('root_cause', model, prompt, safety_settings=SAFETY_SETTINGS,
+                                               parse=parse_root_cause_response)
         return jsonify(analysis_result)
     except Exception as e:
         print(f"Warning: Gemini root cause analysis failed ({e})")
@@ -467,20 +752,76 @@ def get_root_cause():
 @app.route('/api/crisis_status')
 def crisis_status():
     """
-    API Endpoint ที่จะคืนค่าสถานะล่าสุด และรีเซ็ตสถานะ alert ที่หมดอายุแล้ว
+    API Endpoint ที่จะคืนค่าสถานะล่าสุด (alert หมดอายุเองหลัง ALERT_DURATION_SECONDS วินาที)
+    - ?keyword=... ดูสถานะของคำค้นหานั้น (ไม่ระบุ = คำค้นหาล่าสุด)
+    - ส่ง If-None-Match ที่ได้จาก ETag ครั้งก่อน: ถ้าไม่มีอะไรเปลี่ยนจะได้ 304 ที่ไม่มี body
+    - ?wait=N (สูงสุด 30 วินาที) คู่กับ If-None-Match: ถือคำขอไว้จนกว่าสถานะจะเปลี่ยน (long-poll)
+    """
+    keyword = normalize_keyword(request.args.get('keyword')) or None
+    wait = min(request.args.get('wait', 0, type=float), CRISIS_STATUS_MAX_WAIT_SECONDS)
+
+    payload, etag = status_store.poll(keyword, request.if_none_match, wait)
+    response = Response(status=304) if payload is None else jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/wordcloud/<key>.png')
+def wordcloud_png(key):
+    """
+    ส่งภาพ Word Cloud ตาม key (ชื่อมาจากเนื้อหา จึงให้ browser แคชได้นาน)
+    """
+    data = wordcloud_store.get_png(key)
+    if data is None:
+        return jsonify({'error': 'Word cloud not found'}), 404
+    return Response(data, mimetype='image/png',
+                    headers={'Cache-Control': 'public, max-age=31536000, immutable'})
+
+@app.route('/api/model_stats')
+@login_required
+def model_stats():
+    """
+    API Endpoint สำหรับดูเวลาโหลดและหน่วยความจำของโมเดลสำรองที่โหลดไว้ใน worker นี้
+    """
+    return jsonify(model_registry.get_model_stats())
+
+@app.route('/api/llm_gateway_stats')
+@login_required
+def llm_gateway_stats():
     """
-    ALERT_DURATION_SECONDS = 60 # กำหนดให้ Alert อยู่ได้นาน 1 นาที
+    API Endpoint สำหรับดู hit rate, จำนวนคำขอที่ถูกรวม และ latency (p50/p95) ของแต่ละ route ที่เรียก Gemini
+    รวมถึงตัวนับของตัวแปลง JSON (รายการที่กู้ได้จากคำตอบที่เสีย / รายการที่ต้องส่งไปวิเคราะห์ใหม่)
+    สัดส่วนข่าวที่ cascade ตัดสินเองโดยไม่ต้องเรียก Gemini และจำนวนข่าว/token/latency ต่อ batch ของการวิเคราะห์ sentiment
+    """
+    return jsonify(dict(llm_gateway.get_stats(), json_parser=get_parse_stats(),
+                        cascade=sentiment_cascade.get_cascade_stats(),
+                        sentiment_batches=get_default_packer().get_stats()))
 
-    # ตรวจสอบว่าสถานะปัจจุบันคือ 'alert' และหมดเวลาแล้วหรือยัง
-    if latest_analysis_status["status"] == "alert":
-        current_time = int(time.time())
-        alert_time = latest_analysis_status.get("timestamp", 0)
+@app.route('/api/circuit_breakers')
+@login_required
+def circuit_breakers():
+    """
+    API Endpoint สำหรับดูสถานะ circuit breaker ของ Gemini และ NewsAPI (closed/open/half_open)
+    พร้อมสัดส่วนที่ล้มเหลว/ช้าในหน้าต่างเวลา, latency p50/p95 และจำนวนคำขอที่ถูกตัดไปใช้แผนสำรอง
+    """
+    return jsonify({'breakers': get_breaker_stats(), 'newsapi_client': get_default_client(NEWS_API_KEY).get_stats()})
 
-        if (current_time - alert_time) > ALERT_DURATION_SECONDS:
-            print("Alert has expired. Resetting status to normal.")
-            latest_analysis_status["status"] = "normal" # รีเซ็ตสถานะกลับเป็นปกติ
+@app.route('/api/notifier_stats')
+@login_required
+def notifier_stats():
+    """
+    API Endpoint สำหรับดูคิว Telegram: จำนวนที่ส่งแล้ว/รวมข้อความ/ลองใหม่/โดน 429 และข้อความที่ค้างอยู่
+    """
+    return jsonify(telegram_notifier.get_stats())
 
-    return jsonify(latest_analysis_status)
+@app.route('/api/sentiment_cache_stats')
+@login_required
+def sentiment_cache_stats():
+    """
+    API Endpoint สำหรับดูจำนวน hit/miss ของแคชผลวิเคราะห์ (hits = จำนวนข่าวที่ไม่ต้องส่งไปยัง LLM)
+    """
+    return jsonify(sentiment_cache.get_default_cache().get_stats())
 
 
 # ===== START: Route ใหม่สำหรับห้องจำลองสถานการณ์ =====
@@ -500,18 +841,8 @@ def simulate_crisis():
     {{"key_concerns": ["ประเด็นกังวลหลัก 1", "ประเด็นกังวลหลัก 2"], "viral_score": คะแนน (1-10), "first_action": "สิ่งแรกที่ทีม PR ควรทำภายใน 1 ชั่วโมง"}}
     """
     try:
-        safety_settings = {
-            'HARM_CATEGORY_HARASSMENT': 'BLOCK_NONE',
-            'HARM_CATEGORY_HATE_SPEECH': 'BLOCK_NONE',
-            'HARM_CATEGORY_SEXUALLY_EXPLICIT': 'BLOCK_NONE',
-            'HARM_CATEGORY_DANGEROUS_CONTENT': 'BLOCK_NONE',
-        }
-        response = model.generate_content(prompt, safety_settings=safety_settings)
-
-        # ทำความสะอาดและแปลงผลลัพธ์จาก AI ให้เป็น JSON
-        cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
-        simulation_result = json.loads(cleaned_response)
-
+        simulation_result = llm_gateway.generate('simulate_crisis', model, prompt, safety_settings=SAFETY_SETTINGS,
+                                                 parse=parse_simulation_response)
         return jsonify(simulation_result)
     except Exception as e:
         print(f"Warning: Gemini simulation failed ({e})")
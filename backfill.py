@@ -0,0 +1,212 @@
+import argparse
+import csv
+import gzip
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import history_store
+import model_registry
+from sentiment_rules import apply_sentiment_rules
+
+# ==============================================================================
+# Backfill ประวัติย้อนหลังจากไฟล์ข่าวเก่า (JSONL หรือ CSV, รองรับ .gz) เพื่อให้มีค่า baseline ตั้งแต่วันแรก
+# - อ่านไฟล์ทีละบรรทัด (generator) แบ่งเป็นชุดละ --chunk-size ข่าว ส่งให้ process pool วิเคราะห์ด้วยโมเดลในเครื่อง
+#   (worker ละ 1 โมเดล ค่าเริ่มต้นจำนวน worker = จำนวน core) ส่งงานค้างได้ไม่เกิน 2 ชุดต่อ worker
+# - ผลแต่ละชุดนับเป็นจำนวนข่าวราย keyword ต่อชั่วโมง แล้วสะสมลงตารางพักใน history.db พร้อม checkpoint
+#   ใน transaction เดียวกัน หยุดกลางทาง (Ctrl+C, เครื่องดับ) แล้วรันคำสั่งเดิมซ้ำจะทำต่อจากจุดเดิม
+# - อ่านครบทุกไฟล์แล้วจึงย้ายเป็นแถวใน analysis_history (1 แถวต่อ keyword ต่อชั่วโมง) + rollup ทีละชุด
+# หน่วยความจำคงที่ไม่ว่าไฟล์ใหญ่แค่ไหน (ถือข่าวในหน่วยความจำไม่เกินจำนวนชุดที่ค้างอยู่ใน pool)
+# รูปแบบข่าว: JSONL แบบ NewsAPI ({"title", "publishedAt", "keyword"?}) หรือ CSV ที่มีคอลัมน์ title และ
+#            timestamp/publishedAt (เช่น pr_crisis_data.csv) ถ้าไม่มีคอลัมน์ keyword ใช้ --keyword แทน
+# รัน: python backfill.py archive/ais-2025-*.jsonl.gz --keyword AIS
+#      python backfill.py pr_crisis_data.csv --keyword AIS --workers 4
+# ==============================================================================
+DEFAULT_CHUNK_SIZE = 1000
+FLUSH_ROWS = 1000
+LABEL_INDEX = {'POSITIVE': 0, 'NEGATIVE': 1, 'NEUTRAL': 2}
+TIMESTAMP_FIELDS = ('publishedAt', 'timestamp', 'published_at')
+
+
+def _open(path, **kwargs):
+    opener = gzip.open if path.endswith('.gz') else open
+    return opener(path, **kwargs)
+
+
+def _is_csv(path):
+    return path[:-3].endswith('.csv') if path.endswith('.gz') else path.endswith('.csv')
+
+
+def read_jsonl(path, start):
+    """yield (position, record) โดย position คือ byte offset หลังบรรทัดนั้น (resume ด้วย seek ได้ทันที)"""
+    with _open(path, mode='rb') as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            position += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield position, record if isinstance(record, dict) else None
+
+
+def read_csv(path, start):
+    """yield (position, record) โดย position คือจำนวนแถวที่อ่านแล้ว (resume ด้วยการข้ามแถว)"""
+    with _open(path, mode='rt', encoding='utf-8-sig', newline='') as f:
+        for position, row in enumerate(csv.DictReader(f), start=1):
+            if position > start:
+                yield position, row
+
+
+def parse_bucket(value):
+    """แปลงเวลาเผยแพร่ (ISO 8601, UTC หรือมี timezone) เป็นต้นชั่วโมงตามเวลาเครื่อง แบบเดียวกับ analysis_date"""
+    try:
+        published = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if published.tzinfo is not None:
+        published = published.astimezone().replace(tzinfo=None)
+    return published.strftime(history_store.BUCKET_FORMATS['hour'])
+
+
+def read_headlines(paths, default_keyword, checkpoints, stats):
+    """
+    generator ของ (source, position, keyword, bucket_start, title) จากทุกไฟล์ตามลำดับ เริ่มจาก checkpoint ของแต่ละไฟล์
+    แถวที่ไม่มีหัวข้อ/เวลา/keyword จะถูกข้าม (นับใน stats['skipped']) แต่ยังเลื่อน position ไปด้วย
+    """
+    for path in paths:
+        source = os.path.abspath(path)
+        start, _ = checkpoints.get(source, (0, 0))
+        if start:
+            print(f"Backfill: Resuming {path} from position {start}")
+        reader = read_csv if _is_csv(path) else read_jsonl
+        for position, record in reader(path, start):
+            record = record or {}
+            title = (record.get('title') or '').strip()
+            keyword = (record.get('keyword') or default_keyword or '').strip()
+            bucket_start = next((parse_bucket(record[field]) for field in TIMESTAMP_FIELDS if record.get(field)), None)
+            if not (title and keyword and bucket_start):
+                stats['skipped'] += 1
+                yield source, position, None, None, None
+                continue
+            yield source, position, keyword, bucket_start, title
+
+
+def chunked(headlines, size):
+    """
+    รวม headline เป็นชุดละ size ข่าว คืนค่า (items, positions)
+    positions คือ {source: (ตำแหน่งล่าสุด, จำนวนแถวที่อ่านในชุดนี้)} ของแต่ละไฟล์ในชุด
+    """
+    items, positions = [], {}
+    for source, position, keyword, bucket_start, title in headlines:
+        positions[source] = (position, positions.get(source, (0, 0))[1] + 1)
+        if title is not None:
+            items.append((keyword, bucket_start, title))
+        if len(items) >= size:
+            yield items, positions
+            items, positions = [], {}
+    if items or positions:
+        yield items, positions
+
+
+def _init_worker(num_threads):
+    """โหลดโมเดลครั้งเดียวต่อ worker process (และจำกัด thread ของ torch ไม่ให้แย่ง core กันเอง)"""
+    os.environ.setdefault('FALLBACK_NUM_THREADS', str(num_threads))
+    backend = model_registry.get_fallback_backend()
+    if backend == 'pipeline':
+        model_registry.get_sentiment_pipeline()
+    else:
+        model_registry.get_inference_engine(backend=backend)
+
+
+def classify_chunk(items):
+    """
+    วิเคราะห์ข่าวหนึ่งชุด (รันใน worker) ด้วยโมเดลในเครื่อง + กฎภาษาไทย แบบเดียวกับแผนสำรองของ /analyze
+    ไม่ใช้ SentimentCache (ข่าวย้อนหลังส่วนใหญ่ไม่ซ้ำกัน และหลาย process เขียนไฟล์เดียวกันพร้อมกันจะช้า)
+    คืนค่า {(keyword, bucket_start): [positive, negative, neutral]}
+    """
+    labels = model_registry.predict_labels([title for _, _, title in items], use_cache=False)
+    counts = {}
+    for (keyword, bucket_start, title), label in zip(items, labels):
+        label = apply_sentiment_rules(label, title)
+        bucket = counts.setdefault((keyword, bucket_start), [0, 0, 0])
+        bucket[LABEL_INDEX.get(label, LABEL_INDEX['NEUTRAL'])] += 1
+    return counts
+
+
+def bounded_map(executor, fn, chunks, window):
+    """
+    เหมือน executor.map แต่ส่งงานค้างไว้ไม่เกิน window ชุด (executor.map อ่าน input ทั้งหมดก่อน หน่วยความจำจึงโตตามไฟล์)
+    คืนผลตามลำดับเดิม เป็น (checkpoints, result, จำนวนข่าว)
+    """
+    pending = deque()
+    for items, positions in chunks:
+        pending.append((executor.submit(fn, items) if items else None, positions, len(items)))
+        if len(pending) >= window:
+            future, positions, size = pending.popleft()
+            yield positions, future.result() if future else {}, size
+    while pending:
+        future, positions, size = pending.popleft()
+        yield positions, future.result() if future else {}, size
+
+
+def run_backfill(paths, keyword=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, db_path=None):
+    workers = workers or int(os.environ.get('BACKFILL_WORKERS') or 0) or os.cpu_count() or 1
+    checkpoints = history_store.get_backfill_checkpoints(db_path)
+    stats = {'classified': 0, 'skipped': 0, 'chunks': 0}
+    records = {source: count for source, (_, count) in checkpoints.items()}
+    started = last_report = time.time()
+
+    headlines = read_headlines(paths, keyword, checkpoints, stats)
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"Backfill: {len(paths)} file(s), {workers} worker(s) x {num_threads} thread(s), chunk size {chunk_size}")
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(num_threads,)) as executor:
+        try:
+            for positions, counts, size in bounded_map(executor, classify_chunk, chunked(headlines, chunk_size),
+                                                       workers * 2):
+                for source, (_, consumed) in positions.items():
+                    records[source] = records.get(source, 0) + consumed
+                history_store.save_backfill_chunk(
+                    counts, {source: (position, records[source]) for source, (position, _) in positions.items()},
+                    db_path)
+                stats['classified'] += size
+                stats['chunks'] += 1
+                if time.time() - last_report >= 10:
+                    last_report = time.time()
+                    rate = stats['classified'] / (last_report - started)
+                    print(f"Backfill: {stats['classified']} headlines classified ({rate:.0f}/s), "
+                          f"{stats['skipped']} skipped")
+        except KeyboardInterrupt:
+            executor.shutdown(wait=False, cancel_futures=True)
+            print("Backfill: Interrupted. Progress up to the last saved chunk is kept; run the same command to resume.")
+            raise
+
+    rows = 0
+    while True:
+        moved = history_store.flush_backfill_counts(FLUSH_ROWS, db_path)
+        if not moved:
+            break
+        rows += moved
+    stats['history_rows'] = rows
+    stats['seconds'] = round(time.time() - started, 1)
+    print(f"Backfill: Done. {stats['classified']} headlines classified, {stats['skipped']} skipped, "
+          f"{rows} hourly rows written to history in {stats['seconds']}s")
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backfill history.db from archived headlines (JSONL/CSV, .gz ok)")
+    parser.add_argument('paths', nargs='+', help='ไฟล์ข่าวย้อนหลัง .jsonl/.csv (หรือ .gz)')
+    parser.add_argument('--keyword', help='keyword ของข่าวที่ไม่มีฟิลด์ keyword')
+    parser.add_argument('--workers', type=int, help='จำนวน process (ค่าเริ่มต้น BACKFILL_WORKERS หรือจำนวน core)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='จำนวนข่าวต่อชุด/ต่อ transaction')
+    parser.add_argument('--db', help='ไฟล์ฐานข้อมูล (ค่าเริ่มต้น HISTORY_DB_PATH หรือ history.db)')
+    args = parser.parse_args()
+    run_backfill(args.paths, args.keyword, args.workers, args.chunk_size, args.db)
@@ -0,0 +1,112 @@
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from benchmarks.dedup import make_syndicated_feed
+from benchmarks.fakes import FakeGeminiModel, FakeSentimentPipeline
+from benchmarks.newsapi_stub import NewsApiStub
+from benchmarks.pipeline import configure_environment, make_fixture_articles, reset_caches
+
+# ==============================================================================
+# Benchmark: /analyze ทีละ keyword (N งาน) เทียบกับ /api/analyze_batch (งานเดียว)
+# ข่าวจำลอง: ข่าวเฉพาะของแต่ละ keyword + ข่าวที่กล่าวถึงทุก keyword (ถูกดึงมาซ้ำจากทุกคำค้นหา)
+# วัดเวลารวม, จำนวนคำขอ NewsAPI, จำนวน request ไป Gemini, จำนวน transaction ที่เขียนประวัติ
+# และตรวจว่าสรุปผลของแต่ละ keyword (จำนวนข่าวแต่ละ sentiment, trend_status) ตรงกันทั้งสองแบบ
+# รัน: python -m benchmarks.analyze_batch --keywords AIS TRUE DTAC --per-keyword 60 --shared 30
+# ==============================================================================
+
+
+def make_articles(keywords, per_keyword, shared):
+    articles = []
+    for keyword in keywords:
+        articles += make_fixture_articles(per_keyword, keyword=keyword)
+    # หัวข้อข่าวที่มีทุก keyword: NewsApiStub ส่งข่าวชุดนี้ให้ทุกคำค้นหา (URL เดียวกัน)
+    titles = [title for title, _ in make_syndicated_feed(shared, brand=' '.join(keywords), seed=29)]
+    articles += [{'source': {'id': None, 'name': 'Shared'}, 'title': title, 'url': f"https://example.com/shared/{i}",
+                  'publishedAt': '2025-07-23T09:00:00Z'} for i, title in enumerate(titles)]
+    return articles
+
+
+@contextlib.contextmanager
+def counting(app_module, names, counts):
+    """นับจำนวนครั้งที่ฟังก์ชันใน app ถูกเรียก (ใช้นับ transaction ที่เขียนประวัติ)"""
+    originals = {name: getattr(app_module, name) for name in names}
+
+    def wrap(name, fn):
+        def counted(*args, **kwargs):
+            counts[name] = counts.get(name, 0) + 1
+            return fn(*args, **kwargs)
+        return counted
+
+    try:
+        for name, fn in originals.items():
+            setattr(app_module, name, wrap(name, fn))
+        yield counts
+    finally:
+        for name, fn in originals.items():
+            setattr(app_module, name, fn)
+
+
+def run_mode(app_module, stub, mode, keywords, workdir, args):
+    # ฐานข้อมูลประวัติแยกกันต่อแบบ ทั้งสองแบบจึงเริ่มจากไม่มีข้อมูลย้อนหลังเหมือนกัน
+    os.environ['HISTORY_DB_PATH'] = os.path.join(workdir, f'history_{mode}.db')
+    reset_caches(app_module)
+    app_module.model = FakeGeminiModel(latency=args.latency, latency_per_item=args.latency_per_item)
+    requests_before = len(stub.requests)
+    counts = {}
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with output, counting(app_module, ('save_to_history', 'save_many_to_history'), counts):
+        started = time.perf_counter()
+        if mode == 'sequential':
+            summaries = [app_module.run_analysis(keyword) for keyword in keywords]
+        else:
+            summaries = app_module.run_batch_analysis(keywords)['summaries']
+        seconds = time.perf_counter() - started
+    return {
+        'mode': mode, 'seconds': seconds, 'newsapi_requests': len(stub.requests) - requests_before,
+        'gemini_calls': app_module.model.calls, 'history_transactions': sum(counts.values()),
+        'summaries': {s['keyword']: (s['sentiment_summary'], s['trend_status'], s['article_count']) for s in summaries},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare N x /analyze with one /api/analyze_batch job")
+    parser.add_argument('--keywords', nargs='+', default=['AIS', 'TRUE', 'DTAC'])
+    parser.add_argument('--per-keyword', type=int, default=60, help='ข่าวเฉพาะของแต่ละ keyword')
+    parser.add_argument('--shared', type=int, default=30, help='ข่าวที่กล่าวถึงทุก keyword')
+    parser.add_argument('--latency', type=float, default=0.3, help='เวลาตอบคงที่ของ Gemini ปลอมต่อ request (วินาที)')
+    parser.add_argument('--latency-per-item', type=float, default=0.005)
+    parser.add_argument('--newsapi-delay', type=float, default=0.2, help='เวลาตอบของ NewsAPI จำลอง (วินาที)')
+    parser.add_argument('--verbose', action='store_true', help='แสดง log ของแอประหว่างรัน')
+    args = parser.parse_args()
+
+    articles = make_articles(args.keywords, args.per_keyword, args.shared)
+    with tempfile.TemporaryDirectory() as workdir, NewsApiStub(articles, delay=args.newsapi_delay) as stub:
+        configure_environment(workdir, args.per_keyword + args.shared)
+        os.environ['NEWS_API_BASE_URL'] = stub.base_url
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+            import model_registry
+            model_registry.register_pipeline(FakeSentimentPipeline())
+
+        results = [run_mode(app_module, stub, mode, args.keywords, workdir, args) for mode in ('sequential', 'batch')]
+
+    print(f"{len(args.keywords)} keywords, {args.per_keyword} own + {args.shared} shared articles each")
+    print(f"{'mode':>10} {'seconds':>8} {'NewsAPI':>8} {'Gemini':>7} {'history tx':>11}")
+    for result in results:
+        print(f"{result['mode']:>10} {result['seconds']:>8.2f} {result['newsapi_requests']:>8} "
+              f"{result['gemini_calls']:>7} {result['history_transactions']:>11}")
+    sequential, batch = (result['summaries'] for result in results)
+    mismatched = [keyword for keyword in args.keywords if sequential[keyword] != batch[keyword]]
+    print(f"Per-keyword summaries match: {'yes' if not mismatched else 'no ' + str(mismatched)}")
+    for keyword in args.keywords:
+        summary, trend_status, article_count = batch[keyword]
+        print(f"  {keyword}: {article_count} articles, {summary}, status={trend_status}")
+    return 1 if mismatched else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
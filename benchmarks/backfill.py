@@ -0,0 +1,69 @@
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.fakes import FakeSentimentPipeline, make_headlines
+
+# ==============================================================================
+# Benchmark: backfill.py กับไฟล์ข่าวย้อนหลังจำลอง (JSONL.gz) ที่จำนวน worker ต่างกัน
+# รายงานจำนวนข่าวต่อวินาที และหน่วยความจำสูงสุดของ process หลัก (ควรคงที่ไม่ว่าไฟล์ใหญ่แค่ไหน)
+# ค่าเริ่มต้นใช้ FakeSentimentPipeline (ไม่ต้องมี torch) --real-model ใช้โมเดลตาม FALLBACK_BACKEND
+# รัน: python -m benchmarks.backfill --count 200000 --workers 1 2 4
+# ==============================================================================
+KEYWORDS = ('AIS', 'TRUE', 'DTAC')
+
+
+def make_archive(path, count, days=90, seed=3):
+    rng = random.Random(seed)
+    titles = [article['title'] for article in make_headlines(500)]
+    start = datetime(2025, 4, 1, tzinfo=timezone.utc)
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for i in range(count):
+            keyword = rng.choice(KEYWORDS)
+            published = start + timedelta(minutes=rng.randrange(days * 24 * 60))
+            f.write(json.dumps({'keyword': keyword, 'title': f"{keyword} {rng.choice(titles)} #{i}",
+                                'publishedAt': published.strftime('%Y-%m-%dT%H:%M:%SZ')}, ensure_ascii=False) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backfill throughput and memory for different worker counts")
+    parser.add_argument('--count', type=int, default=100000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--latency-per-item', type=float, default=0.0002, help='เวลาต่อหัวข้อข่าวของโมเดลปลอม')
+    parser.add_argument('--real-model', action='store_true', help='ใช้โมเดลในเครื่องจริงแทนโมเดลปลอม')
+    args = parser.parse_args()
+
+    if not args.real_model:
+        # ลงทะเบียนก่อนสร้าง process pool: worker ที่ fork ออกไปจะได้โมเดลปลอมตัวเดียวกัน
+        os.environ['FALLBACK_BACKEND'] = 'pipeline'
+        import model_registry
+        model_registry.register_pipeline(FakeSentimentPipeline(latency_per_item=args.latency_per_item))
+    from backfill import run_backfill
+
+    with tempfile.TemporaryDirectory() as workdir:
+        archive = os.path.join(workdir, 'archive.jsonl.gz')
+        make_archive(archive, args.count)
+        print(f"{args.count} archived headlines, {os.path.getsize(archive) / 1e6:.1f} MB gzipped")
+        print(f"{'workers':>8} {'seconds':>8} {'headlines/s':>12} {'history rows':>13} {'peak RSS MB':>12}")
+        for workers in args.workers:
+            db_path = os.path.join(workdir, f'history_{workers}.db')
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                stats = run_backfill([archive], workers=workers, chunk_size=args.chunk_size, db_path=db_path)
+            seconds = time.perf_counter() - started
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"{workers:>8} {seconds:>8.2f} {stats['classified'] / seconds:>12.0f} "
+                  f"{stats['history_rows']:>13} {peak_mb:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
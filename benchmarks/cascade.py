@@ -0,0 +1,100 @@
+import argparse
+import csv
+import json
+import os
+import tempfile
+
+# ==============================================================================
+# Evaluation: cascade router (sentiment_cascade) เทียบกับการส่งทุกข่าวให้ Gemini
+# รัน first pass (โมเดลในเครื่อง + กฎคำศัพท์) ครั้งเดียว แล้วไล่ threshold หลายค่า รายงาน
+#   agreement       สัดส่วน label ที่ตรงกับ Gemini ล้วน
+#   local_agreement สัดส่วนที่ตรงกันเฉพาะข่าวที่ cascade ตัดสินเองในเครื่อง
+#   calls_saved     สัดส่วนการเรียก Gemini ที่ประหยัดได้ (นับเป็นจำนวน batch ตามงบ token ของ PromptPacker)
+# อ้างอิง: --reference gemini (เรียก Gemini จริง ต้องมี GEMINI_API_KEY) หรือ csv (label ที่บันทึกไว้ใน csv)
+# --fake-local ใช้ FakeSentimentPipeline แทนโมเดลจริง (ตรวจการทำงานแบบไม่ต้องมี torch ตัวเลขไม่มีความหมาย)
+# รัน: python -m benchmarks.cascade --reference gemini --limit 300
+# ==============================================================================
+DEFAULT_THRESHOLDS = [0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.99]
+
+
+def load_rows(path, limit):
+    """อ่านหัวข้อข่าวที่ไม่ซ้ำกันจาก csv (คอลัมน์ title และ sentiment ถ้ามี)"""
+    rows, seen = [], set()
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            title = (row.get('title') or '').strip()
+            if title and title not in seen:
+                seen.add(title)
+                rows.append({'title': title, 'sentiment': (row.get('sentiment') or '').strip().upper()})
+    return rows[:limit] if limit else rows
+
+
+def gemini_labels(titles):
+    import google.generativeai as genai
+    from analysis_engine import analyze_sentiment_with_gemini
+
+    genai.configure(api_key=os.environ['GEMINI_API_KEY'])
+    model = genai.GenerativeModel(os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash'))
+    articles = [{'title': title, 'url': f"eval://{i}"} for i, title in enumerate(titles)]
+    return [result['sentiment'] for result in analyze_sentiment_with_gemini(articles, model, default_sentiment=None)]
+
+
+def run(args):
+    from analysis_engine import plan_batches
+    import sentiment_cascade
+
+    rows = load_rows(args.csv, args.limit)
+    if args.reference == 'csv':
+        rows = [row for row in rows if row['sentiment'] in ('POSITIVE', 'NEGATIVE', 'NEUTRAL')]
+    titles = [row['title'] for row in rows]
+    reference = [row['sentiment'] for row in rows] if args.reference == 'csv' else gemini_labels(titles)
+    # ข่าวที่ Gemini วิเคราะห์ไม่สำเร็จไม่มีคำตอบอ้างอิง จึงไม่นำมาคิด
+    titles = [title for title, label in zip(titles, reference) if label]
+    reference = [label for label in reference if label]
+
+    routed = sentiment_cascade.first_pass(titles)
+    results = sentiment_cascade.evaluate_thresholds(
+        reference, routed, args.thresholds, lambda indices: len(plan_batches([titles[i] for i in indices])))
+    reasons = {reason: sum(r == reason for _, _, r in routed) for reason in ('agree', 'model', 'conflict')}
+
+    print(f"{len(titles)} headlines, reference={args.reference}, first pass: {reasons}")
+    print(f"{'threshold':>9} {'local':>7} {'agreement':>10} {'local agr':>10} {'LLM calls':>10} {'saved':>7}")
+    for row in results:
+        local_agreement = f"{row['local_agreement']:.1%}" if row['local_agreement'] is not None else '-'
+        print(f"{row['threshold']:>9g} {row['local_share']:>7.1%} {row['agreement']:>10.1%} {local_agreement:>10} "
+              f"{row['llm_calls']:>4}/{row['baseline_llm_calls']:<5} {row['calls_saved']:>7.1%}")
+
+    acceptable = [row for row in results if row['agreement'] >= args.target_agreement]
+    if acceptable:
+        best = max(acceptable, key=lambda row: (row['calls_saved'], -row['threshold']))
+        print(f"\nLowest-cost threshold with agreement >= {args.target_agreement:.0%}: "
+              f"CASCADE_CONFIDENCE={best['threshold']:g} (saves {best['calls_saved']:.1%} of Gemini calls)")
+    else:
+        print(f"\nNo threshold reaches agreement >= {args.target_agreement:.0%}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'reference': args.reference, 'headlines': len(titles), 'first_pass': reasons,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate the sentiment cascade against Gemini-only labeling")
+    parser.add_argument('--csv', default='pr_crisis_data.csv')
+    parser.add_argument('--limit', type=int, default=300, help='จำนวนหัวข้อข่าวสูงสุด (0 = ทั้งหมด)')
+    parser.add_argument('--reference', choices=('gemini', 'csv'), default='gemini')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=DEFAULT_THRESHOLDS)
+    parser.add_argument('--target-agreement', type=float, default=0.95)
+    parser.add_argument('--fake-local', action='store_true', help='ใช้ pipeline ปลอมแทนโมเดลในเครื่อง')
+    parser.add_argument('--json', help='บันทึกผลเป็นไฟล์ JSON')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.fake_local:
+            # แยกแคชออกจากไฟล์จริง เพื่อไม่ให้ผลของโมเดลปลอมปนกับผลของโมเดลจริง
+            os.environ['SENTIMENT_CACHE_PATH'] = os.path.join(workdir, 'sentiment_cache.db')
+            os.environ['FALLBACK_BACKEND'] = 'pipeline'
+            import model_registry
+            from benchmarks.fakes import FakeSentimentPipeline
+            model_registry.register_pipeline(FakeSentimentPipeline(latency_per_item=0))
+        run(args)
@@ -0,0 +1,90 @@
+import argparse
+import os
+import tempfile
+import time
+
+# ==============================================================================
+# Benchmark: latency ที่ผู้ใช้เห็นช่วง Gemini ล่ม เมื่อมี/ไม่มี circuit breaker
+# จำลอง Gemini ที่ค้างนาน --fail-latency วินาทีแล้วล้มเหลว ยิงคำขอวิเคราะห์ข่าว + คำขอคำแนะนำต่อกัน
+# จากนั้นให้ Gemini กลับมาปกติและวัดเวลาที่วงจรกลับเป็น closed (half-open probe)
+# รัน: python -m benchmarks.circuit_breaker --requests 20 --fail-latency 2
+# ==============================================================================
+
+
+def configure_environment(workdir, open_seconds):
+    os.environ['SENTIMENT_CACHE_PATH'] = os.path.join(workdir, 'sentiment_cache.db')
+    os.environ['FALLBACK_BACKEND'] = 'pipeline'
+    os.environ['CIRCUIT_GEMINI_OPEN_SECONDS'] = str(open_seconds)
+    os.environ['CIRCUIT_GEMINI_MIN_CALLS'] = '3'
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def make_request(engine, model, gateway, i):
+    """คำขอหนึ่งครั้งแบบเดียวกับ /analyze (Gemini แล้วถอยไปโมเดลสำรอง) ตามด้วย /get_root_cause"""
+    from benchmarks.fakes import make_headlines
+    import model_registry
+    from sentiment_rules import apply_sentiment_rules
+
+    articles = make_headlines(20, seed=1000 + i)
+    started = time.perf_counter()
+    try:
+        results = engine.analyze_sentiment_with_gemini(articles, model)
+        if {result['sentiment'] for result in results} == {'NEUTRAL'}:
+            raise ValueError("all NEUTRAL")
+    except Exception:
+        labels = model_registry.predict_labels([article['title'] for article in articles])
+        results = [apply_sentiment_rules(label, article['title']) for label, article in zip(labels, articles)]
+    try:
+        gateway.generate('root_cause', model, f"root cause prompt {i}")
+    except Exception:
+        pass
+    return time.perf_counter() - started
+
+
+def run_scenario(name, guarded, args):
+    import analysis_engine
+    import model_registry
+    from benchmarks.fakes import FakeGeminiModel, FakeSentimentPipeline
+    from circuit_breaker import CircuitBreaker, GuardedModel
+    from llm_gateway import LLMGateway
+
+    model_registry.register_pipeline(FakeSentimentPipeline(latency_per_item=0.001))
+    fake = FakeGeminiModel(latency=args.fail_latency, failure_rate=1.0)
+    breaker = CircuitBreaker('gemini') if guarded else None
+    model = GuardedModel(fake, breaker) if guarded else fake
+    gateway = LLMGateway()
+
+    outage = [make_request(analysis_engine, model, gateway, i) for i in range(args.requests)]
+    print(f"{name:>12} outage: {args.requests} requests, p50 {percentile(outage, 0.5) * 1000:8.0f} ms, "
+          f"p95 {percentile(outage, 0.95) * 1000:8.0f} ms, total {sum(outage):6.1f} s, Gemini calls {fake.calls}")
+    if not guarded:
+        return
+
+    # Gemini กลับมาปกติ: วัดเวลาจนวงจรปิด (ต้องรอ open_seconds แล้วให้ probe สำเร็จ)
+    fake.failure_rate, fake.latency = 0.0, 0.05
+    recovered_from = time.perf_counter()
+    i = args.requests
+    while breaker.state != 'closed':
+        make_request(analysis_engine, model, gateway, i)
+        i += 1
+        time.sleep(0.1)
+    stats = breaker.get_stats()
+    print(f"{'':>12} recovery: closed again after {time.perf_counter() - recovered_from:.1f}s "
+          f"(opened {stats['opened']}x, rejected {stats['rejected']}, probes {stats['probes']})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure user-facing latency during a Gemini outage with/without the breaker")
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--fail-latency', type=float, default=2.0, help='เวลาที่ Gemini ปลอมค้างก่อนล้มเหลว (วินาที)')
+    parser.add_argument('--open-seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir, args.open_seconds)
+        run_scenario('no breaker', False, args)
+        run_scenario('breaker', True, args)
@@ -0,0 +1,114 @@
+import argparse
+import csv
+import os
+import random
+import time
+
+from analysis_engine import plan_batches
+from dedup import cluster_headlines
+
+# ==============================================================================
+# Benchmark: จำนวนการเรียก LLM ที่ประหยัดได้จากการรวมข่าวที่เกือบซ้ำกัน
+# สร้าง feed จำลองที่ข่าวแต่ละเรื่องถูกลงซ้ำหลายสำนัก (หัวข้อต่างกันเล็กน้อย) แล้ววัด
+# จำนวน batch ที่ส่ง Gemini ก่อน/หลัง, ความบริสุทธิ์ของกลุ่ม และเวลาที่ใช้
+# รัน: python -m benchmarks.dedup
+# ==============================================================================
+TOPICS = [
+    "ระบบ {brand} ล่มทั่วประเทศ",
+    "{brand} เปิดตัวแพ็กเกจใหม่",
+    "ผู้ใช้ {brand} โวยค่าบริการแพง",
+    "{brand} คว้ารางวัลนวัตกรรมยอดเยี่ยม",
+    "{brand} ชี้แจงกรณีข้อมูลลูกค้ารั่วไหล",
+    "{brand} ร่วมมือพันธมิตรขยายเครือข่าย",
+    "นักลงทุนกังวลผลประกอบการ {brand}",
+    "{brand} ปรับโครงสร้างองค์กรครั้งใหญ่",
+]
+DETAILS = [
+    "ลูกค้าร้องเรียนใช้งานไม่ได้หลายชั่วโมง", "ตอบรับดีเกินคาดในกลุ่มวัยรุ่น", "สภาผู้บริโภคเตรียมยื่นหนังสือ",
+    "หุ้นร่วงแรงในช่วงเช้า", "ผู้บริหารยืนยันไม่มีผลกระทบต่อลูกค้า", "เริ่มให้บริการภาคเหนือเดือนหน้า",
+    "โซเชียลแห่วิจารณ์หนัก", "กสทช. สั่งตรวจสอบด่วน", "นักวิเคราะห์มองเป็นบวกระยะยาว",
+    "พนักงานกังวลเรื่องเลิกจ้าง", "ตั้งเป้ารายได้เติบโตสองหลัก", "ลูกค้าแห่ย้ายค่ายจำนวนมาก",
+]
+OUTLETS = ["ไทยรัฐ", "ข่าวสด", "มติชน", "ประชาชาติธุรกิจ", "Thai PBS", "Sanook", "MGR Online"]
+PREFIXES = ["", "", "ด่วน! ", "ล่าสุด ", "เปิดข้อมูล "]
+FILLERS = ["ล่าสุด", "วันนี้", "อย่างเป็นทางการ", "เมื่อวันที่ผ่านมา"]
+
+
+def make_story_titles(story_count, brand, rng):
+    stories = set()
+    while len(stories) < story_count:
+        stories.add(f"{rng.choice(TOPICS).format(brand=brand)} {rng.choice(DETAILS)}")
+        if len(stories) == len(TOPICS) * len(DETAILS):
+            break
+    return sorted(stories)
+
+
+def make_syndicated_feed(article_count, brand='AIS', syndication=3.0, seed=11):
+    """สร้าง feed ที่ข่าวแต่ละเรื่องถูกลงซ้ำโดยเฉลี่ย syndication สำนัก คืนค่า list ของ (title, story_id)"""
+    rng = random.Random(seed)
+    stories = make_story_titles(max(1, int(article_count / syndication)), brand, rng)
+    feed = []
+    while len(feed) < article_count:
+        story_id = rng.randrange(len(stories))
+        title = stories[story_id]
+        variant = rng.random()
+        if variant < 0.3:
+            title = f"{title} - {rng.choice(OUTLETS)}"
+        elif variant < 0.5:
+            title = f"{rng.choice(PREFIXES)}{title}"
+        elif variant < 0.65:
+            words = title.split(' ')
+            words.insert(rng.randrange(1, len(words) + 1), rng.choice(FILLERS))
+            title = ' '.join(words)
+        elif variant < 0.75:
+            title = f'"{title}"'
+        feed.append((title, story_id))
+    return feed
+
+
+def evaluate(titles, truth=None):
+    # โหลดพจนานุกรมตัดคำก่อนจับเวลา
+    cluster_headlines(["วอร์มอัพตัวตัดคำ"])
+    started = time.perf_counter()
+    clusters = cluster_headlines(titles)
+    elapsed = time.perf_counter() - started
+    report = {
+        'articles': len(titles),
+        'clusters': len(clusters),
+        'batches_before': len(plan_batches(titles)),
+        'batches_after': len(plan_batches([titles[cluster[0]] for cluster in clusters])),
+        'headlines_saved': 1 - len(clusters) / len(titles) if titles else 0,
+        'ms': elapsed * 1000,
+    }
+    if truth is not None:
+        # purity: สัดส่วนกลุ่มที่มีข่าวจากเรื่องเดียวกันทั้งหมด (ไม่รวมข่าวต่างเรื่องเข้าด้วยกัน)
+        pure = sum(1 for cluster in clusters if len({truth[i] for i in cluster}) == 1)
+        report['purity'] = pure / len(clusters)
+        report['true_stories'] = len(set(truth))
+    return report
+
+
+def print_report(name, report):
+    extra = ''
+    if 'purity' in report:
+        extra = f" true stories={report['true_stories']:>4} purity={report['purity']:.1%}"
+    print(f"{name:>16} {report['articles']:>8} {report['clusters']:>8} "
+          f"{report['batches_before']:>7} -> {report['batches_after']:<5} "
+          f"saved={report['headlines_saved']:>6.1%} {report['ms']:>8.1f} ms{extra}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure LLM calls saved by near-duplicate collapsing")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000])
+    parser.add_argument('--syndication', type=float, default=3.0, help='จำนวนสำนักเฉลี่ยที่ลงข่าวเรื่องเดียวกัน')
+    parser.add_argument('--csv', default='pr_crisis_data.csv', help='ไฟล์ข่าวจริง (คอลัมน์ title) ถ้ามี')
+    args = parser.parse_args()
+
+    print(f"{'feed':>16} {'articles':>8} {'clusters':>8} {'batches (token budget)':>16}")
+    for size in args.sizes:
+        feed = make_syndicated_feed(size, syndication=args.syndication)
+        print_report(f"synthetic x{args.syndication:g}", evaluate([t for t, _ in feed], [s for _, s in feed]))
+    if os.path.exists(args.csv):
+        with open(args.csv, encoding='utf-8-sig', newline='') as f:
+            titles = [row['title'] for row in csv.DictReader(f) if row.get('title')]
+        print_report(os.path.basename(args.csv), evaluate(titles))
@@ -0,0 +1,113 @@
+import json
+import random
+import re
+import threading
+import time
+import zlib
+
+# ==============================================================================
+# ของปลอมสำหรับ benchmark (ไม่ต้องต่อ Gemini จริง)
+# ==============================================================================
+SAMPLE_HEADLINES = [
+    "ระบบ {brand} ล่มทั่วประเทศ ลูกค้าร้องเรียนใช้งานไม่ได้",
+    "{brand} เปิดตัวแพ็กเกจใหม่ ตอบรับดีเกินคาด",
+    "{brand} ประกาศผลประกอบการไตรมาส 2",
+    "ผู้ใช้ {brand} โวยบริการแย่ ค่าบริการแพง",
+    "{brand} คว้ารางวัลนวัตกรรมยอดเยี่ยมแห่งปี",
+    "{brand} ชี้แจงกรณีข้อมูลรั่ว ยืนยันไม่มีผลกระทบ",
+    "{brand} ร่วมมือพันธมิตรขยายเครือข่าย 5G",
+    "นักลงทุนกังวล {brand} ขาดทุนต่อเนื่อง",
+]
+
+
+def make_headlines(count, brand='AIS', seed=42):
+    """สร้างหัวข้อข่าวจำลองที่ไม่ซ้ำกันจำนวน count รายการ"""
+    rng = random.Random(seed)
+    return [
+        {'title': f"{rng.choice(SAMPLE_HEADLINES).format(brand=brand)} #{i}", 'url': f"https://example.com/news/{i}"}
+        for i in range(count)
+    ]
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class RateLimitError(Exception):
+    code = 429
+
+
+class FakeGeminiModel:
+    """
+    โมเดล Gemini ปลอมที่ตอบเป็น JSON ตามรูปแบบ prompt จริง (key สั้น "i"/"s" เมื่อส่ง response_schema มา)
+    จำลองเวลาตอบ (latency คงที่ + latency_per_item ต่อหัวข้อข่าว) และโควตาต่อนาที (เกินแล้วโยน 429) ได้
+    """
+
+    LABELS = ("POSITIVE", "NEGATIVE", "NEUTRAL")
+
+    def __init__(self, latency=0.3, quota_per_minute=None, seed=7, failure_rate=0.0, latency_per_item=0.0):
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.quota_per_minute = quota_per_minute
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self._window = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def _check_quota(self):
+        if not self.quota_per_minute:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._window = [t for t in self._window if now - t < 60]
+            if len(self._window) >= self.quota_per_minute:
+                self.rate_limited += 1
+                raise RateLimitError("429 Resource has been exhausted (e.g. check quota).")
+            self._window.append(now)
+
+    def label(self, title):
+        """label คงที่ตามหัวข้อข่าว (ไม่ขึ้นกับลำดับใน batch) ผลจึงเทียบข้ามวิธีแบ่ง batch ได้"""
+        return self.LABELS[zlib.crc32(title.encode('utf-8')) % 3]
+
+    def generate_content(self, prompt, **kwargs):
+        self._check_quota()
+        with self._lock:
+            self.calls += 1
+            fail = self.failure_rate and self._rng.random() < self.failure_rate
+        items = [(int(i), title) for i, title in re.findall(r'^\s*(\d+)\. (.*)$', prompt, re.MULTILINE)]
+        time.sleep(self.latency + self.latency_per_item * len(items))
+        if fail:
+            with self._lock:
+                self.failed += 1
+            raise RuntimeError("500 Internal error encountered. (fake)")
+        if 'response_schema' in (kwargs.get('generation_config') or {}):
+            return FakeResponse(json.dumps([{"i": i, "s": self.label(title)} for i, title in items]))
+        labels = [{"id": i, "sentiment": self.label(title)} for i, title in items]
+        return FakeResponse("```json\n" + json.dumps(labels) + "\n```")
+
+
+class FakeSentimentPipeline:
+    """
+    pipeline("sentiment-analysis") ปลอมของ transformers (ใช้แทนโมเดลสำรองจริง ไม่ต้องติดตั้ง torch)
+    ตอบ label ตัวพิมพ์เล็กและ score (0.40-0.99) แบบคงที่ตามหัวข้อข่าว และจำลองเวลาประมวลผลต่อหัวข้อข่าวได้
+    """
+
+    LABELS = ("positive", "negative", "neutral")
+
+    def __init__(self, latency_per_item=0.002):
+        self.latency_per_item = latency_per_item
+        self.calls = 0
+
+    def __call__(self, titles):
+        titles = [titles] if isinstance(titles, str) else list(titles)
+        self.calls += 1
+        time.sleep(self.latency_per_item * len(titles))
+        results = []
+        for title in titles:
+            digest = sum(title.encode('utf-8'))
+            results.append({'label': self.LABELS[digest % 3], 'score': 0.4 + (digest // 3 % 60) / 100})
+        return results
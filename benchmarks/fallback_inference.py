@@ -0,0 +1,64 @@
+import argparse
+import time
+
+import model_registry
+from benchmarks.fakes import make_headlines
+from fallback_inference import BACKENDS, FallbackInferenceEngine
+
+# ==============================================================================
+# Benchmark: โมเดลสำรองแบบ pipeline เดิม เทียบกับ FallbackInferenceEngine (torch / quantized / onnx)
+# วัด latency ต่อ burst, throughput และสัดส่วน label ที่ตรงกับ pipeline เดิม
+# ต้องติดตั้ง torch + transformers (และ optimum[onnxruntime] สำหรับ onnx)
+# รัน: python -m benchmarks.fallback_inference --count 500
+# ==============================================================================
+
+
+def time_call(predict, titles, repeats):
+    """เรียก predict(titles) ซ้ำ repeats ครั้ง คืนค่า (labels, เวลาที่ดีที่สุด)"""
+    best, labels = None, None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        labels = predict(titles)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return labels, best
+
+
+def run(count, backends, batch_size, threads, repeats):
+    titles = [article['title'] for article in make_headlines(count)]
+    model_name = model_registry.SENTIMENT_MODEL_NAME
+
+    sentiment_analyzer = model_registry.get_sentiment_pipeline(model_name)
+    # วอร์มอัพ 1 รอบก่อนจับเวลา
+    sentiment_analyzer(titles[:8])
+    baseline, baseline_seconds = time_call(
+        lambda batch: [result['label'].upper() for result in sentiment_analyzer(batch)], titles, repeats)
+
+    print(f"{count} headlines, batch_size={batch_size}, threads={threads or 'default'}, best of {repeats}")
+    print(f"{'backend':>10} {'load s':>7} {'seconds':>8} {'headlines/s':>12} {'speedup':>8} {'agreement':>10}")
+    print(f"{'pipeline':>10} {'-':>7} {baseline_seconds:>8.3f} {count / baseline_seconds:>12.1f} "
+          f"{1.0:>7.2f}x {1.0:>10.1%}")
+    for backend in backends:
+        started = time.perf_counter()
+        try:
+            engine = FallbackInferenceEngine(model_name, backend=backend, batch_size=batch_size, num_threads=threads)
+        except ImportError as e:
+            print(f"{backend:>10} skipped: {e}")
+            continue
+        load_seconds = time.perf_counter() - started
+        engine.predict(titles[:8])
+        labels, seconds = time_call(engine.predict, titles, repeats)
+        agreement = sum(a == b for a, b in zip(labels, baseline)) / count
+        print(f"{backend:>10} {load_seconds:>7.1f} {seconds:>8.3f} {count / seconds:>12.1f} "
+              f"{baseline_seconds / seconds:>7.2f}x {agreement:>10.1%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare fallback sentiment inference backends")
+    parser.add_argument('--count', type=int, default=500)
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--threads', type=int, default=None, help='intra-op threads (ค่าเริ่มต้นของ torch ถ้าไม่ระบุ)')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    run(args.count, args.backends, args.batch_size, args.threads, args.repeats)
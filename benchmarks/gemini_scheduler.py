@@ -0,0 +1,45 @@
+import argparse
+import os
+import tempfile
+import time
+
+from analysis_engine import analyze_sentiment_with_gemini, plan_batches
+from benchmarks.fakes import FakeGeminiModel, make_headlines
+from gemini_scheduler import GeminiBatchScheduler
+from sentiment_cache import SentimentCache
+
+# ==============================================================================
+# Benchmark: อัตราการวิเคราะห์ข่าวของ GeminiBatchScheduler เทียบกับแบบเดิม
+# รัน: python -m benchmarks.gemini_scheduler
+# ==============================================================================
+
+
+def run(sizes, latency, rpm, concurrency, quota):
+    print(f"latency={latency}s rpm={rpm} concurrency={concurrency} quota/min={quota or '-'}")
+    print(f"{'headlines':>10} {'batches':>8} {'seconds':>8} {'headlines/s':>12} {'429s':>6} {'legacy est. s':>14}")
+    for size in sizes:
+        articles = make_headlines(size)
+        model = FakeGeminiModel(latency=latency, quota_per_minute=quota)
+        scheduler = GeminiBatchScheduler(requests_per_minute=rpm, max_concurrency=concurrency)
+        # ใช้แคชว่างใหม่ทุกรอบ เพื่อวัดเฉพาะเวลาที่ส่งไปยังโมเดลจริง
+        cache = SentimentCache(path=os.path.join(tempfile.mkdtemp(), 'bench_cache.db'))
+        started = time.perf_counter()
+        results = analyze_sentiment_with_gemini(articles, model, scheduler=scheduler, cache=cache)
+        elapsed = time.perf_counter() - started
+        assert [r['title'] for r in results] == [a['title'] for a in articles]
+        batches = len(plan_batches([article['title'] for article in articles]))
+        # แบบเดิมวิเคราะห์ทีละชุด ชุดละ 20 ข่าว และพัก 1 วินาทีหลังทุกชุด
+        legacy_estimate = -(-size // 20) * (latency + 1)
+        print(f"{size:>10} {batches:>8} {elapsed:>8.2f} {size / elapsed:>12.1f} "
+              f"{model.rate_limited:>6} {legacy_estimate:>14.1f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 500, 2000])
+    parser.add_argument('--latency', type=float, default=0.3, help='เวลาตอบของโมเดลปลอมต่อ request (วินาที)')
+    parser.add_argument('--rpm', type=int, default=1200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--quota', type=int, default=None, help='โควตาต่อนาทีของโมเดลปลอม (เกินแล้วตอบ 429)')
+    args = parser.parse_args()
+    run(args.sizes, args.latency, args.rpm, args.concurrency, args.quota)
@@ -0,0 +1,103 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import history_store
+
+# ==============================================================================
+# Benchmark: เช็กค่าเฉลี่ย 7 วันบนตาราง analysis_history ขนาดใหญ่ (ค่าเริ่มต้น 1 ล้านแถว)
+# เทียบแบบเดิม (เปิด connection ใหม่ + pandas + ไม่มี index) กับ history_store
+# รัน: python -m benchmarks.history_store
+# ==============================================================================
+
+
+def build_table(path, rows, keywords, days):
+    """สร้างตารางตาม schema เวอร์ชัน 1 (ยังไม่มี index) แล้วเติมข้อมูลสุ่ม"""
+    conn = sqlite3.connect(path)
+    conn.executescript(history_store.MIGRATIONS[0][1])
+    conn.execute('PRAGMA user_version = 1')
+    rng = random.Random(3)
+    now = datetime.now()
+    batch = []
+    for i in range(rows):
+        stamp = (now - timedelta(seconds=rng.randint(0, days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+        negative = rng.uniform(0, 60)
+        positive = rng.uniform(0, 100 - negative)
+        batch.append((f"brand{rng.randrange(keywords)}", stamp, negative, positive, 100 - negative - positive))
+        if len(batch) == 50000:
+            conn.executemany("INSERT INTO analysis_history (keyword, analysis_date, negative_percent, "
+                             "positive_percent, neutral_percent) VALUES (?, ?, ?, ?, ?)", batch)
+            batch = []
+    if batch:
+        conn.executemany("INSERT INTO analysis_history (keyword, analysis_date, negative_percent, "
+                         "positive_percent, neutral_percent) VALUES (?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def legacy_average(path, keyword):
+    """สำเนาของ get_historical_average เวอร์ชันเดิม"""
+    import pandas as pd
+    conn = sqlite3.connect(path)
+    query = "SELECT AVG(negative_percent) FROM analysis_history WHERE keyword = ? AND analysis_date >= date('now', '-7 days')"
+    df = pd.read_sql_query(query, conn, params=(keyword,))
+    conn.close()
+    historical_avg = df.iloc[0, 0]
+    return historical_avg if pd.notna(historical_avg) else None
+
+
+def measure(fn, keywords, lookups):
+    rng = random.Random(4)
+    timings = []
+    for _ in range(lookups):
+        keyword = f"brand{rng.randrange(keywords)}"
+        started = time.perf_counter()
+        fn(keyword)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95) - 1]
+
+
+def run(rows, keywords, days, lookups):
+    path = os.path.join(tempfile.mkdtemp(), 'history_bench.db')
+    started = time.perf_counter()
+    build_table(path, rows, keywords, days)
+    print(f"built {rows:,} rows / {keywords} keywords in {time.perf_counter() - started:.1f}s")
+
+    try:
+        legacy = measure(lambda k: legacy_average(path, k), keywords, lookups)
+    except ImportError:
+        legacy = None
+
+    started = time.perf_counter()
+    history_store.get_connection(path)
+    print(f"migration (index build) took {time.perf_counter() - started:.1f}s")
+    store = measure(lambda k: history_store.get_negative_average(k, path=path), keywords, lookups)
+
+    insert_timings = []
+    for i in range(lookups):
+        started = time.perf_counter()
+        history_store.save_analysis(f"brand{i % keywords}", {'NEGATIVE': 10, 'POSITIVE': 50, 'NEUTRAL': 40}, path=path)
+        insert_timings.append(time.perf_counter() - started)
+    insert_timings.sort()
+
+    print(f"{'path':>28} {'p50 ms':>9} {'p95 ms':>9}")
+    if legacy:
+        print(f"{'legacy (pandas, no index)':>28} {legacy[0] * 1000:>9.2f} {legacy[1] * 1000:>9.2f}")
+    print(f"{'history_store average':>28} {store[0] * 1000:>9.2f} {store[1] * 1000:>9.2f}")
+    print(f"{'history_store insert':>28} {insert_timings[len(insert_timings) // 2] * 1000:>9.2f} "
+          f"{insert_timings[int(len(insert_timings) * 0.95) - 1] * 1000:>9.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--keywords', type=int, default=200)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--lookups', type=int, default=100)
+    args = parser.parse_args()
+    run(args.rows, args.keywords, args.days, args.lookups)
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# ==============================================================================
+# เซิร์ฟเวอร์ NewsAPI จำลองในเครื่อง (ใช้กับ NEWS_API_BASE_URL หรือ NewsApiClient(base_url=...))
+# รองรับ page/pageSize, ETag/If-None-Match และจำลองเวลาตอบได้
+# ==============================================================================
+
+
+class NewsApiStub:
+    """
+    ตัวอย่าง:
+        with NewsApiStub(articles) as stub:
+            client = NewsApiClient('key', base_url=stub.base_url)
+    """
+
+    def __init__(self, articles, max_results=None, delay=0.0):
+        self.articles = list(articles)
+        self.max_results = max_results
+        self.delay = delay
+        self.requests = []
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v2"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                stub.requests.append((parsed.path, params, dict(self.headers)))
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                if parsed.path != '/v2/everything':
+                    return self._send(404, b'{"status": "error", "code": "notFound"}')
+                keyword = params.get('q', '')
+                page = int(params.get('page', 1))
+                page_size = int(params.get('pageSize', 20))
+                matches = [a for a in stub.articles if keyword.lower() in (a.get('title') or '').lower()] or stub.articles
+                start = (page - 1) * page_size
+                if stub.max_results is not None and start >= stub.max_results:
+                    body = {'status': 'error', 'code': 'maximumResultsReached',
+                            'message': 'You have requested too many results.'}
+                    return self._send(426, json.dumps(body).encode('utf-8'), {'Content-Type': 'application/json'})
+                body = json.dumps({'status': 'ok', 'totalResults': len(matches),
+                                   'articles': matches[start:start + page_size]}).encode('utf-8')
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, headers={'ETag': etag})
+                self._send(200, body, {'Content-Type': 'application/json', 'ETag': etag})
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
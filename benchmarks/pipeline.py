@@ -0,0 +1,351 @@
+import argparse
+import contextlib
+import csv
+import functools
+import glob
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.dedup import OUTLETS, make_syndicated_feed
+from benchmarks.fakes import FakeGeminiModel, FakeSentimentPipeline
+from benchmarks.newsapi_stub import NewsApiStub
+
+# ==============================================================================
+# Benchmark: ขั้นตอนวิเคราะห์ทั้งหมดของ /analyze (app.run_analysis + render index.html) แบบไม่ต่อบริการจริง
+# - NewsAPI: เซิร์ฟเวอร์จำลอง (benchmarks/newsapi_stub.py) ที่เสิร์ฟข่าวจากไฟล์ที่บันทึกไว้
+#   หรือจาก pr_crisis_data.csv + feed จำลองที่มีข่าวซ้ำหลายสำนัก
+# - Gemini: FakeGeminiModel (กำหนด latency และอัตราล้มเหลวได้)
+# - โมเดลสำรอง: FakeSentimentPipeline แทน transformers pipeline
+# จับเวลาแต่ละขั้นตอน (fetch, classify, rules, history, keywords, wordcloud, render) โดยครอบฟังก์ชันที่ app เรียก
+# รายงาน p50/p95 และหน่วยความจำสูงสุด (tracemalloc, วัดแยกอีกรอบเพื่อไม่ให้เวลาคลาดเคลื่อน)
+# หมายเหตุ: rules เป็นส่วนหนึ่งของ classify (ทำงานเมื่อ Gemini ล้มเหลวเท่านั้น)
+#          wordcloud รวมเวลารอวาดภาพเสร็จ (ในแอปจริงวาดเบื้องหลัง ไม่ได้ขวาง request)
+# รัน: python -m benchmarks.pipeline --json bench.json
+#      python -m benchmarks.pipeline --compare bench.json        (เทียบกับผลครั้งก่อน)
+#      python -m benchmarks.pipeline --record fixtures/ais.json  (บันทึกข่าวจริงจาก NewsAPI ไว้ใช้ซ้ำ)
+# ==============================================================================
+STAGES = ('fetch', 'classify', 'rules', 'history', 'keywords', 'wordcloud', 'render')
+SCENARIOS = ('gemini', 'fallback')
+KEYWORD = 'AIS'
+API_KEY = 'benchmark-key'
+# ฟังก์ชันใน app ที่ถูกครอบเพื่อจับเวลา -> ชื่อขั้นตอน
+APP_STAGES = {
+    'get_news_from_api': 'fetch',
+    'classify_articles': 'classify',
+    'apply_sentiment_rules': 'rules',
+    'save_to_history': 'history',
+    'get_historical_average': 'history',
+    'extract_keywords': 'keywords',
+    'create_wordcloud': 'wordcloud',
+}
+
+
+def configure_environment(workdir, max_articles):
+    """ตั้งค่า env ก่อน import app: ไฟล์ทั้งหมดอยู่ใน workdir และไม่มีการเรียกบริการจริง"""
+    os.environ.update({
+        'NEWS_API_KEY': API_KEY,
+        'NEWS_API_MAX_ARTICLES': str(max_articles),
+        'HISTORY_DB_PATH': os.path.join(workdir, 'history.db'),
+        'SENTIMENT_CACHE_PATH': os.path.join(workdir, 'sentiment_cache.db'),
+        'WORDCLOUD_IMAGE_DIR': os.path.join(workdir, 'images'),
+        'STATUS_STORE': 'memory',
+        'FALLBACK_BACKEND': 'pipeline',
+    })
+    os.environ.setdefault('GEMINI_RPM', '6000')
+    os.environ.setdefault('GEMINI_MAX_CONCURRENCY', '8')
+    for name in ('TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID', 'WATCHLIST_KEYWORDS', 'WARM_SENTIMENT_MODEL'):
+        os.environ.pop(name, None)
+    if 'WORDCLOUD_FONT_PATH' not in os.environ:
+        from wordcloud_store import DEFAULT_FONT_PATH
+        if not os.path.exists(DEFAULT_FONT_PATH):
+            os.environ['WORDCLOUD_FONT_PATH'] = os.path.join('fonts', 'Sarabun-Regular.ttf')
+
+
+# ----------------------------------------------------------------------------- fixtures
+
+def load_fixture(path):
+    """อ่านข่าวจากไฟล์ที่บันทึกไว้ (คำตอบ JSON ของ NewsAPI หรือ list ของ article)"""
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    return data['articles'] if isinstance(data, dict) else data
+
+
+def make_fixture_articles(count, keyword=KEYWORD, csv_path='pr_crisis_data.csv', seed=11):
+    """ข่าวรูปแบบเดียวกับ NewsAPI: หัวข้อจริงจาก csv ที่มี keyword แล้วเติมด้วย feed จำลองที่มีข่าวซ้ำหลายสำนัก"""
+    titles = []
+    if os.path.exists(csv_path):
+        with open(csv_path, encoding='utf-8-sig', newline='') as f:
+            titles = [row['title'] for row in csv.DictReader(f) if keyword.lower() in (row.get('title') or '').lower()]
+    titles += [title for title, _ in make_syndicated_feed(count, brand=keyword, seed=seed)]
+    published = datetime(2025, 7, 23, 9, 0, tzinfo=timezone.utc)
+    return [
+        {'source': {'id': None, 'name': OUTLETS[i % len(OUTLETS)]}, 'title': title,
+         'url': f"https://example.com/{keyword}/{i}",
+         'publishedAt': (published - timedelta(minutes=7 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')}
+        for i, title in enumerate(titles[:count])
+    ]
+
+
+def expand_articles(articles, count):
+    """วนใช้ข่าวจากไฟล์ซ้ำจนครบ count (URL ไม่ซ้ำกัน หัวข้อที่ซ้ำจะถูกรวมโดย dedup ตามปกติ)"""
+    return [dict(articles[i % len(articles)], url=f"{articles[i % len(articles)]['url']}#{i}") for i in range(count)]
+
+
+def record_fixture(path, keyword):
+    """ดึงข่าวจริงจาก NewsAPI (ต้องตั้ง NEWS_API_KEY) แล้วบันทึกเป็นไฟล์สำหรับ --fixture"""
+    from news_client import NewsApiClient
+
+    articles = NewsApiClient(os.environ['NEWS_API_KEY']).fetch_articles(keyword)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'status': 'ok', 'totalResults': len(articles), 'articles': articles}, f, ensure_ascii=False, indent=1)
+    print(f"Recorded {len(articles)} articles for '{keyword}' to {path}")
+
+
+# ----------------------------------------------------------------------------- instrumentation
+
+class StageRecorder:
+    """สะสมเวลา (และหน่วยความจำสูงสุดเมื่อเปิด tracemalloc) ต่อขั้นตอนของการรัน 1 ครั้ง"""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.seconds = {}
+        self.peak_bytes = {}
+        self._depth = 0
+        self._start_bytes = tracemalloc.get_traced_memory()[0] if trace_memory else 0
+        self._max_traced = self._start_bytes
+
+    def wrap(self, stage, fn):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            # ขั้นตอนที่ซ้อนอยู่ข้างใน (rules ใน classify) นับเวลาแต่ไม่วัดหน่วยความจำแยก
+            top_level = self._depth == 0
+            self._depth += 1
+            if self.trace_memory and top_level:
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - started
+                self._depth -= 1
+                if self.trace_memory and top_level:
+                    peak = tracemalloc.get_traced_memory()[1]
+                    self.peak_bytes[stage] = max(self.peak_bytes.get(stage, 0), peak - baseline)
+                    self._max_traced = max(self._max_traced, peak)
+                    self.peak_bytes['total'] = self._max_traced - self._start_bytes
+        return timed
+
+
+@contextlib.contextmanager
+def instrumented(app_module, recorder):
+    """ครอบฟังก์ชันใน app ชั่วคราวด้วยตัวจับเวลาของ recorder"""
+    from text_processing import FrequencyTable
+
+    originals = {name: getattr(app_module, name) for name in APP_STAGES}
+    from_headlines = FrequencyTable.__dict__['from_headlines']
+
+    def create_wordcloud_and_wait(frequency_table):
+        key = originals['create_wordcloud'](frequency_table)
+        if key:
+            app_module.wordcloud_store.get_png(key, timeout=120)
+        return key
+
+    try:
+        for name, stage in APP_STAGES.items():
+            fn = create_wordcloud_and_wait if name == 'create_wordcloud' else originals[name]
+            setattr(app_module, name, recorder.wrap(stage, fn))
+        # การตัดคำ/นับความถี่ของหัวข้อข่าวเชิงลบ นับเป็นขั้นตอน keywords
+        FrequencyTable.from_headlines = classmethod(recorder.wrap('keywords', from_headlines.__func__))
+        yield recorder
+    finally:
+        for name, fn in originals.items():
+            setattr(app_module, name, fn)
+        FrequencyTable.from_headlines = from_headlines
+
+
+def reset_caches(app_module):
+    """ล้างแคชทุกชั้น เพื่อวัดเวลาแบบข่าวใหม่ทั้งหมด (cold)"""
+    import sentiment_cache
+    from news_client import get_default_client
+    from text_processing import tokenize_headline
+
+    get_default_client(API_KEY).cache.clear()
+    sentiment_cache.get_default_cache().clear()
+    tokenize_headline.cache_clear()
+    for path in glob.glob(os.path.join(app_module.wordcloud_store.image_dir, 'wordcloud_*.png')):
+        os.remove(path)
+
+
+def run_once(app_module, trace_memory=False, verbose=False):
+    """รัน run_analysis + render 1 ครั้ง คืนค่า (StageRecorder, เวลารวม, context)"""
+    from flask import render_template
+
+    recorder = StageRecorder(trace_memory)
+
+    def render(context):
+        with app_module.app.test_request_context('/'):
+            return render_template('index.html', **context)
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with output, instrumented(app_module, recorder):
+        started = time.perf_counter()
+        context = app_module.run_analysis(KEYWORD)
+        recorder.wrap('render', render)(context)
+        total = time.perf_counter() - started
+    return recorder, total, context
+
+
+# ----------------------------------------------------------------------------- reporting
+
+def percentile_ms(samples, fraction):
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 2)
+
+
+def summarize(runs, memory_recorder):
+    stages = {}
+    for stage in STAGES + ('total',):
+        samples = [run[stage] for run in runs if stage in run]
+        if not samples:
+            continue
+        peak = memory_recorder.peak_bytes.get(stage) if memory_recorder else None
+        stages[stage] = {
+            'p50_ms': percentile_ms(samples, 0.5), 'p95_ms': percentile_ms(samples, 0.95),
+            'mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+            'peak_kb': round(peak / 1024, 1) if peak is not None else None,
+        }
+    return stages
+
+
+def benchmark(app_module, stub, scenario, size, recorded, args):
+    # ข่าวชุดเดียวกันทุกครั้งที่รันขนาดนี้ (ไม่ขึ้นกับขนาดอื่นที่รันด้วย) ผลจึงเทียบข้ามครั้งได้
+    stub.articles = expand_articles(recorded, size) if recorded else make_fixture_articles(size)
+    app_module.model = FakeGeminiModel(latency=args.latency, seed=size,
+                                       failure_rate=1.0 if scenario == 'fallback' else args.failure_rate)
+    # วอร์มอัพ 1 รอบ (โหลดพจนานุกรมตัดคำ ฟอนต์ และ template) ไม่นำมาคิด
+    reset_caches(app_module)
+    _, _, context = run_once(app_module, verbose=args.verbose)
+    runs = []
+    calls_before = app_module.model.calls
+    for _ in range(args.iterations):
+        if args.cache == 'cold':
+            reset_caches(app_module)
+        recorder, total, context = run_once(app_module, verbose=args.verbose)
+        runs.append(dict(recorder.seconds, total=total))
+    gemini_calls = (app_module.model.calls - calls_before) / args.iterations
+
+    memory_recorder = None
+    if not args.skip_memory:
+        if args.cache == 'cold':
+            reset_caches(app_module)
+        tracemalloc.start()
+        try:
+            memory_recorder, _, _ = run_once(app_module, trace_memory=True, verbose=args.verbose)
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'scenario': scenario, 'articles': context['article_count'], 'stories': len(context['results']),
+        'gemini_calls': gemini_calls, 'stages': summarize(runs, memory_recorder),
+    }
+
+
+def print_result(result):
+    print(f"\n[{result['scenario']}] {result['articles']} articles -> {result['stories']} stories "
+          f"({result['gemini_calls']:g} Gemini calls per run)")
+    print(f"{'stage':>10} {'p50 ms':>10} {'p95 ms':>10} {'mean ms':>10} {'peak KB':>10}")
+    for stage, stats in result['stages'].items():
+        peak = f"{stats['peak_kb']:.1f}" if stats['peak_kb'] is not None else '-'
+        print(f"{stage:>10} {stats['p50_ms']:>10.2f} {stats['p95_ms']:>10.2f} {stats['mean_ms']:>10.2f} {peak:>10}")
+
+
+def compare(results, baseline_path, tolerance, floor_ms=1.0):
+    """เทียบ p50 กับไฟล์ผลครั้งก่อน คืนค่าจำนวนขั้นตอนที่ช้าลงเกิน tolerance (ไม่นับขั้นตอนที่เร็วกว่า floor_ms)"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['scenario'], r['articles']): r['stages'] for r in json.load(f)['results']}
+    regressions = 0
+    print(f"\nCompared with {baseline_path} (tolerance {tolerance:.0%})")
+    for result in results:
+        old_stages = baseline.get((result['scenario'], result['articles']))
+        if old_stages is None:
+            continue
+        for stage, stats in result['stages'].items():
+            old = old_stages.get(stage)
+            if not old or max(old['p50_ms'], stats['p50_ms']) < floor_ms:
+                continue
+            ratio = stats['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+            flag = 'REGRESSION' if ratio > 1 + tolerance else ''
+            regressions += bool(flag)
+            print(f"{result['scenario']:>10} {result['articles']:>6} {stage:>10} "
+                  f"{old['p50_ms']:>10.2f} -> {stats['p50_ms']:<10.2f} {ratio:>6.2f}x {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time every stage of the analysis pipeline with offline fakes")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[20, 200, 2000])
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS),
+                        help="gemini = Gemini ปลอมตอบปกติ, fallback = Gemini ล้มเหลวทั้งหมด (ใช้โมเดลสำรอง + กฎ)")
+    parser.add_argument('--iterations', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.2, help='เวลาตอบของ Gemini ปลอมต่อ batch (วินาที)')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='อัตราที่ Gemini ปลอมตอบ error (สถานการณ์ gemini)')
+    parser.add_argument('--pipeline-latency', type=float, default=0.002, help='เวลาต่อหัวข้อข่าวของโมเดลสำรองปลอม')
+    parser.add_argument('--cache', choices=('cold', 'warm'), default='cold',
+                        help='cold = ล้างแคชทุกรอบ (ข่าวใหม่ทั้งหมด), warm = ใช้แคชจากรอบก่อน')
+    parser.add_argument('--fixture', help='ไฟล์ข่าวที่บันทึกไว้ (จาก --record) แทนข่าวจำลอง')
+    parser.add_argument('--record', metavar='PATH', help='บันทึกข่าวจริงของ --keyword จาก NewsAPI แล้วจบ')
+    parser.add_argument('--keyword', default=KEYWORD)
+    parser.add_argument('--skip-memory', action='store_true', help='ไม่วัดหน่วยความจำ (tracemalloc ทำให้ช้าลง)')
+    parser.add_argument('--json', metavar='PATH', help='บันทึกผลเป็น JSON สำหรับเทียบครั้งถัดไป')
+    parser.add_argument('--compare', metavar='PATH', help='เทียบกับไฟล์ JSON ครั้งก่อน (exit 1 ถ้าช้าลงเกิน tolerance)')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--verbose', action='store_true', help='แสดง log ของแอประหว่างรัน')
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixture(args.record, args.keyword)
+        return 0
+
+    recorded = load_fixture(args.fixture) if args.fixture else None
+    with tempfile.TemporaryDirectory() as workdir, NewsApiStub([]) as stub:
+        configure_environment(workdir, max(args.sizes))
+        os.environ['NEWS_API_BASE_URL'] = stub.base_url
+        with contextlib.redirect_stdout(io.StringIO()):
+            import app as app_module
+            import model_registry
+            model_registry.register_pipeline(FakeSentimentPipeline(args.pipeline_latency))
+
+        results = []
+        for scenario in args.scenarios:
+            for size in args.sizes:
+                result = benchmark(app_module, stub, scenario, size, recorded, args)
+                print_result(result)
+                results.append(result)
+
+    if args.json:
+        meta = {
+            'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'platform': platform.platform(),
+            'iterations': args.iterations, 'latency': args.latency, 'failure_rate': args.failure_rate,
+            'pipeline_latency': args.pipeline_latency, 'cache': args.cache, 'fixture': args.fixture,
+            'gemini_rpm': int(os.environ['GEMINI_RPM']), 'gemini_concurrency': int(os.environ['GEMINI_MAX_CONCURRENCY']),
+        }
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\nSaved results to {args.json}")
+    if args.compare:
+        return 1 if compare(results, args.compare, args.tolerance) else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
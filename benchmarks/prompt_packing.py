@@ -0,0 +1,77 @@
+import argparse
+import os
+import tempfile
+import time
+
+from analysis_engine import analyze_sentiment_with_gemini
+from benchmarks.fakes import FakeGeminiModel, make_headlines
+from gemini_scheduler import GeminiBatchScheduler
+from prompt_packer import PromptPacker
+from sentiment_cache import SentimentCache
+
+# ==============================================================================
+# Benchmark: แบ่ง batch ตามงบ token (PromptPacker) เทียบกับ 20 ข่าวต่อ batch แบบเดิม
+# ชุดข่าว: หัวข้อสั้น, หัวข้อยาว (หัวข้อ + คำโปรย) และปนกัน วัดจำนวน batch, token ต่อ batch และ latency ต่อ batch
+# ค่าเริ่มต้นใช้ Gemini ปลอมที่ตอบช้าลงตามจำนวนข่าวใน batch; --live ใช้ Gemini จริง (ต้องมี GEMINI_API_KEY)
+# รัน: python -m benchmarks.prompt_packing --budgets 1000 2000 4000
+# ==============================================================================
+LEGACY_BATCH_SIZE = 20
+LONG_SUFFIX = (" ผู้บริหารชี้แจงต่อสื่อมวลชนถึงรายละเอียดของเหตุการณ์ ผลกระทบต่อลูกค้า และแผนการแก้ไขระยะสั้นและระยะยาว"
+               " พร้อมระบุว่าจะรายงานความคืบหน้าอย่างต่อเนื่อง")
+
+
+def headline_sets(count):
+    short = [article['title'] for article in make_headlines(count)]
+    long = [f"{title}{LONG_SUFFIX}" for title in short]
+    mixed = [long[i] if i % 4 == 0 else short[i] for i in range(count)]
+    return {'short': short, 'long': long, 'mixed': mixed}
+
+
+def run_config(titles, model, packer, concurrency):
+    articles = [{'title': f"{title} [{i}]", 'url': f"https://example.com/{i}"} for i, title in enumerate(titles)]
+    # แคชว่างใหม่ทุกรอบ เพื่อให้ทุกข่าวถูกส่งไปยังโมเดลจริง
+    cache = SentimentCache(path=os.path.join(tempfile.mkdtemp(), 'bench_cache.db'))
+    scheduler = GeminiBatchScheduler(requests_per_minute=6000, max_concurrency=concurrency)
+    started = time.perf_counter()
+    analyze_sentiment_with_gemini(articles, model, scheduler=scheduler, cache=cache, packer=packer)
+    stats = packer.get_stats()
+    stats['seconds'] = time.perf_counter() - started
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare token-budget prompt packing with fixed 20-headline batches")
+    parser.add_argument('--count', type=int, default=400)
+    parser.add_argument('--budgets', type=int, nargs='+', default=[1000, 2000, 4000])
+    parser.add_argument('--max-items', type=int, default=80)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--latency', type=float, default=0.4, help='เวลาตอบคงที่ของ Gemini ปลอมต่อ request (วินาที)')
+    parser.add_argument('--latency-per-item', type=float, default=0.02, help='เวลาที่เพิ่มต่อข่าวใน batch (วินาที)')
+    parser.add_argument('--live', action='store_true', help='ใช้ Gemini จริงแทนโมเดลปลอม')
+    args = parser.parse_args()
+
+    if args.live:
+        import google.generativeai as genai
+        genai.configure(api_key=os.environ['GEMINI_API_KEY'])
+        model = genai.GenerativeModel(os.environ.get('GEMINI_MODEL', 'gemini-2.0-flash'))
+    else:
+        model = FakeGeminiModel(latency=args.latency, latency_per_item=args.latency_per_item)
+
+    configs = [('fixed 20', lambda: PromptPacker(token_budget=10 ** 9, max_items=LEGACY_BATCH_SIZE))]
+    configs += [(f"budget {budget}", lambda budget=budget: PromptPacker(token_budget=budget, max_items=args.max_items))
+                for budget in args.budgets]
+
+    print(f"{args.count} headlines per set, concurrency={args.concurrency}, "
+          f"{'live Gemini' if args.live else f'fake latency {args.latency}s + {args.latency_per_item}s/item'}")
+    print(f"{'set':>6} {'config':>12} {'batches':>8} {'items/b':>8} {'tokens/b':>9} {'max tok':>8} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'total s':>8} {'act/est':>8}")
+    for name, titles in headline_sets(args.count).items():
+        for label, make_packer in configs:
+            stats = run_config(titles, model, make_packer(), args.concurrency)
+            print(f"{name:>6} {label:>12} {stats['requests']:>8} {stats['avg_items_per_batch']:>8} "
+                  f"{stats['avg_tokens_per_batch']:>9} {stats['max_tokens_per_batch']:>8} {stats['p50_ms']:>8} "
+                  f"{stats['p95_ms']:>8} {stats['seconds']:>8.2f} {stats.get('actual_to_estimate', '-'):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import argparse
+import csv
+import random
+import time
+
+from sentiment_rules import NEGATION_WORDS, NEGATIVE_KEYWORDS, POSITIVE_KEYWORDS, apply_sentiment_rules
+
+# ==============================================================================
+# Benchmark + golden corpus: apply_sentiment_rules แบบคอมไพล์ เทียบกับแบบไล่ทีละคำเดิม
+# รัน: python -m benchmarks.sentiment_rules
+# ==============================================================================
+LABELS = ("POSITIVE", "NEGATIVE", "NEUTRAL")
+
+
+def legacy_apply_sentiment_rules(initial_label, text):
+    """สำเนาของ apply_sentiment_rules เวอร์ชันเดิม ใช้เป็นคำตอบอ้างอิง"""
+    final_label = initial_label
+    text_lower = text.lower()
+    def has_negation(keyword, text_segment):
+        for neg in NEGATION_WORDS:
+            if f"{neg}{keyword}" in text_segment or f"{neg} {keyword}" in text_segment:
+                return True
+        return False
+    for keyword in NEGATIVE_KEYWORDS:
+        if keyword in text_lower and not has_negation(keyword, text_lower):
+            return "NEGATIVE"
+    if initial_label == "NEUTRAL":
+        for keyword in POSITIVE_KEYWORDS:
+            if keyword in text_lower and not has_negation(keyword, text_lower):
+                return "POSITIVE"
+    return final_label
+
+
+def load_titles(path='pr_crisis_data.csv'):
+    try:
+        with open(path, encoding='utf-8-sig') as f:
+            return [row['title'] for row in csv.DictReader(f) if row.get('title')]
+    except OSError:
+        return []
+
+
+def golden_corpus(size, seed=1):
+    """
+    หัวข้อข่าวจริงจาก pr_crisis_data.csv ผสมกับหัวข้อสังเคราะห์ที่มีคำในพจนานุกรม
+    คำปฏิเสธ (ทั้งติดกันและมีช่องว่าง) และคำที่ซ้อนทับกัน เพื่อครอบคลุมทุกกรณีของกฎ
+    """
+    rng = random.Random(seed)
+    real_titles = load_titles()
+    vocabulary = NEGATIVE_KEYWORDS + POSITIVE_KEYWORDS
+    fillers = ["AIS", "ลูกค้า", "บริษัท", "ระบบ", "ประกาศ", "ล่าสุด", "วันนี้", "ตลาดหุ้น", "MOU", "csr"]
+    corpus = list(real_titles)
+    while len(corpus) < size:
+        parts = []
+        for _ in range(rng.randint(2, 8)):
+            roll = rng.random()
+            if roll < 0.35:
+                parts.append(rng.choice(vocabulary))
+            elif roll < 0.55:
+                joiner = rng.choice(["", " "])
+                parts.append(rng.choice(NEGATION_WORDS) + joiner + rng.choice(vocabulary))
+            else:
+                parts.append(rng.choice(fillers))
+        corpus.append(rng.choice(["", " "]).join(parts))
+    return corpus[:size]
+
+
+def time_per_title(fn, corpus, labels, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for title, label in zip(corpus, labels):
+            fn(label, title)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(size, repeat):
+    corpus = golden_corpus(size)
+    rng = random.Random(2)
+    labels = [rng.choice(LABELS) for _ in corpus]
+
+    mismatches = [(label, title) for title, label in zip(corpus, labels)
+                  if apply_sentiment_rules(label, title) != legacy_apply_sentiment_rules(label, title)]
+    print(f"golden corpus: {len(corpus)} titles, mismatches: {len(mismatches)}")
+    for label, title in mismatches[:10]:
+        print(f"  MISMATCH [{label}] {title}")
+
+    # วัดทั้งชุดสังเคราะห์ (มีคำในพจนานุกรมหนาแน่น) และหัวข้อข่าวจริงที่วนซ้ำจนครบจำนวน
+    real_titles = load_titles()
+    workloads = [('golden', corpus, labels)]
+    if real_titles:
+        real_corpus = (real_titles * (size // len(real_titles) + 1))[:size]
+        workloads.append(('real titles', real_corpus, ['NEUTRAL'] * len(real_corpus)))
+
+    print(f"{'workload':>12} {'implementation':>15} {'seconds':>9} {'headlines/s':>12}")
+    for name, titles, title_labels in workloads:
+        legacy = time_per_title(legacy_apply_sentiment_rules, titles, title_labels, repeat)
+        compiled = time_per_title(apply_sentiment_rules, titles, title_labels, repeat)
+        print(f"{name:>12} {'legacy':>15} {legacy:>9.3f} {len(titles) / legacy:>12.0f}")
+        print(f"{name:>12} {'compiled':>15} {compiled:>9.3f} {len(titles) / compiled:>12.0f}")
+        print(f"{name:>12} speed-up: {legacy / compiled:.1f}x")
+    return not mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args.size, args.repeat) else 1)
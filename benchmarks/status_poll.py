@@ -0,0 +1,153 @@
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+import status_store
+
+# ==============================================================================
+# Load test: อุปกรณ์จำลองจำนวนมากเรียก /api/crisis_status พร้อมกัน ขณะที่สถานะเปลี่ยนเป็นระยะ
+# เทียบการ poll แบบเดิม (ได้ body ทุกครั้ง) กับ If-None-Match (304) และ long-poll
+# SQLite store รันอุปกรณ์กระจายในหลาย process เหมือน gunicorn หลาย worker
+# รัน: python -m benchmarks.status_poll --devices 200 --seconds 10
+# ==============================================================================
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_devices(store, devices, seconds, mode, interval):
+    """
+    รันอุปกรณ์จำลอง devices ตัวใน process นี้ คืนค่าจำนวนคำขอ, จำนวนที่ได้ body
+    และ (เวลา, etag) ที่แต่ละอุปกรณ์เห็นสถานะใหม่ครั้งแรก
+    """
+    totals = {'requests': 0, 'bodies': 0, 'body_bytes': 0, 'seen': []}
+    lock = threading.Lock()
+    stop_at = time.time() + seconds
+
+    def device():
+        etag = None
+        requests, bodies, body_bytes, seen = 0, 0, 0, []
+        # อุปกรณ์จริงไม่ได้เปิดพร้อมกัน กระจายจังหวะ poll ไม่ให้ตรงกับจังหวะการเขียน
+        time.sleep(random.uniform(0, interval))
+        while time.time() < stop_at:
+            known = () if mode == 'plain' or etag is None else (etag,)
+            wait = min(25.0, stop_at - time.time()) if mode == 'longpoll' else 0
+            payload, new_etag = store.poll(None, known, wait)
+            requests += 1
+            if payload is not None:
+                bodies += 1
+                body_bytes += len(str(payload))
+                if new_etag != etag:
+                    seen.append((time.time(), new_etag))
+                etag = new_etag
+            if mode != 'longpoll':
+                time.sleep(interval)
+        with lock:
+            totals['requests'] += requests
+            totals['bodies'] += bodies
+            totals['body_bytes'] += body_bytes
+            totals['seen'].extend(seen)
+
+    threads = [threading.Thread(target=device) for _ in range(devices)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return totals
+
+
+def _worker(args):
+    path, devices, seconds, mode, interval = args
+    store = status_store.SQLiteStatusStore(path=path, poll_interval=0.2)
+    return run_devices(store, devices, seconds, mode, interval)
+
+
+def writer(store, seconds, every):
+    """เปลี่ยนสถานะสลับ alert/normal ทุก every วินาที และคืนค่า list ของ (เวลาที่เขียน, etag)"""
+    changes = []
+    stop_at = time.time() + seconds
+    flip = 0
+    while time.time() + every < stop_at:
+        time.sleep(every)
+        flip += 1
+        store.update('brand', 'alert' if flip % 2 else 'normal')
+        changes.append((time.time(), status_store.status_etag(store.get())))
+    return changes
+
+
+def propagation_delays(changes, seen):
+    """ความหน่วงตั้งแต่เขียนจนอุปกรณ์เห็น etag นั้นครั้งแรก (ต่ออุปกรณ์ต่อการเปลี่ยนแปลง)"""
+    written = {etag: at for at, etag in changes}
+    return [at - written[etag] for at, etag in seen if etag in written and at >= written[etag]]
+
+
+def run(kind, mode, devices, seconds, interval, every, workers, path):
+    if kind == 'memory':
+        store = status_store.MemoryStatusStore(alert_ttl=3600)
+    else:
+        store = status_store.SQLiteStatusStore(path=path, alert_ttl=3600, poll_interval=0.2)
+    store.update('brand', 'normal')
+
+    started = time.perf_counter()
+    if kind == 'memory':
+        result = {}
+        thread = threading.Thread(target=lambda: result.update(
+            totals=run_devices(store, devices, seconds, mode, interval)))
+        thread.start()
+        changes = writer(store, seconds, every)
+        thread.join()
+        totals = result['totals']
+    else:
+        per_worker = max(1, devices // workers)
+        with multiprocessing.Pool(workers) as pool:
+            pending = pool.map_async(_worker, [(path, per_worker, seconds, mode, interval)] * workers)
+            changes = writer(store, seconds, every)
+            parts = pending.get()
+        totals = {'requests': 0, 'bodies': 0, 'body_bytes': 0, 'seen': []}
+        for part in parts:
+            for key in ('requests', 'bodies', 'body_bytes'):
+                totals[key] += part[key]
+            totals['seen'].extend(part['seen'])
+    elapsed = time.perf_counter() - started
+
+    delays = propagation_delays(changes, totals['seen'])
+    return {
+        'store': kind,
+        'mode': mode,
+        'requests_per_second': round(totals['requests'] / elapsed, 1),
+        'not_modified_ratio': round(1 - totals['bodies'] / totals['requests'], 3) if totals['requests'] else None,
+        'body_kb': round(totals['body_bytes'] / 1024, 1),
+        'changes': len(changes),
+        'delay_p50_ms': round(percentile(delays, 0.5) * 1000, 1) if delays else None,
+        'delay_p95_ms': round(percentile(delays, 0.95) * 1000, 1) if delays else None,
+        'delay_mean_ms': round(statistics.mean(delays) * 1000, 1) if delays else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate many devices polling /api/crisis_status")
+    parser.add_argument('--devices', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=1.0, help="poll interval of plain/etag devices")
+    parser.add_argument('--every', type=float, default=2.0, help="seconds between status changes")
+    parser.add_argument('--workers', type=int, default=2, help="processes sharing the SQLite store")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for kind in ('memory', 'sqlite'):
+            for mode in ('plain', 'etag', 'longpoll'):
+                path = os.path.join(tmp, f'{kind}_{mode}.db')
+                report = run(kind, mode, args.devices, args.seconds, args.interval, args.every, args.workers, path)
+                print(f"[{kind:6} {mode:8}] {report['requests_per_second']:>8} req/s, "
+                      f"304 ratio {report['not_modified_ratio']}, {report['body_kb']} KB bodies, "
+                      f"{report['changes']} changes seen in p50 {report['delay_p50_ms']} ms / "
+                      f"p95 {report['delay_p95_ms']} ms")
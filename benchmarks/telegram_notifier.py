@@ -0,0 +1,99 @@
+import argparse
+import os
+import tempfile
+import time
+
+import requests
+
+from benchmarks.telegram_stub import TelegramStub
+from telegram_notifier import TelegramNotifier
+
+# ==============================================================================
+# Benchmark: การส่ง Telegram แบบเดิม (requests.post ใน request ของผู้ใช้) เทียบกับคิว TelegramNotifier
+# ใช้ Telegram ปลอมในเครื่อง (benchmarks/telegram_stub.py) วัด 4 กรณี:
+#   1) เวลาที่ request ของผู้ใช้ต้องรอ  2) การรวม alert ของ keyword เดียวกัน
+#   3) การเคารพ retry_after เมื่อโดน 429  4) ข้อความค้างส่งยังอยู่หลังรีสตาร์ต
+# รัน: python -m benchmarks.telegram_notifier --delay 0.3
+# ==============================================================================
+
+
+def make_notifier(stub_url, db_path, **kwargs):
+    kwargs.setdefault('poll_interval', 0.05)
+    return TelegramNotifier('123:TOKEN', 'chat', api_base=stub_url, path=db_path, **kwargs)
+
+
+def caller_latency(db_path, delay, count):
+    with TelegramStub(delay=delay) as stub:
+        url = f"{stub.base_url}/bot123:TOKEN/sendMessage"
+        started = time.perf_counter()
+        for i in range(count):
+            requests.post(url, json={'chat_id': 'chat', 'text': f"alert {i}"})
+        blocking = (time.perf_counter() - started) / count
+
+        notifier = make_notifier(stub.base_url, db_path).start()
+        started = time.perf_counter()
+        for i in range(count):
+            notifier.notify(f"alert {i}")
+        queued = (time.perf_counter() - started) / count
+        notifier.flush(timeout=count * delay + 10)
+        notifier.stop()
+    print(f"caller wait per alert: blocking {blocking * 1000:.1f} ms, queued {queued * 1000:.2f} ms "
+          f"({len(stub.messages)} delivered)")
+
+
+def coalescing(db_path, alerts, keywords, window):
+    with TelegramStub() as stub:
+        notifier = make_notifier(stub.base_url, db_path, coalesce_window=window).start()
+        for i in range(alerts):
+            notifier.notify(f"Crisis Alert: brand{i % keywords} #{i}", coalesce_key=f"brand{i % keywords}")
+        time.sleep(window + 0.5)
+        notifier.flush()
+        notifier.stop()
+    print(f"coalescing: {alerts} alerts for {keywords} keywords in a burst -> {len(stub.messages)} messages "
+          f"(window {window:g}s), stats={notifier.stats}")
+
+
+def rate_limit(db_path, retry_after):
+    with TelegramStub(failures=[(429, retry_after)]) as stub:
+        notifier = make_notifier(stub.base_url, db_path).start()
+        started = time.time()
+        notifier.notify("ทดสอบ 429")
+        notifier.flush(timeout=retry_after + 10)
+        notifier.stop()
+    gap = stub.requests[1][0] - stub.requests[0][0] if len(stub.requests) > 1 else float('nan')
+    print(f"429 with retry_after={retry_after}s: retried after {gap:.2f}s, delivered in "
+          f"{time.time() - started:.2f}s, attempts={len(stub.requests)}")
+
+
+def restart(db_path):
+    # Telegram ล่ม (ไม่มีเซิร์ฟเวอร์ที่ port นี้) ข้อความต้องค้างอยู่ในคิวบนดิสก์
+    down = make_notifier('http://127.0.0.1:9', db_path, connect_timeout=0.2).start()
+    down.notify("ข้อความก่อนรีสตาร์ต")
+    time.sleep(0.5)
+    down.stop()
+    pending = down.pending_count()
+    with TelegramStub() as stub:
+        # process ใหม่: ปล่อยให้ถึงกำหนดส่งทันทีแทนการรอ backoff
+        revived = make_notifier(stub.base_url, db_path)
+        revived._conn().execute("UPDATE notification_outbox SET next_attempt_at = 0")
+        revived._conn().commit()
+        revived.start()
+        revived.flush()
+        revived.stop()
+    print(f"restart: {pending} pending after crash, delivered after restart: "
+          f"{[m['text'] for m in stub.messages]}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure the Telegram notification queue against a local fake API")
+    parser.add_argument('--delay', type=float, default=0.3, help='เวลาตอบของ Telegram ปลอม (วินาที)')
+    parser.add_argument('--count', type=int, default=10)
+    parser.add_argument('--window', type=float, default=2.0, help='coalesce window (วินาที)')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caller_latency(os.path.join(tmp, 'latency.db'), args.delay, args.count)
+        coalescing(os.path.join(tmp, 'coalesce.db'), 30, 3, args.window)
+        rate_limit(os.path.join(tmp, 'ratelimit.db'), args.retry_after)
+        restart(os.path.join(tmp, 'restart.db'))
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==============================================================================
+# เซิร์ฟเวอร์ Telegram Bot API จำลองในเครื่อง (ใช้กับ TELEGRAM_API_BASE หรือ TelegramNotifier(api_base=...))
+# รองรับ /bot<token>/sendMessage จำลองเวลาตอบ และกำหนดลำดับคำตอบที่ผิดพลาดล่วงหน้าได้
+# ==============================================================================
+
+
+class TelegramStub:
+    """
+    ตัวอย่าง:
+        with TelegramStub(delay=0.3, failures=[(429, 2)]) as stub:
+            notifier = TelegramNotifier('token', 'chat', api_base=stub.base_url)
+    failures คือ list ของ (status, retry_after) ที่จะตอบก่อนตอบ 200 ตามปกติ
+    """
+
+    def __init__(self, delay=0.0, failures=None):
+        self.delay = delay
+        self.failures = list(failures or [])
+        self.messages = []
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with stub._lock:
+                    stub.requests.append((time.time(), self.path, payload))
+                    failure = stub.failures.pop(0) if stub.failures else None
+                if stub.delay:
+                    threading.Event().wait(stub.delay)
+                if not self.path.endswith('/sendMessage'):
+                    return self._send(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+                if failure is not None:
+                    status, retry_after = failure
+                    body = {'ok': False, 'error_code': status, 'description': f"stub failure {status}"}
+                    if status == 429:
+                        body['description'] = f"Too Many Requests: retry after {retry_after}"
+                        body['parameters'] = {'retry_after': retry_after}
+                    elif status == 400:
+                        body['description'] = "Bad Request: can't parse entities"
+                    return self._send(status, body)
+                with stub._lock:
+                    stub.messages.append(payload)
+                self._send(200, {'ok': True, 'result': {'message_id': len(stub.messages)}})
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
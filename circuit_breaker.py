@@ -0,0 +1,267 @@
+import collections
+import os
+import threading
+import time
+
+from gemini_scheduler import is_transient_rate_limit, quota_retry_after
+from rolling_stats import percentiles_ms
+
+# ==============================================================================
+# Circuit breaker สำหรับบริการภายนอก (Gemini, NewsAPI) ใช้ร่วมกันทั้ง process ผ่าน get_breaker(name)
+# - closed: เรียกได้ตามปกติ และเก็บผลในหน้าต่างเวลา (สัดส่วนที่ล้มเหลว + สัดส่วนที่ช้าเกินกำหนด)
+# - open: ปฏิเสธทันที (CircuitOpenError) ผู้เรียกจึงไปใช้แผนสำรอง/ข้อมูลในแคชได้โดยไม่ต้องรอ timeout
+# - half_open: เมื่อครบเวลา ปล่อยคำขอทดสอบทีละคำขอ สำเร็จ = กลับเป็น closed, ล้มเหลว = open อีกรอบ
+# GuardedModel (Gemini) ไม่นับ 429 รายนาทีเป็นความล้มเหลว เพราะ GeminiBatchScheduler backoff แล้วลองใหม่เอง
+# แต่โควตาหมดจริง (รายวัน/retry นาน) นับเป็นความล้มเหลว และเปิดวงจรตามเวลาที่บริการบอกให้รอ
+# ตั้งค่าด้วย CIRCUIT_<KEY> หรือเฉพาะบริการด้วย CIRCUIT_<NAME>_<KEY> เช่น CIRCUIT_GEMINI_OPEN_SECONDS=60
+# ==============================================================================
+DEFAULTS = {
+    'window_seconds': 60.0,
+    'min_calls': 5,
+    'failure_rate': 0.5,
+    'slow_call_seconds': 15.0,
+    'slow_call_rate': 0.8,
+    'open_seconds': 30.0,
+    'half_open_probes': 1,
+}
+SERVICE_DEFAULTS = {
+    'gemini': {'slow_call_seconds': 20.0},
+    'newsapi': {'slow_call_seconds': 8.0, 'open_seconds': 20.0},
+}
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """บริการถูกตัดวงจรอยู่ (ล้มเหลว/ช้าต่อเนื่อง) จึงไม่เรียกจริงและให้ผู้เรียกใช้แผนสำรองทันที"""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+def _setting(name, key, default):
+    for env_name in (f'CIRCUIT_{name.upper()}_{key.upper()}', f'CIRCUIT_{key.upper()}'):
+        value = os.environ.get(env_name)
+        if value:
+            return type(default)(float(value))
+    return default
+
+
+class CircuitBreaker:
+    """
+    ใช้งาน:
+        breaker.call(fn, *args)   หรือ
+        token = breaker.before_call(); ...; breaker.record(token, ok)   (หรือ breaker.discard(token) ถ้าไม่นับผล)
+    ผลที่นับเป็นความล้มเหลวคือ exception จาก fn (หรือ ok=False) และการเรียกที่ใช้เวลาเกิน slow_call_seconds
+    ถูกนับเป็น "ช้า" ทั้งสองแบบเปิดวงจรได้เมื่อมีการเรียกในหน้าต่างอย่างน้อย min_calls ครั้ง
+    """
+
+    def __init__(self, name, **settings):
+        self.name = name
+        config = dict(DEFAULTS, **SERVICE_DEFAULTS.get(name, {}))
+        for key, default in config.items():
+            value = settings.get(key)
+            setattr(self, key, value if value is not None else _setting(name, key, default))
+        self.state = CLOSED
+        self.state_changed_at = time.time()
+        self.stats = {'calls': 0, 'failures': 0, 'slow_calls': 0, 'rejected': 0, 'opened': 0, 'probes': 0,
+                      'rate_limited': 0}
+        self.last_failure = None
+        self._window = collections.deque()
+        self._opened_until = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _set_state(self, state, now):
+        if state != self.state:
+            print(f"Circuit '{self.name}': {self.state} -> {state}")
+        self.state = state
+        self.state_changed_at = now
+
+    def _open(self, now):
+        self._opened_until = now + self.open_seconds
+        self._probes_in_flight = 0
+        self.stats['opened'] += 1
+        self._set_state(OPEN, now)
+
+    def _prune(self, now):
+        while self._window and self._window[0][0] < now - self.window_seconds:
+            self._window.popleft()
+
+    def is_open(self):
+        """True เมื่อวงจรเปิดและยังไม่ถึงเวลาทดสอบ (ตรวจได้โดยไม่ใช้สิทธิ์ probe ของ half_open)"""
+        with self._lock:
+            return self.state == OPEN and time.time() < self._opened_until
+
+    def raise_if_open(self):
+        """โยน CircuitOpenError ถ้าวงจรเปิดอยู่ (ใช้ข้ามงานทั้งชุดไปแผนสำรองก่อนเริ่มเรียกบริการ)"""
+        now = time.time()
+        with self._lock:
+            if self.state == OPEN and now < self._opened_until:
+                self.stats['rejected'] += 1
+                raise CircuitOpenError(self.name, self._opened_until - now)
+
+    def before_call(self):
+        """ขออนุญาตเรียกบริการ คืนค่า token สำหรับ record() หรือโยน CircuitOpenError"""
+        now = time.time()
+        with self._lock:
+            if self.state == OPEN and now >= self._opened_until:
+                self._set_state(HALF_OPEN, now)
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probes_in_flight >= self.half_open_probes):
+                self.stats['rejected'] += 1
+                raise CircuitOpenError(self.name, max(0.0, self._opened_until - now))
+            probe = self.state == HALF_OPEN
+            if probe:
+                self._probes_in_flight += 1
+                self.stats['probes'] += 1
+        return (time.perf_counter(), probe)
+
+    def record(self, token, ok, error=None):
+        started, probe = token
+        seconds = time.perf_counter() - started
+        slow = seconds >= self.slow_call_seconds
+        now = time.time()
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['failures'] += not ok
+            self.stats['slow_calls'] += slow
+            if not ok:
+                self.last_failure = {'at': now, 'error': str(error)[:200] if error else None}
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if ok and not slow:
+                    self._window.clear()
+                    self._set_state(CLOSED, now)
+                else:
+                    self._open(now)
+                return
+            self._window.append((now, ok, seconds, slow))
+            self._prune(now)
+            if self.state != CLOSED or len(self._window) < self.min_calls:
+                return
+            failures = sum(1 for _, call_ok, _, _ in self._window if not call_ok)
+            slow_calls = sum(1 for _, _, _, call_slow in self._window if call_slow)
+            if failures / len(self._window) >= self.failure_rate or slow_calls / len(self._window) >= self.slow_call_rate:
+                self._open(now)
+
+    def trip(self, seconds):
+        """เปิดวงจรทันทีอย่างน้อย seconds วินาที (เช่น โควตาหมดและบริการบอกเวลาที่ให้ลองใหม่)"""
+        now = time.time()
+        with self._lock:
+            if self.state != OPEN:
+                self._open(now)
+            self._opened_until = max(self._opened_until, now + seconds)
+
+    def discard(self, token):
+        """
+        คืน token โดยไม่นับผลในหน้าต่าง (ใช้กับการโดนจำกัดอัตรา ซึ่งเป็นสัญญาณให้ชะลอ ไม่ใช่บริการล่ม)
+        ถ้าเป็น probe ของ half_open วงจรยังคง half_open และคำขอถัดไปจะเป็น probe แทน
+        """
+        _, probe = token
+        with self._lock:
+            self.stats['rate_limited'] += 1
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def call(self, fn, *args, **kwargs):
+        token = self.before_call()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            self.record(token, False, e)
+            raise
+        self.record(token, True)
+        return result
+
+    def get_stats(self):
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            window = list(self._window)
+            stats = dict(self.stats, name=self.name, state=self.state,
+                         state_seconds=round(now - self.state_changed_at, 1), last_failure=self.last_failure)
+            if self.state == OPEN:
+                stats['retry_in_seconds'] = round(max(0.0, self._opened_until - now), 1)
+        stats['window_calls'] = len(window)
+        stats['window_failure_rate'] = round(sum(1 for _, ok, _, _ in window if not ok) / len(window), 3) if window else None
+        stats['window_slow_rate'] = round(sum(1 for _, _, _, slow in window if slow) / len(window), 3) if window else None
+        stats['p50_ms'], stats['p95_ms'] = percentiles_ms([seconds for _, _, seconds, _ in window])
+        stats['settings'] = {key: getattr(self, key) for key in DEFAULTS}
+        return stats
+
+
+class GuardedModel:
+    """
+    ห่อ genai.GenerativeModel ให้ทุก generate_content ผ่าน circuit breaker (รวม stream=True ที่นับผลเมื่ออ่านจบ)
+    attribute อื่น (เช่น model_name) ส่งต่อไปยังโมเดลเดิม
+    error ที่ is_ignored(error) เป็น True (ค่าเริ่มต้นคือ 429 รายนาที) จะไม่ถูกนับเป็นความล้มเหลว:
+    GeminiBatchScheduler ลองใหม่เองหลาย attempt ถ้านับทุกครั้งวงจรจะเปิดทั้งที่ batch สุดท้ายสำเร็จ
+    ส่วนโควตาหมดจริงนับเป็นความล้มเหลว และถ้าบริการบอกเวลาให้รอ จะเปิดวงจรไว้ตามนั้น
+    """
+
+    def __init__(self, model, breaker, is_ignored=is_transient_rate_limit):
+        self._model = model
+        self.breaker = breaker
+        self._is_ignored = is_ignored
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+    def _record_error(self, token, error):
+        if self._is_ignored(error):
+            self.breaker.discard(token)
+            return
+        self.breaker.record(token, False, error)
+        retry_after = quota_retry_after(error)
+        if retry_after:
+            self.breaker.trip(retry_after)
+
+    def generate_content(self, *args, **kwargs):
+        token = self.breaker.before_call()
+        try:
+            response = self._model.generate_content(*args, **kwargs)
+        except Exception as e:
+            self._record_error(token, e)
+            raise
+        if not kwargs.get('stream'):
+            self.breaker.record(token, True)
+            return response
+        return self._guard_stream(response, token)
+
+    def _guard_stream(self, response, token):
+        error = None
+        try:
+            for chunk in response:
+                yield chunk
+        except GeneratorExit:
+            # ผู้อ่านหยุดกลางทาง (เช่น ผู้ใช้ปิดหน้า) ไม่ใช่ความผิดของบริการ
+            raise
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if error is None:
+                self.breaker.record(token, True)
+            else:
+                self._record_error(token, error)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """คืนค่า CircuitBreaker ที่ใช้ร่วมกันทั้ง process (1 ตัวต่อชื่อบริการ)"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def get_all_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.get_stats() for breaker in breakers}
@@ -0,0 +1,143 @@
+import collections
+import hashlib
+import os
+import re
+import unicodedata
+
+import numpy as np
+
+from sentiment_cache import normalize_title
+from text_processing import tokenize_headline
+
+# ==============================================================================
+# รวมหัวข้อข่าวที่เกือบซ้ำกัน (ข่าวเดียวกันจากหลายสำนัก) ก่อนส่งไปวิเคราะห์
+# ใช้ MinHash ของ shingle คำภาษาไทย (คำเดี่ยว + คู่คำ) และ LSH 16 แถบ x 4 แถว เพื่อหา candidate
+# แล้วยืนยันด้วย Jaccard จริง จึงไม่ต้องเทียบทุกคู่ (SimHash 64 บิตแยกหัวข้อข่าวสั้นๆ ได้ไม่ดีพอ)
+# ==============================================================================
+NUM_PERMUTATIONS = 64
+LSH_ROWS = 4
+DEFAULT_THRESHOLD = 0.7
+# แต่ละ permutation คือ hash ของ feature XOR กับ seed แล้วผสมบิตด้วย finalizer ของ MurmurHash3
+_SEEDS = np.random.RandomState(20240601).randint(0, 1 << 62, NUM_PERMUTATIONS, dtype=np.int64).astype(np.uint64)
+_MIX_1 = np.uint64(0xff51afd7ed558ccd)
+_MIX_2 = np.uint64(0xc4ceb9fe1a85ec53)
+_SHIFT = np.uint64(33)
+# ตัวเลขและคำภาษาอังกฤษ (ชื่อแบรนด์, ไตรมาส, จำนวนเงิน) ต้องตรงกัน ข่าวที่ต่างกันแค่ตัวเลขจึงไม่ถูกรวม
+_ANCHOR_TOKEN = re.compile(r'[0-9a-z]')
+
+
+def dedup_enabled():
+    return os.environ.get('DEDUP_ENABLED', '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def headline_features(tokens):
+    """shingle ของหัวข้อข่าว: คำเดี่ยวและคู่คำที่ติดกัน"""
+    features = set(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return features
+
+
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash(features):
+    """ลายเซ็น MinHash (NUM_PERMUTATIONS ค่า) ของเซต features"""
+    values = np.fromiter((_feature_hash(feature) for feature in features), dtype=np.uint64, count=len(features))
+    values = values[:, None] ^ _SEEDS
+    values ^= values >> _SHIFT
+    values *= _MIX_1
+    values ^= values >> _SHIFT
+    values *= _MIX_2
+    values ^= values >> _SHIFT
+    return values.min(axis=0)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _exact_key(title):
+    # ทางลัดสำหรับหัวข้อที่ซ้ำกันทุกตัวอักษร (ไม่สนตัวพิมพ์/ช่องว่าง) ไม่ใช้ normalize_title ที่ตัดท้ายหัวข้อออก
+    # หัวข้อที่ต่างกันหลัง normalize ยังต้องผ่านการเทียบ Jaccard ตามปกติ
+    return ' '.join(unicodedata.normalize('NFC', title or '').lower().split())
+
+
+def cluster_headlines(titles, threshold=None, sources=None):
+    """
+    จัดกลุ่มหัวข้อข่าวที่เกือบซ้ำกัน คืนค่า list ของกลุ่ม แต่ละกลุ่มเป็น list ของ index ใน titles
+    สมาชิกตัวแรกของกลุ่มคือตัวแทน (ข่าวแรกที่พบ) และเทียบความคล้ายกับตัวแทนเท่านั้น กลุ่มจึงไม่ลามต่อกันเป็นทอดๆ
+    sources (ไม่บังคับ) คือชื่อสำนักข่าวของแต่ละหัวข้อ ใช้ตัดชื่อสำนักข่าวท้ายหัวข้อก่อนเทียบ
+    """
+    if threshold is None:
+        threshold = float(os.environ.get('DEDUP_THRESHOLD', DEFAULT_THRESHOLD))
+    band_count = NUM_PERMUTATIONS // LSH_ROWS
+
+    clusters = []
+    cluster_features = []
+    cluster_anchors = []
+    exact = {}
+    bands = [collections.defaultdict(list) for _ in range(band_count)]
+    for index, title in enumerate(titles):
+        exact_key = _exact_key(title)
+        cluster_id = exact.get(exact_key)
+        if cluster_id is not None:
+            clusters[cluster_id].append(index)
+            continue
+
+        tokens = tokenize_headline(normalize_title(title, sources[index] if sources else None))
+        features = headline_features(tokens)
+        anchors = frozenset(token for token in tokens if _ANCHOR_TOKEN.search(token))
+        keys = []
+        if features:
+            signature = minhash(features)
+            keys = [signature[band * LSH_ROWS:(band + 1) * LSH_ROWS].tobytes() for band in range(band_count)]
+            candidates = {cid for band, key in enumerate(keys) for cid in bands[band].get(key, ())}
+            for candidate in sorted(candidates):
+                if cluster_anchors[candidate] == anchors and jaccard(features, cluster_features[candidate]) >= threshold:
+                    cluster_id = candidate
+                    break
+
+        if cluster_id is None:
+            cluster_id = len(clusters)
+            clusters.append([])
+            cluster_features.append(features)
+            cluster_anchors.append(anchors)
+            for band, key in enumerate(keys):
+                bands[band][key].append(cluster_id)
+        exact[exact_key] = cluster_id
+        clusters[cluster_id].append(index)
+    return clusters
+
+
+def cluster_articles(articles):
+    """จัดกลุ่มข่าวที่เกือบซ้ำกัน (ข่าวแรกของแต่ละกลุ่มคือตัวแทน) หรือกลุ่มละข่าวเมื่อปิด DEDUP_ENABLED"""
+    if dedup_enabled():
+        return cluster_headlines([article['title'] for article in articles],
+                                 sources=[(article.get('source') or {}).get('name') for article in articles])
+    return [[index] for index in range(len(articles))]
+
+
+def expand_cluster_results(articles, clusters, representative_results):
+    """กระจาย sentiment ของข่าวตัวแทนกลับไปยังทุกข่าวในกลุ่ม (เพิ่ม cluster_size และ representative)"""
+    results = [None] * len(articles)
+    for cluster, representative in zip(clusters, representative_results):
+        for index in cluster:
+            article = articles[index]
+            results[index] = {
+                'title': article['title'], 'url': article['url'], 'sentiment': representative['sentiment'],
+                'cluster_size': len(cluster), 'representative': index == cluster[0],
+            }
+    return results
+
+
+def classify_with_dedup(articles, classify):
+    """
+    วิเคราะห์เฉพาะข่าวตัวแทนของแต่ละกลุ่มด้วย classify(representative_articles) -> list ของ result
+    แล้วกระจาย sentiment กลับไปยังทุกข่าวในกลุ่ม ผลลัพธ์แต่ละข่าวมี cluster_size และ representative (True/False)
+    """
+    clusters = cluster_articles(articles)
+    if len(clusters) < len(articles):
+        print(f"Dedup: {len(articles)} articles collapsed into {len(clusters)} stories")
+    representative_results = classify([articles[cluster[0]] for cluster in clusters])
+    return expand_cluster_results(articles, clusters, representative_results)
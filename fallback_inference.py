@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+
+# ==============================================================================
+# ตัวรันโมเดลสำรอง (transformers) แบบแบ่ง batch ตามความยาว สำหรับเครื่องที่มีแต่ CPU
+# - เรียงหัวข้อข่าวตามจำนวน token แล้วแบ่ง batch ขนาดคงที่ (padding น้อยที่สุด)
+# - รันใน torch.inference_mode() และกำหนดจำนวน thread ของ CPU ได้
+# - backend: 'torch' (โมเดลเดิม), 'quantized' (dynamic int8 ของ torch), 'onnx' (onnxruntime ผ่าน optimum)
+# ใช้เมื่อตั้ง FALLBACK_BACKEND เป็นค่าใดค่าหนึ่งข้างต้นเท่านั้น ค่าเริ่มต้นของแอปยังเป็น transformers pipeline
+# ==============================================================================
+BACKENDS = ('torch', 'quantized', 'onnx')
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_MAX_LENGTH = 128
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+class FallbackInferenceEngine:
+    """
+    predict(titles) คืนค่า label ตัวพิมพ์ใหญ่ตามลำดับ titles (เหมือน pipeline เดิม แต่เร็วกว่าเมื่อมีข่าวจำนวนมาก)
+    torch, onnxruntime และ optimum ถูก import ตอนสร้าง engine เท่านั้น
+    """
+
+    def __init__(self, model_name, backend=None, batch_size=None, num_threads=None, max_length=None):
+        self.model_name = model_name
+        # model_registry เป็นผู้อ่าน FALLBACK_BACKEND แล้วส่ง backend มาให้ ถ้าสร้าง engine เองโดยไม่ระบุจะใช้ 'torch'
+        self.backend = backend or 'torch'
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown fallback backend {self.backend!r}, expected one of {BACKENDS}")
+        self.batch_size = batch_size or _env_int('FALLBACK_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        self.num_threads = num_threads or _env_int('FALLBACK_NUM_THREADS')
+        self.max_length = max_length or _env_int('FALLBACK_MAX_LENGTH', DEFAULT_MAX_LENGTH)
+        self.stats = {'calls': 0, 'headlines': 0, 'batches': 0, 'padded_tokens': 0, 'seconds': 0.0}
+        # engine ตัวเดียวถูกใช้ร่วมกันหลาย thread ของคำขอ จึงต้องล็อกตอนอัปเดตสถิติ
+        self._stats_lock = threading.Lock()
+
+        import torch
+        from transformers import AutoTokenizer
+
+        self._torch = torch
+        if self.num_threads:
+            torch.set_num_threads(self.num_threads)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = self._load_model()
+        self.id2label = {int(i): label.upper() for i, label in self.model.config.id2label.items()}
+
+    def _load_model(self):
+        if self.backend == 'onnx':
+            try:
+                from optimum.onnxruntime import ORTModelForSequenceClassification
+                import onnxruntime
+            except ImportError as e:
+                raise ImportError("FALLBACK_BACKEND=onnx requires 'optimum[onnxruntime]'") from e
+            session_options = onnxruntime.SessionOptions()
+            if self.num_threads:
+                session_options.intra_op_num_threads = self.num_threads
+            return ORTModelForSequenceClassification.from_pretrained(
+                self.model_name, export=True, session_options=session_options)
+
+        from transformers import AutoModelForSequenceClassification
+
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_name)
+        model.eval()
+        if self.backend == 'quantized':
+            # แปลงเฉพาะชั้น Linear เป็น int8 ตอนโหลด (ไม่ต้องมีชุดข้อมูล calibrate)
+            model = self._torch.quantization.quantize_dynamic(model, {self._torch.nn.Linear},
+                                                               dtype=self._torch.qint8)
+        return model
+
+    def _length_buckets(self, titles):
+        """คืนค่า list ของ index แต่ละ batch โดยเรียงตามจำนวน token ให้หัวข้อยาวใกล้กันอยู่ batch เดียวกัน"""
+        lengths = [len(ids) for ids in self.tokenizer(
+            titles, truncation=True, max_length=self.max_length)['input_ids']]
+        order = sorted(range(len(titles)), key=lengths.__getitem__)
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)], lengths
+
+    def predict(self, titles):
+        return [label for label, _ in self.predict_scored(titles)]
+
+    def predict_scored(self, titles):
+        """คืนค่า list ของ (label, score) ตามลำดับ titles โดย score คือความน่าจะเป็น (softmax) ของ label นั้น"""
+        titles = list(titles)
+        if not titles:
+            return []
+        started = time.perf_counter()
+        batches, lengths = self._length_buckets(titles)
+        labels = [None] * len(titles)
+        padded_tokens = 0
+        with self._torch.inference_mode():
+            for indices in batches:
+                encoded = self.tokenizer([titles[i] for i in indices], padding=True, truncation=True,
+                                         max_length=self.max_length, return_tensors='pt')
+                scores, predictions = self._torch.softmax(self.model(**encoded).logits, dim=-1).max(dim=-1)
+                for index, score, prediction in zip(indices, scores.tolist(), predictions.tolist()):
+                    labels[index] = (self.id2label[prediction], score)
+                padded_tokens += encoded['input_ids'].shape[1] * len(indices) - sum(lengths[i] for i in indices)
+        with self._stats_lock:
+            self.stats['calls'] += 1
+            self.stats['headlines'] += len(titles)
+            self.stats['batches'] += len(batches)
+            self.stats['padded_tokens'] += padded_tokens
+            self.stats['seconds'] += time.perf_counter() - started
+        return labels
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update(backend=self.backend, batch_size=self.batch_size, num_threads=self.num_threads)
+        stats['seconds'] = round(stats['seconds'], 3)
+        return stats
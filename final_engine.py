@@ -1,9 +1,11 @@
 # ==============================================================================
 # ส่วนที่ 1: Import ไลบรารีที่จำเป็น
 # ==============================================================================
-import requests
 import pandas as pd
-from transformers import pipeline
+import history_store
+import model_registry
+from anomaly_detector import StreamingAnomalyDetector
+from news_client import NewsApiError, get_default_client
 
 
 # ==============================================================================
@@ -14,32 +16,26 @@ def get_data_from_api(keyword, api_key):
     ดึงข้อมูลข่าวโดยตรงผ่าน NewsAPI เพื่อความเสถียร
     จะคืนค่าเป็น DataFrame ของ Pandas ที่มี 'title' และ 'timestamp'
     """
-    url = f'https://newsapi.org/v2/everything?q={keyword}&language=th&sortBy=publishedAt&apiKey={api_key}'
     print(f"🚀 [Step 2.1] กำลังดึงข้อมูลสำหรับคำว่า: '{keyword}' จาก NewsAPI...")
 
 
     try:
-        response = requests.get(url)
-        data = response.json()
+        articles = get_default_client(api_key).fetch_articles(keyword)
+        if not articles:
+            return pd.DataFrame() # คืนค่า DataFrame ว่างถ้าไม่เจอข่าว
 
 
-        if data['status'] == 'ok':
-            articles = data.get('articles', [])
-            if not articles:
-                return pd.DataFrame() # คืนค่า DataFrame ว่างถ้าไม่เจอข่าว
-
-
-            # สร้าง DataFrame ด้วย Pandas
-            df = pd.DataFrame(articles)
-            df = df[['title', 'publishedAt']] # เลือกเฉพาะคอลัมน์ที่ต้องการ
-            df = df.rename(columns={'publishedAt': 'timestamp'}) # เปลี่ยนชื่อคอลัมน์
-            print(f"✅ [Step 2.1] ดึงข้อมูลสำเร็จ ได้มา {len(df)} ข่าว")
-            return df
-        else:
-            print(f"🚨 [Step 2.1] Error จาก API: {data.get('message')}")
-            return pd.DataFrame()
+        # สร้าง DataFrame ด้วย Pandas
+        df = pd.DataFrame(articles)
+        df = df[['title', 'publishedAt']] # เลือกเฉพาะคอลัมน์ที่ต้องการ
+        df = df.rename(columns={'publishedAt': 'timestamp'}) # เปลี่ยนชื่อคอลัมน์
+        print(f"✅ [Step 2.1] ดึงข้อมูลสำเร็จ ได้มา {len(df)} ข่าว")
+        return df
 
 
+    except NewsApiError as e:
+        print(f"🚨 [Step 2.1] Error จาก API: {e}")
+        return pd.DataFrame()
     except Exception as e:
         print(f"🚨 [Step 2.1] เกิดข้อผิดพลาดในการเชื่อมต่อ: {e}")
         return pd.DataFrame()
@@ -54,17 +50,11 @@ def analyze_sentiment_and_update_df(df):
     แล้วเพิ่มคอลัมน์ 'sentiment' กลับเข้าไปใน DataFrame เดิม
     """
     print("\n🧠 [Step 2.2] กำลังโหลดโมเดล AI เพื่อวิเคราะห์ความรู้สึก...")
-    sentiment_analyzer = pipeline(
-        "sentiment-analysis",
-        model="lxyuan/distilbert-base-multilingual-cased-sentiments-student"
-    )
-   
     titles = df['title'].tolist()
     print("...เริ่มการวิเคราะห์ความรู้สึก...")
-    results = sentiment_analyzer(titles)
-   
-    # ดึงเฉพาะ 'label' (เช่น 'POSITIVE', 'NEGATIVE') ออกมา
-    sentiments = [result['label'].upper() for result in results]
+
+    # ดึงเฉพาะ 'label' (เช่น 'POSITIVE', 'NEGATIVE') ออกมา หัวข้อที่เคยวิเคราะห์แล้วจะมาจากแคช
+    sentiments = model_registry.predict_labels(titles)
     df['sentiment'] = sentiments
    
     print("✅ [Step 2.2] วิเคราะห์ความรู้สึกสำเร็จ")
@@ -74,14 +64,33 @@ def analyze_sentiment_and_update_df(df):
 # ==============================================================================
 # ขั้นตอนที่ 2.3: สร้างระบบตรวจจับความผิดปกติ (Anomaly Detector)
 # ==============================================================================
-def detect_anomalies(df):
+def compare_with_history(df, keyword, window='7d'):
+    """
+    เทียบสัดส่วนข่าวเชิงลบ (%) ของข้อมูลชุดนี้กับ baseline ของ keyword ใน history.db
+    อ่านจาก rollup รายชั่วโมง/รายวันผ่าน history_store.get_baseline (ไม่แตะแถวดิบ) คืนค่า dict ของ baseline
+    """
+    negative_percent = (df['sentiment'] == 'NEGATIVE').mean() * 100
+    baseline = history_store.get_baseline(keyword, window=window, value=negative_percent)
+    if not baseline['count']:
+        print(f"...ยังไม่มีประวัติของ '{keyword}' ใน {window} ล่าสุดให้เทียบ")
+        return baseline
+    zscore = f"{baseline['zscore']:.2f}" if baseline['zscore'] is not None else "-"
+    print(f"...ข่าวเชิงลบ {negative_percent:.1f}% เทียบค่าเฉลี่ย {window} ในประวัติ {baseline['mean']:.1f}% "
+          f"({baseline['count']} ครั้ง, z-score {zscore})")
+    return baseline
+
+
+def detect_anomalies(df, sigmas=2.0, keyword=None):
     """
     รับ DataFrame ที่มีข้อมูลสมบูรณ์แล้วมาตรวจจับความผิดปกติ
+    ป้อนข่าวตามลำดับเวลาเข้า StreamingAnomalyDetector (baseline แบบ rollup: mean + sigmas*std ของชั่วโมงก่อนหน้า)
+    ตัวเดียวกับที่ Watchlist ใช้ แล้วดูว่าชั่วโมงล่าสุดเกินเกณฑ์หรือไม่ คืนค่า event แจ้งเตือนหรือ None
+    ถ้าระบุ keyword จะเทียบสัดส่วนข่าวเชิงลบกับ baseline จาก rollup ใน history.db ด้วย (compare_with_history)
     """
     print("\n🕵️  [Step 2.3] กำลังเริ่มตรวจจับความผิดปกติ...")
     if df.empty or 'sentiment' not in df.columns:
         print("...ไม่มีข้อมูลให้วิเคราะห์")
-        return
+        return None
 
 
     # แปลงคอลัมน์ timestamp ให้เป็นรูปแบบวันที่และเวลาที่ Python เข้าใจ
@@ -89,35 +98,39 @@ def detect_anomalies(df):
     df.set_index('timestamp', inplace=True)
 
 
-    # นับจำนวนข่าว 'NEGATIVE' ในแต่ละชั่วโมง
-    negative_counts_per_hour = df[df['sentiment'] == 'NEGATIVE'].resample('h').size()
-   
-    if len(negative_counts_per_hour) < 2:
+    if keyword:
+        compare_with_history(df, keyword)
+
+    # จำนวนข่าวเชิงลบต่อชั่วโมงนับจากข่าวชุดนี้เอง: rollup ใน history.db เก็บ negative_percent ต่อการวิเคราะห์
+    # (ไม่ใช่จำนวนข่าวต่อชั่วโมง) จึงใช้เป็น baseline ของเกณฑ์นี้โดยตรงไม่ได้
+    detector = StreamingAnomalyDetector(method='rollup', sigmas=sigmas)
+    events = detector.add_many(sorted(zip(df.index, df['sentiment']), key=lambda row: row[0]))
+    mean_negatives, _ = detector.baseline(detector.current_bucket)
+    threshold = detector.threshold(detector.current_bucket)
+    if threshold is None:
         print("...ข้อมูลน้อยเกินไปที่จะคำนวณค่า Baseline")
-        return
-       
-    # คำนวณค่า Baseline
-    mean_negatives = negative_counts_per_hour.mean()
-    std_dev_negatives = negative_counts_per_hour.std()
-   
-    # กำหนดเกณฑ์ (Threshold)
-    threshold = mean_negatives + (2 * std_dev_negatives)
-   
+        return None
+
     # ดึงข้อมูลชั่วโมงล่าสุด
-    last_hour_count = negative_counts_per_hour.iloc[-1]
-   
+    last_hour_count = detector.current_count
+
     print(f"...ค่าเฉลี่ยข่าวเชิงลบต่อชั่วโมง: {mean_negatives:.2f}")
     print(f"...เกณฑ์แจ้งเตือน (Threshold): {threshold:.2f}")
     print(f"...จำนวนข่าวเชิงลบในชั่วโมงล่าสุด: {last_hour_count}")
 
 
-    # ตรวจสอบว่าเกินเกณฑ์หรือไม่
-    if last_hour_count > threshold and last_hour_count > 0:
+    # ตรวจสอบว่าชั่วโมงล่าสุดเกินเกณฑ์หรือไม่ (ชั่วโมงก่อนหน้าที่เคยเกินเกณฑ์แสดงไว้เป็นข้อมูลประกอบ)
+    last_event = events[-1] if events and detector.alerted_bucket == detector.current_bucket else None
+    for event in events:
+        if event is not last_event:
+            print(f"...เคยเกินเกณฑ์เมื่อ {event['bucket_start']}: {event['negative_count']} ข่าว")
+    if last_event:
         print("\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         print("!!! 🚨 ALERT: พบภาวะผิดปกติ! จำนวนข่าวเชิงลบพุ่งสูงขึ้น !!!")
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
     else:
         print("\n✅ [Step 2.3] สถานการณ์ปกติ ไม่พบความผิดปกติ")
+    return last_event
 
 
 # ==============================================================================
@@ -142,7 +155,7 @@ if __name__ == "__main__":
 
 
             # Step 2.3: ตรวจจับความผิดปกติ
-            detect_anomalies(data_df)
+            detect_anomalies(data_df, keyword=target_keyword)
 
 
             # บันทึกผลลัพธ์ทั้งหมดลงไฟล์ CSV
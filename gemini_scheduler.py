@@ -0,0 +1,157 @@
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# ==============================================================================
+# ตัวจัดคิวส่งงานไปยัง Gemini แบบขนาน (Concurrent Batch Scheduler)
+# ==============================================================================
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 4
+# 429 ที่ให้รอนานกว่านี้ (หรือเป็นโควตารายวัน) ถือว่าโควตาหมดจริง ลองใหม่ในไม่กี่วินาทีไม่ช่วย
+QUOTA_RETRY_SECONDS = 120
+_RETRY_DELAY = re.compile(r'retry in ([0-9.]+)\s*s|retry_delay\s*\{\s*seconds:\s*([0-9]+)')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def is_rate_limit_error(error):
+    """ตรวจว่า exception ที่ได้มาเป็นการโดนจำกัดอัตรา (HTTP 429 / quota) หรือไม่"""
+    code = getattr(error, 'code', None) or getattr(error, 'status_code', None)
+    if code == 429:
+        return True
+    if type(error).__name__ in ('ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(error).lower()
+    return '429' in message or 'resource exhausted' in message or 'rate limit' in message or 'quota' in message
+
+
+def _retry_after_seconds(error):
+    """ดึงค่า retry-after (วินาที) จาก exception หรือจากข้อความ error ของ Gemini ("Please retry in 37.1s") ถ้ามี"""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is None:
+        match = _RETRY_DELAY.search(str(error))
+        retry_after = next((group for group in match.groups() if group), None) if match else None
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def is_quota_exhausted(error):
+    """429 จากโควตารายวัน (PerDay) หรือที่ให้รอนานกว่า QUOTA_RETRY_SECONDS ซึ่ง backoff สั้นๆ ไม่ช่วย"""
+    if not is_rate_limit_error(error):
+        return False
+    message = str(error).lower().replace(' ', '')
+    if 'perday' in message or 'daily' in message:
+        return True
+    retry_after = _retry_after_seconds(error)
+    return retry_after is not None and retry_after > QUOTA_RETRY_SECONDS
+
+
+def is_transient_rate_limit(error):
+    """429 รายนาทีที่ scheduler backoff แล้วลองใหม่ได้ (ไม่นับเป็นความล้มเหลวของ circuit breaker)"""
+    return is_rate_limit_error(error) and not is_quota_exhausted(error)
+
+
+def quota_retry_after(error):
+    """จำนวนวินาทีที่บริการบอกให้รอเมื่อโควตาหมด (None ถ้าไม่ใช่โควตาหมดหรือไม่ได้บอกเวลา)"""
+    return _retry_after_seconds(error) if is_quota_exhausted(error) else None
+
+
+class RateLimiter:
+    """
+    ตัวจำกัดอัตราแบบเว้นระยะ (pacing) ตามจำนวน request ต่อนาที
+    เมื่อโดน 429 จะยืดระยะห่างออกไป (adaptive) และค่อยๆ ลดกลับเมื่อเรียกสำเร็จ
+    """
+
+    MAX_PENALTY = 16.0
+
+    def __init__(self, requests_per_minute):
+        self.base_interval = 60.0 / max(1, requests_per_minute)
+        self.penalty = 1.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.base_interval * self.penalty
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None):
+        with self._lock:
+            self.penalty = min(self.MAX_PENALTY, self.penalty * 2)
+            if retry_after:
+                self._next_slot = max(self._next_slot, time.monotonic() + retry_after)
+
+    def reward(self):
+        with self._lock:
+            if self.penalty > 1.0:
+                self.penalty = max(1.0, self.penalty * 0.8)
+
+
+class GeminiBatchScheduler:
+    """
+    ส่ง batch หลายชุดไปพร้อมกันภายใต้งบ requests-per-minute และจำนวนงานขนานที่กำหนด
+    ผลลัพธ์จะถูกคืนตามลำดับของ batch เดิมเสมอ ไม่ว่าชุดไหนจะเสร็จก่อน
+    """
+
+    def __init__(self, requests_per_minute=None, max_concurrency=None, max_retries=None):
+        self.requests_per_minute = requests_per_minute or _env_int('GEMINI_RPM', DEFAULT_REQUESTS_PER_MINUTE)
+        self.max_concurrency = max_concurrency or _env_int('GEMINI_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY)
+        self.max_retries = max_retries if max_retries is not None else _env_int('GEMINI_MAX_RETRIES', DEFAULT_MAX_RETRIES)
+        self.rate_limiter = RateLimiter(self.requests_per_minute)
+        self.stats = {'calls': 0, 'rate_limited': 0, 'failed': 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _run_one(self, index, batch, call):
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
+            self._count('calls')
+            try:
+                result = call(batch)
+                self.rate_limiter.reward()
+                return result
+            except Exception as e:
+                # โควตาหมดจริงไม่ต้องรอลองใหม่ ให้ผู้เรียกไปใช้แผนสำรองทันที
+                if not is_transient_rate_limit(e) or attempt == self.max_retries:
+                    self._count('failed')
+                    print(f"Scheduler: Batch {index + 1} failed: {e}")
+                    return None
+                self._count('rate_limited')
+                retry_after = _retry_after_seconds(e)
+                self.rate_limiter.penalize(retry_after)
+                # exponential backoff + jitter เพื่อไม่ให้ทุก thread ยิงกลับพร้อมกัน
+                delay = retry_after or min(30.0, 2.0 ** attempt)
+                delay += random.uniform(0, 1.0)
+                print(f"Scheduler: Batch {index + 1} rate limited, retrying in {delay:.1f}s")
+                time.sleep(delay)
+        return None
+
+    def run(self, batches, call):
+        """
+        เรียก call(batch) กับทุก batch แบบขนาน แล้วคืน list ผลลัพธ์ตามลำดับ batch
+        batch ที่ล้มเหลวหลังลองใหม่ครบแล้วจะได้ค่า None
+        """
+        if not batches:
+            return []
+        workers = max(1, min(self.max_concurrency, len(batches)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='gemini-batch') as executor:
+            futures = [executor.submit(self._run_one, i, batch, call) for i, batch in enumerate(batches)]
+            return [future.result() for future in futures]
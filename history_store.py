@@ -0,0 +1,349 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from rolling_stats import RunningStats
+
+# ==============================================================================
+# คลังข้อมูลประวัติการวิเคราะห์ (history.db)
+# ใช้การเชื่อมต่อซ้ำต่อ thread, WAL mode และ migration แบบมีเวอร์ชันแทน init_db.py
+# ==============================================================================
+DEFAULT_DB_PATH = 'history.db'
+
+# แต่ละรายการคือ (เวอร์ชัน, คำสั่ง SQL) ห้ามแก้รายการเดิม ให้เพิ่มเวอร์ชันใหม่ต่อท้ายเท่านั้น
+MIGRATIONS = [
+    (1, '''
+        CREATE TABLE IF NOT EXISTS analysis_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            keyword TEXT NOT NULL,
+            analysis_date TEXT NOT NULL,
+            negative_percent REAL NOT NULL,
+            positive_percent REAL NOT NULL,
+            neutral_percent REAL NOT NULL
+        )
+    '''),
+    (2, '''
+        CREATE INDEX IF NOT EXISTS idx_analysis_history_keyword_date
+        ON analysis_history (keyword, analysis_date)
+    '''),
+    (3, '''
+        CREATE TABLE IF NOT EXISTS analysis_rollups (
+            keyword TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            granularity TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            total REAL NOT NULL,
+            total_sq REAL NOT NULL,
+            PRIMARY KEY (keyword, metric, granularity, bucket_start)
+        ) WITHOUT ROWID;
+        INSERT OR REPLACE INTO analysis_rollups
+            SELECT keyword, 'negative_percent', 'hour', strftime('%Y-%m-%d %H:00:00', analysis_date),
+                   COUNT(*), SUM(negative_percent), SUM(negative_percent * negative_percent)
+            FROM analysis_history GROUP BY 1, 4;
+        INSERT OR REPLACE INTO analysis_rollups
+            SELECT keyword, 'negative_percent', 'day', strftime('%Y-%m-%d 00:00:00', analysis_date),
+                   COUNT(*), SUM(negative_percent), SUM(negative_percent * negative_percent)
+            FROM analysis_history GROUP BY 1, 4;
+    '''),
+    (4, '''
+        CREATE TABLE IF NOT EXISTS watchlist_state (
+            keyword TEXT PRIMARY KEY,
+            high_water_mark TEXT,
+            last_run_at REAL,
+            last_status TEXT
+        )
+    '''),
+    (5, '''
+        CREATE TABLE IF NOT EXISTS crisis_status (
+            keyword TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            timestamp INTEGER NOT NULL,
+            expires_at INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS crisis_status_meta (
+            name TEXT PRIMARY KEY,
+            value
+        );
+    '''),
+    (6, '''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            coalesce_key TEXT,
+            text TEXT NOT NULL,
+            parse_mode TEXT,
+            merged_count INTEGER NOT NULL DEFAULT 1,
+            created_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            locked_until REAL NOT NULL DEFAULT 0,
+            last_error TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_notification_outbox_due ON notification_outbox (next_attempt_at);
+        CREATE TABLE IF NOT EXISTS notification_last_sent (
+            coalesce_key TEXT PRIMARY KEY,
+            sent_at REAL NOT NULL
+        );
+    '''),
+    (7, '''
+        CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+            source TEXT PRIMARY KEY,
+            position INTEGER NOT NULL,
+            records INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS backfill_counts (
+            keyword TEXT NOT NULL,
+            bucket_start TEXT NOT NULL,
+            positive INTEGER NOT NULL,
+            negative INTEGER NOT NULL,
+            neutral INTEGER NOT NULL,
+            PRIMARY KEY (keyword, bucket_start)
+        ) WITHOUT ROWID;
+    '''),
+    (8, '''
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id TEXT PRIMARY KEY,
+            key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            stage TEXT,
+            message TEXT,
+            progress INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            result TEXT,
+            version INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            finished_at REAL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_analysis_jobs_key ON analysis_jobs (key, status);
+    '''),
+    (9, '''
+        ALTER TABLE watchlist_state ADD COLUMN next_run_at REAL;
+        ALTER TABLE watchlist_state ADD COLUMN last_error TEXT;
+        ALTER TABLE watchlist_state ADD COLUMN last_new_articles INTEGER NOT NULL DEFAULT 0;
+    '''),
+]
+
+# หน้าต่างเวลาไม่เกินค่านี้จะอ่านจาก rollup รายชั่วโมง ที่ยาวกว่าจะอ่านจากรายวัน
+HOURLY_WINDOW_LIMIT = timedelta(hours=48)
+BUCKET_FORMATS = {'hour': '%Y-%m-%d %H:00:00', 'day': '%Y-%m-%d 00:00:00'}
+
+_local = threading.local()
+_migrated_paths = set()
+_migrate_lock = threading.Lock()
+
+
+def get_db_path():
+    return os.environ.get('HISTORY_DB_PATH', DEFAULT_DB_PATH)
+
+
+def migrate(conn):
+    """อัปเดต schema ให้เป็นเวอร์ชันล่าสุดตาม PRAGMA user_version และคืนค่าเวอร์ชันปัจจุบัน"""
+    current = conn.execute('PRAGMA user_version').fetchone()[0]
+    for version, statement in MIGRATIONS:
+        if version <= current:
+            continue
+        with conn:
+            conn.executescript(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+        print(f"History: Applied migration {version}")
+        current = version
+    return current
+
+
+def get_connection(path=None):
+    """
+    คืนค่าการเชื่อมต่อ SQLite ของ thread ปัจจุบัน (สร้างครั้งแรกแล้วใช้ซ้ำ)
+    ครั้งแรกของแต่ละไฟล์ใน process จะรัน migration ให้อัตโนมัติ
+    """
+    path = path or get_db_path()
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        connections[path] = conn
+        with _migrate_lock:
+            if path not in _migrated_paths:
+                migrate(conn)
+                _migrated_paths.add(path)
+    return conn
+
+
+def close_connection(path=None):
+    """ปิดการเชื่อมต่อของ thread ปัจจุบัน (เช่น ก่อน thread จบการทำงาน)"""
+    conn = getattr(_local, 'connections', {}).pop(path or get_db_path(), None)
+    if conn is not None:
+        conn.close()
+
+
+def _upsert_rollups(conn, keyword, metric, value, when):
+    """เพิ่มค่า 1 ค่าเข้า rollup รายชั่วโมงและรายวันแบบสะสม (ไม่ต้องคำนวณจากแถวดิบใหม่)"""
+    conn.executemany(
+        "INSERT INTO analysis_rollups (keyword, metric, granularity, bucket_start, count, total, total_sq) "
+        "VALUES (?, ?, ?, ?, 1, ?, ?) "
+        "ON CONFLICT (keyword, metric, granularity, bucket_start) DO UPDATE SET "
+        "count = count + 1, total = total + excluded.total, total_sq = total_sq + excluded.total_sq",
+        [(keyword, metric, granularity, when.strftime(bucket_format), value, value * value)
+         for granularity, bucket_format in BUCKET_FORMATS.items()]
+    )
+
+
+def save_analysis(keyword, percentages, analysis_date=None, path=None):
+    """บันทึกผลการวิเคราะห์ 1 ครั้งลงตาราง analysis_history และอัปเดต rollup ใน transaction เดียวกัน"""
+    save_analyses([(keyword, percentages)], analysis_date, path)
+
+
+def save_analyses(entries, analysis_date=None, path=None):
+    """บันทึกผลหลาย keyword [(keyword, percentages), ...] พร้อม rollup ใน transaction เดียว (ใช้เวลาเดียวกันทุกแถว)"""
+    when = datetime.strptime(analysis_date, '%Y-%m-%d %H:%M:%S') if analysis_date else datetime.now()
+    conn = get_connection(path)
+    with conn:
+        for keyword, percentages in entries:
+            negative_percent = percentages.get('NEGATIVE', 0)
+            conn.execute(
+                "INSERT INTO analysis_history (keyword, analysis_date, negative_percent, positive_percent, neutral_percent) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (keyword, when.strftime('%Y-%m-%d %H:%M:%S'), negative_percent, percentages.get('POSITIVE', 0),
+                 percentages.get('NEUTRAL', 0))
+            )
+            _upsert_rollups(conn, keyword, 'negative_percent', negative_percent, when)
+
+
+def parse_window(window):
+    """แปลง '24h', '7d', '30d' (หรือ timedelta) เป็น timedelta"""
+    if isinstance(window, timedelta):
+        return window
+    unit = window[-1].lower()
+    amount = int(window[:-1])
+    if unit == 'h':
+        return timedelta(hours=amount)
+    if unit == 'd':
+        return timedelta(days=amount)
+    raise ValueError(f"Unsupported window: {window!r} (use e.g. '24h', '7d', '30d')")
+
+
+def get_rollup_stats(keyword, window='7d', metric='negative_percent', now=None, path=None):
+    """
+    รวม rollup ของ keyword ในหน้าต่างเวลาที่กำหนดเป็น RunningStats เดียว
+    อ่านเพียงจำนวน bucket ในหน้าต่าง (ไม่แตะแถวดิบใน analysis_history)
+    """
+    span = parse_window(window)
+    granularity = 'hour' if span <= HOURLY_WINDOW_LIMIT else 'day'
+    cutoff = ((now or datetime.now()) - span).strftime(BUCKET_FORMATS[granularity])
+    row = get_connection(path).execute(
+        "SELECT COALESCE(SUM(count), 0), COALESCE(SUM(total), 0), COALESCE(SUM(total_sq), 0) "
+        "FROM analysis_rollups WHERE keyword = ? AND metric = ? AND granularity = ? AND bucket_start >= ?",
+        (keyword, metric, granularity, cutoff)
+    ).fetchone()
+    return RunningStats(*row)
+
+
+def get_baseline(keyword, window='7d', value=None, metric='negative_percent', path=None):
+    """คืนค่า dict {count, mean, std, zscore} ของ keyword ในหน้าต่างเวลา (zscore ของ value ถ้าระบุมา)"""
+    stats = get_rollup_stats(keyword, window=window, metric=metric, path=path)
+    baseline = stats.as_dict()
+    baseline['window'] = window if isinstance(window, str) else str(window)
+    baseline['zscore'] = stats.zscore(value) if value is not None else None
+    return baseline
+
+
+def get_negative_average(keyword, days=7, path=None):
+    """ค่าเฉลี่ย negative_percent ของ keyword ในช่วง days วันล่าสุดจาก rollup รายวัน (None ถ้าไม่มีข้อมูล)"""
+    return get_rollup_stats(keyword, window=timedelta(days=days), path=path).mean
+
+
+WATCHLIST_STATE_FIELDS = ('high_water_mark', 'last_run_at', 'last_status', 'next_run_at', 'last_error',
+                          'last_new_articles')
+
+
+def get_watchlist_state(keyword, path=None):
+    """คืนค่าสถานะล่าสุดของ keyword ใน watchlist (high-water mark ของ publishedAt ฯลฯ) หรือ None"""
+    return get_watchlist_states([keyword], path).get(keyword)
+
+
+def get_watchlist_states(keywords, path=None):
+    """สถานะล่าสุดของหลาย keyword {keyword: dict} (ทุก worker อ่านได้ ไม่ต้องเป็น process ที่รัน scheduler)"""
+    keywords = list(keywords)
+    if not keywords:
+        return {}
+    rows = get_connection(path).execute(
+        f"SELECT keyword, {', '.join(WATCHLIST_STATE_FIELDS)} FROM watchlist_state "
+        f"WHERE keyword IN ({', '.join('?' * len(keywords))})", keywords
+    ).fetchall()
+    return {row[0]: dict(zip(WATCHLIST_STATE_FIELDS, row[1:])) for row in rows}
+
+
+def save_watchlist_state(keyword, high_water_mark, last_run_at, last_status, next_run_at=None, last_error=None,
+                         last_new_articles=0, path=None):
+    conn = get_connection(path)
+    with conn:
+        conn.execute(
+            f"INSERT INTO watchlist_state (keyword, {', '.join(WATCHLIST_STATE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (keyword) DO UPDATE SET high_water_mark = excluded.high_water_mark, "
+            "last_run_at = excluded.last_run_at, last_status = excluded.last_status, "
+            "next_run_at = excluded.next_run_at, last_error = excluded.last_error, "
+            "last_new_articles = excluded.last_new_articles",
+            (keyword, high_water_mark, last_run_at, last_status, next_run_at, last_error, last_new_articles)
+        )
+
+
+def get_backfill_checkpoints(path=None):
+    """ตำแหน่งล่าสุดที่ backfill อ่านไปแล้วของแต่ละไฟล์ {source: (position, records)}"""
+    rows = get_connection(path).execute("SELECT source, position, records FROM backfill_checkpoints").fetchall()
+    return {source: (position, records) for source, position, records in rows}
+
+
+def save_backfill_chunk(counts, checkpoints, path=None):
+    """
+    สะสมจำนวนข่าวราย keyword ต่อชั่วโมง {(keyword, bucket_start): [positive, negative, neutral]} ลงตารางพัก
+    พร้อมบันทึก checkpoint {source: (position, records)} ใน transaction เดียวกัน
+    หยุดกลางทางเมื่อไร จำนวนที่นับแล้วกับ checkpoint จึงตรงกันเสมอ
+    """
+    now = time.time()
+    conn = get_connection(path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO backfill_counts (keyword, bucket_start, positive, negative, neutral) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (keyword, bucket_start) DO UPDATE SET positive = positive + excluded.positive, "
+            "negative = negative + excluded.negative, neutral = neutral + excluded.neutral",
+            [(keyword, bucket_start, *values) for (keyword, bucket_start), values in counts.items()]
+        )
+        conn.executemany(
+            "INSERT INTO backfill_checkpoints (source, position, records, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (source) DO UPDATE SET position = excluded.position, records = excluded.records, "
+            "updated_at = excluded.updated_at",
+            [(source, position, records, now) for source, (position, records) in checkpoints.items()]
+        )
+
+
+def flush_backfill_counts(limit=1000, path=None):
+    """
+    ย้ายจำนวนข่าวรายชั่วโมงจากตารางพักไปเป็นแถวใน analysis_history (1 แถวต่อ keyword ต่อชั่วโมง) พร้อม rollup
+    ครั้งละไม่เกิน limit แถวต่อ transaction และลบออกจากตารางพักใน transaction เดียวกัน คืนค่าจำนวนแถวที่ย้าย
+    """
+    conn = get_connection(path)
+    with conn:
+        rows = conn.execute(
+            "SELECT keyword, bucket_start, positive, negative, neutral FROM backfill_counts "
+            "ORDER BY keyword, bucket_start LIMIT ?", (limit,)
+        ).fetchall()
+        for keyword, bucket_start, positive, negative, neutral in rows:
+            total = (positive + negative + neutral) or 1
+            negative_percent = negative / total * 100
+            conn.execute(
+                "INSERT INTO analysis_history (keyword, analysis_date, negative_percent, positive_percent, neutral_percent) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (keyword, bucket_start, negative_percent, positive / total * 100, neutral / total * 100)
+            )
+            _upsert_rollups(conn, keyword, 'negative_percent', negative_percent,
+                            datetime.strptime(bucket_start, '%Y-%m-%d %H:%M:%S'))
+        conn.executemany("DELETE FROM backfill_counts WHERE keyword = ? AND bucket_start = ?",
+                         [(keyword, bucket_start) for keyword, bucket_start, *_ in rows])
+    return len(rows)
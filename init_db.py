@@ -1,22 +1,14 @@
 import sqlite3
 
+import history_store
+
 # Connect to the database file (it will be created if it doesn't exist)
-connection = sqlite3.connect('history.db')
-cursor = connection.cursor()
+path = history_store.get_db_path()
+connection = sqlite3.connect(path)
 
-# Create the table to store analysis history
-cursor.execute('''
-    CREATE TABLE IF NOT EXISTS analysis_history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        keyword TEXT NOT NULL,
-        analysis_date TEXT NOT NULL,
-        negative_percent REAL NOT NULL,
-        positive_percent REAL NOT NULL,
-        neutral_percent REAL NOT NULL
-    )
-''')
+# Create or upgrade the tables and indexes to the latest schema version
+version = history_store.migrate(connection)
 
-connection.commit()
 connection.close()
 
-print("Database 'history.db' and table 'analysis_history' created successfully.")
\ No newline at end of file
+print(f"Database '{path}' is at schema version {version}.")
@@ -0,0 +1,292 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import history_store
+
+# ==============================================================================
+# ระบบงานเบื้องหลัง (Background Jobs) สำหรับการวิเคราะห์ที่ใช้เวลานาน
+# งานรันใน worker ที่รับคำขอ ส่วนสถานะ/ผลลัพธ์เก็บใน SQLiteJobStore (history.db) เมื่อ JOB_STORE=sqlite
+# คำขอดูสถานะ/stream ที่ไปตก worker อื่นของ gunicorn จึงยังเห็นงานเดียวกัน
+# ==============================================================================
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_MAX_PENDING = 16
+DEFAULT_RESULT_TTL = 600
+DEFAULT_POLL_INTERVAL = 0.5
+# งานที่ยังไม่จบแต่ไม่มีการอัปเดตนานเกินค่านี้ ถือว่า worker ที่รันอยู่ตายไปแล้ว
+DEFAULT_STALE_SECONDS = 900
+# ลบงานเก่าใน store (DELETE ใน history.db) อย่างมากครั้งเดียวต่อช่วงเวลานี้ ไม่ใช่ทุกครั้งที่ submit
+STORE_PURGE_INTERVAL_SECONDS = 60
+SNAPSHOT_FIELDS = ('status', 'stage', 'message', 'progress', 'error', 'version', 'created_at', 'finished_at')
+
+
+class JobQueueFull(Exception):
+    """มีงานค้างในคิวเต็มจำนวนที่กำหนดแล้ว"""
+
+
+class Job:
+    """
+    สถานะของงาน 1 งาน: stage/progress อัปเดตระหว่างทำงาน และ result/error เมื่อจบ
+    ทุกครั้งที่มีการเปลี่ยนแปลง version จะเพิ่มขึ้น เพื่อให้ผู้ที่รอ (SSE/long-poll) รู้ว่ามีข้อมูลใหม่
+    """
+
+    def __init__(self, key, store=None):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.message = None
+        self.progress = 0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.version = 0
+        self._store = store
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def update(self, **fields):
+        with self._changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            if self._store is not None:
+                try:
+                    self._store.save(self)
+                except Exception as e:
+                    print(f"Jobs: Failed to save job {self.id} to the job store: {e}")
+            self._changed.notify_all()
+
+    def wait_for_change(self, since_version, timeout):
+        """รอจนกว่า version จะเปลี่ยนจาก since_version หรือหมดเวลา แล้วคืนค่า snapshot ล่าสุด"""
+        with self._changed:
+            if self.version == since_version and not self.finished:
+                self._changed.wait(timeout)
+            return self.snapshot()
+
+    def snapshot(self, include_result=False):
+        data = {
+            'job_id': self.id,
+            'key': self.key,
+            'status': self.status,
+            'stage': self.stage,
+            'message': self.message,
+            'progress': self.progress,
+            'error': self.error,
+            'version': self.version,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class StoredJob:
+    """
+    งานที่รันอยู่ใน worker อื่น อ่านจาก SQLiteJobStore (อ่านอย่างเดียว)
+    มี attribute/method ชุดเดียวกับ Job ที่ route ใช้ (status, result, snapshot, wait_for_change)
+    """
+
+    def __init__(self, store, row):
+        self._store = store
+        self._apply(row)
+
+    def _apply(self, row):
+        self.id = row['id']
+        self.key = row['key']
+        self.result = row['result']
+        for name in SNAPSHOT_FIELDS:
+            setattr(self, name, row[name])
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def wait_for_change(self, since_version, timeout):
+        deadline = time.time() + timeout
+        while self.version == since_version and not self.finished and time.time() < deadline:
+            time.sleep(min(self._store.poll_interval, max(0.0, deadline - time.time())))
+            row = self._store.load(self.id)
+            if row is not None:
+                self._apply(row)
+        return self.snapshot()
+
+    snapshot = Job.snapshot
+
+
+class SQLiteJobStore:
+    """
+    เก็บ snapshot ของงานในตาราง analysis_jobs (history.db โดยค่าเริ่มต้น) ทุกครั้งที่งานเปลี่ยนสถานะ
+    worker อื่นอ่านสถานะจากตารางนี้ และการรอ (SSE) ข้าม process ใช้การอ่านซ้ำทุก poll_interval วินาที
+    """
+
+    def __init__(self, path=None, poll_interval=None, stale_seconds=None):
+        self.path = path or os.environ.get('JOB_DB_PATH') or history_store.get_db_path()
+        self.poll_interval = poll_interval or float(os.environ.get('JOB_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+        self.stale_seconds = stale_seconds or int(os.environ.get('JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS))
+
+    def _conn(self):
+        return history_store.get_connection(self.path)
+
+    def save(self, job):
+        result = json.dumps(job.result, ensure_ascii=False) if job.result is not None else None
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO analysis_jobs (id, key, status, stage, message, progress, error, result, version, "
+                "created_at, finished_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, stage = excluded.stage, "
+                "message = excluded.message, progress = excluded.progress, error = excluded.error, "
+                "result = excluded.result, version = excluded.version, finished_at = excluded.finished_at, "
+                "updated_at = excluded.updated_at",
+                (job.id, job.key, job.status, job.stage, job.message, job.progress, job.error, result, job.version,
+                 job.created_at, job.finished_at, time.time())
+            )
+
+    def _row(self, row):
+        (job_id, key, status, stage, message, progress, error, result, version,
+         created_at, finished_at, updated_at) = row
+        row = {'id': job_id, 'key': key, 'status': status, 'stage': stage, 'message': message,
+               'progress': progress, 'error': error, 'result': json.loads(result) if result else None,
+               'version': version, 'created_at': created_at, 'finished_at': finished_at}
+        if status not in ('done', 'error') and time.time() - updated_at > self.stale_seconds:
+            # worker ที่รันงานนี้หยุดไปกลางทาง (รีสตาร์ต/ตาย) จะไม่มีใครอัปเดตแถวนี้อีก
+            row.update(status='error', error='Worker stopped before the job finished', finished_at=updated_at)
+        return row
+
+    def load(self, job_id):
+        row = self._conn().execute("SELECT * FROM analysis_jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def find_in_flight(self, key):
+        """งานของ key นี้ที่ยังไม่จบ (จาก worker ใดก็ได้) หรือ None"""
+        rows = self._conn().execute(
+            "SELECT * FROM analysis_jobs WHERE key = ? AND status IN ('queued', 'running') "
+            "ORDER BY created_at DESC", (key,)
+        ).fetchall()
+        for row in rows:
+            row = self._row(row)
+            if row['status'] not in ('done', 'error'):
+                return row
+        return None
+
+    def purge(self, result_ttl):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM analysis_jobs WHERE finished_at IS NOT NULL AND finished_at < ?",
+                         (time.time() - result_ttl,))
+            conn.execute("DELETE FROM analysis_jobs WHERE updated_at < ?",
+                         (time.time() - self.stale_seconds - result_ttl,))
+
+
+class JobManager:
+    """
+    รันงานบน thread pool ที่จำกัดขนาด และจำกัดจำนวนงานค้างทั้งหมด (ถ้าเต็มจะโยน JobQueueFull)
+    งานที่มี key เดียวกันและยังไม่จบจะถูกรวมเป็นงานเดียว (coalesce) แทนการรันซ้ำ
+    ผลลัพธ์ของงานที่จบแล้วจะถูกเก็บไว้ result_ttl วินาที
+    เมื่อระบุ store (SQLiteJobStore) งานของ worker อื่นจะหาเจอผ่าน get() และถูกรวมด้วยเช่นกัน
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, result_ttl=None, store=None):
+        self.max_workers = max_workers or int(os.environ.get('ANALYSIS_WORKERS', DEFAULT_MAX_WORKERS))
+        self.max_pending = max_pending or int(os.environ.get('ANALYSIS_MAX_PENDING', DEFAULT_MAX_PENDING))
+        self.result_ttl = result_ttl or int(os.environ.get('ANALYSIS_RESULT_TTL', DEFAULT_RESULT_TTL))
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='analysis-job')
+        self._jobs = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._last_store_purge = 0.0
+
+    def submit(self, key, fn):
+        """
+        ส่งงาน fn(report) เข้าคิว โดย report(stage, progress, message=None) ใช้รายงานความคืบหน้า
+        คืนค่า (job, created) โดย created=False หมายถึงถูกรวมเข้ากับงานเดิมที่กำลังทำอยู่
+        """
+        with self._lock:
+            self._purge_expired()
+            existing = self._in_flight.get(key)
+            if existing is not None:
+                return existing, False
+            if self.store is not None:
+                row = self.store.find_in_flight(key)
+                if row is not None:
+                    return StoredJob(self.store, row), False
+            if len(self._in_flight) >= self.max_pending:
+                raise JobQueueFull(f"{len(self._in_flight)} analysis jobs already pending")
+            job = Job(key, self.store)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        if self.store is not None:
+            self.store.save(job)
+        self._executor.submit(self._run, job, fn)
+        return job, True
+
+    def _run(self, job, fn):
+        def report(stage, progress, message=None):
+            job.update(stage=stage, progress=int(progress), message=message)
+
+        job.update(status='running')
+        try:
+            result = fn(report)
+            job.update(status='done', stage='done', message=None, progress=100, result=result, finished_at=time.time())
+        except Exception as e:
+            print(f"Jobs: Job {job.id} ({job.key}) failed: {e}")
+            job.update(status='error', error=str(e), finished_at=time.time())
+        finally:
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if self.store is not None and now - self._last_store_purge >= STORE_PURGE_INTERVAL_SECONDS:
+            self._last_store_purge = now
+            self.store.purge(self.result_ttl)
+
+    def get(self, job_id):
+        """งานใน worker นี้ หรือ (เมื่อมี store) งานที่รันอยู่ใน worker อื่น คืนค่า None ถ้าไม่พบ"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.store is not None:
+            row = self.store.load(job_id)
+            job = StoredJob(self.store, row) if row else None
+        return job
+
+    def stream(self, job, heartbeat=15):
+        """
+        generator ที่คืน snapshot ทุกครั้งที่งานเปลี่ยนสถานะ (และ None เป็น heartbeat เมื่อไม่มีอะไรใหม่)
+        จบเมื่องานเสร็จหรือล้มเหลว
+        """
+        version = -1
+        while True:
+            snapshot = job.wait_for_change(version, heartbeat)
+            if snapshot['version'] == version:
+                yield None
+                continue
+            version = snapshot['version']
+            yield snapshot
+            if snapshot['status'] in ('done', 'error'):
+                return
+
+
+def create_job_manager(kind=None):
+    """เลือกที่เก็บสถานะงานตาม JOB_STORE ('sqlite' ค่าเริ่มต้น ใช้ร่วมกันทุก worker หรือ 'memory' สำหรับ process เดียว)"""
+    kind = (kind or os.environ.get('JOB_STORE', 'sqlite')).lower()
+    if kind == 'memory':
+        return JobManager()
+    if kind == 'sqlite':
+        return JobManager(store=SQLiteJobStore())
+    raise ValueError(f"Unknown JOB_STORE {kind!r}, expected 'sqlite' or 'memory'")
@@ -0,0 +1,206 @@
+import collections
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from circuit_breaker import CircuitOpenError
+from rolling_stats import percentiles_ms
+from ttl_cache import TTLCache
+
+# ==============================================================================
+# ทางผ่านกลาง (LLM Gateway) สำหรับ route ที่ขอคำแนะนำจาก Gemini
+# (/get_pr_suggestion, /get_executive_summary, /get_root_cause, /simulate_crisis)
+# - แคชคำตอบตาม hash ของ prompt (มีอายุและจำกัดจำนวน)
+# - คำขอที่เหมือนกันพร้อมกันจะรวมเป็นการเรียก Gemini ครั้งเดียว (single-flight)
+# - แต่ละ route มี timeout ของตัวเอง และเก็บสถิติ hit/latency
+# - stream() ส่งข้อความทีละส่วนจาก Gemini (stream=True) และวัด time-to-first-token
+# - เมื่อ circuit breaker ของ Gemini เปิดอยู่ คำตอบในแคชยังใช้ได้ ส่วนคำขอใหม่จะล้มเหลวทันที (นับเป็น short_circuited)
+# ==============================================================================
+DEFAULT_CACHE_TTL = 1800
+DEFAULT_CACHE_MAX_ENTRIES = 256
+DEFAULT_WORKERS = 4
+DEFAULT_TIMEOUT = 20
+ROUTE_TIMEOUTS = {
+    'pr_suggestion': 25,
+    'executive_summary': 20,
+    'root_cause': 15,
+    'simulate_crisis': 15,
+}
+LATENCY_WINDOW = 200
+
+
+class LLMTimeout(Exception):
+    """Gemini ตอบไม่ทันภายใน timeout ของ route (การเรียกยังทำต่อเบื้องหลังและจะเก็บผลลงแคชเมื่อเสร็จ)"""
+
+
+def _model_name(model):
+    return getattr(model, 'model_name', None) or type(model).__name__
+
+
+class LLMGateway:
+
+    def __init__(self, cache_ttl=None, max_entries=None, workers=None):
+        cache_ttl = cache_ttl or int(os.environ.get('LLM_CACHE_TTL', DEFAULT_CACHE_TTL))
+        max_entries = max_entries or int(os.environ.get('LLM_CACHE_MAX_ENTRIES', DEFAULT_CACHE_MAX_ENTRIES))
+        self.cache = TTLCache(maxsize=max_entries, ttl=cache_ttl)
+        self._executor = ThreadPoolExecutor(max_workers=workers or int(os.environ.get('LLM_GATEWAY_WORKERS', DEFAULT_WORKERS)),
+                                            thread_name_prefix='llm-gateway')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stats = collections.defaultdict(lambda: {
+            'requests': 0, 'hits': 0, 'coalesced': 0, 'calls': 0, 'errors': 0, 'timeouts': 0, 'short_circuited': 0,
+            'latencies': collections.deque(maxlen=LATENCY_WINDOW),
+            'streams': 0, 'stream_errors': 0,
+            'ttft': collections.deque(maxlen=LATENCY_WINDOW),
+            'stream_total': collections.deque(maxlen=LATENCY_WINDOW),
+        })
+
+    def timeout_for(self, route):
+        """timeout ของ route: LLM_TIMEOUT_<ROUTE> > ค่าใน ROUTE_TIMEOUTS > LLM_TIMEOUT"""
+        value = os.environ.get(f'LLM_TIMEOUT_{route.upper()}')
+        if value:
+            return float(value)
+        return ROUTE_TIMEOUTS.get(route, float(os.environ.get('LLM_TIMEOUT', DEFAULT_TIMEOUT)))
+
+    @staticmethod
+    def cache_key(route, model, prompt):
+        raw = '\x1f'.join((route, _model_name(model), prompt))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def generate(self, route, model, prompt, safety_settings=None, parse=None, timeout=None):
+        """
+        เรียก model.generate_content(prompt) ผ่านแคชและ single-flight แล้วคืนค่าข้อความ (หรือ parse(ข้อความ) ถ้าระบุ)
+        คำตอบว่างหรือ parse ไม่ผ่านจะโยน exception และไม่ถูกเก็บลงแคช
+        หมดเวลาจะโยน LLMTimeout
+        """
+        key = self.cache_key(route, model, prompt)
+        timeout = timeout or self.timeout_for(route)
+        started = time.perf_counter()
+        cached = self.cache.get(key)
+        with self._lock:
+            stats = self._stats[route]
+            stats['requests'] += 1
+            if cached is not None:
+                stats['hits'] += 1
+                stats['latencies'].append(time.perf_counter() - started)
+                return parse(cached) if parse else cached
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._executor.submit(self._call, route, key, model, prompt, safety_settings, parse)
+                self._inflight[key] = future
+            else:
+                stats['coalesced'] += 1
+
+        try:
+            text = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                stats['timeouts'] += 1
+            raise LLMTimeout(f"{route} did not respond within {timeout}s")
+        finally:
+            with self._lock:
+                stats['latencies'].append(time.perf_counter() - started)
+        return parse(text) if parse else text
+
+    def _call(self, route, key, model, prompt, safety_settings, parse):
+        try:
+            with self._lock:
+                self._stats[route]['calls'] += 1
+            response = model.generate_content(prompt, safety_settings=safety_settings)
+            text = response.text
+            if not text or not text.strip():
+                raise ValueError("Gemini returned an empty response.")
+            if parse:
+                parse(text)
+            self.cache.set(key, text)
+            return text
+        except CircuitOpenError:
+            with self._lock:
+                self._stats[route]['short_circuited'] += 1
+            raise
+        except Exception:
+            with self._lock:
+                self._stats[route]['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stream(self, route, model, prompt, safety_settings=None, timeout=None):
+        """
+        เรียก model.generate_content(prompt, stream=True) แล้ว yield ข้อความทีละส่วนทันทีที่ได้รับ
+        ถ้ามีคำตอบในแคชจะ yield ทั้งก้อนครั้งเดียว เมื่อได้ข้อความครบจะเก็บลงแคชเดียวกับ generate()
+        (ไม่ผ่าน single-flight เพราะ stream แบ่งให้หลายคนอ่านพร้อมกันไม่ได้)
+        Gemini error หรือคำตอบว่างจะโยน exception ออกมาจาก generator ให้ผู้เรียกส่งข้อความสำรองแทน
+        """
+        key = self.cache_key(route, model, prompt)
+        timeout = timeout or self.timeout_for(route)
+        started = time.perf_counter()
+        cached = self.cache.get(key)
+        with self._lock:
+            stats = self._stats[route]
+            stats['requests'] += 1
+            stats['streams'] += 1
+            if cached is not None:
+                stats['hits'] += 1
+        if cached is not None:
+            self._record_stream(stats, started, started)
+            yield cached
+            return
+
+        first_token_at = None
+        parts = []
+        try:
+            with self._lock:
+                stats['calls'] += 1
+            response = model.generate_content(prompt, safety_settings=safety_settings, stream=True,
+                                              request_options={'timeout': timeout})
+            for chunk in response:
+                text = chunk.text
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(text)
+                yield text
+            full_text = ''.join(parts)
+            if not full_text.strip():
+                raise ValueError("Gemini returned an empty response.")
+            self.cache.set(key, full_text)
+        except CircuitOpenError:
+            with self._lock:
+                stats['short_circuited'] += 1
+            raise
+        except Exception:
+            with self._lock:
+                stats['errors'] += 1
+                stats['stream_errors'] += 1
+            raise
+        finally:
+            self._record_stream(stats, started, first_token_at)
+
+    def _record_stream(self, stats, started, first_token_at):
+        now = time.perf_counter()
+        with self._lock:
+            if first_token_at is not None:
+                stats['ttft'].append(first_token_at - started)
+            stats['stream_total'].append(now - started)
+            stats['latencies'].append(now - started)
+        ttft = f"{(first_token_at - started) * 1000:.0f} ms" if first_token_at is not None else "-"
+        print(f"LLM stream: time-to-first-token {ttft}, total {(now - started) * 1000:.0f} ms")
+
+    def get_stats(self):
+        with self._lock:
+            routes = {}
+            for route, stats in self._stats.items():
+                summary = {name: value for name, value in stats.items()
+                           if not isinstance(value, collections.deque)}
+                summary['hit_rate'] = round(stats['hits'] / stats['requests'], 3) if stats['requests'] else None
+                summary['p50_ms'], summary['p95_ms'] = percentiles_ms(stats['latencies'])
+                summary['ttft_p50_ms'], summary['ttft_p95_ms'] = percentiles_ms(stats['ttft'])
+                summary['stream_p50_ms'], summary['stream_p95_ms'] = percentiles_ms(stats['stream_total'])
+                summary['timeout_seconds'] = self.timeout_for(route)
+                routes[route] = summary
+        return {'routes': routes, 'cache': self.cache.get_stats(), 'inflight': len(self._inflight)}
@@ -0,0 +1,144 @@
+import json
+import re
+import threading
+
+# ==============================================================================
+# แปลงคำตอบ JSON ของ LLM ที่อาจไม่สมบูรณ์ (มี code fence, ข้อความนำ, ถูกตัดกลางทาง, มีบางรายการเสีย)
+# - parse_labeled_items: กู้รายการ {"id": .., "sentiment": ..} (หรือ key สั้น {"i": .., "s": ..}) ที่ใช้ได้ทีละตัว และตรวจ id/label
+# - parse_json_object: หา JSON object ตัวแรกในคำตอบ (ใช้กับ /get_root_cause, /simulate_crisis)
+# ==============================================================================
+SENTIMENT_LABELS = frozenset({'POSITIVE', 'NEGATIVE', 'NEUTRAL'})
+
+_decoder = json.JSONDecoder()
+_CODE_FENCE = re.compile(r'```[a-zA-Z]*')
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_BARE_LABEL = re.compile(r':\s*([A-Z_]+)\s*([,}])')
+
+_counters = {
+    'responses': 0, 'clean_responses': 0, 'salvaged_responses': 0, 'unparseable_responses': 0,
+    'valid_items': 0, 'salvaged_items': 0, 'repaired_items': 0, 'invalid_items': 0, 'missing_items': 0,
+    're_requested_items': 0, 're_request_batches': 0, 're_request_recovered': 0,
+}
+_counters_lock = threading.Lock()
+
+
+def count(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def get_parse_stats():
+    with _counters_lock:
+        return dict(_counters)
+
+
+def strip_code_fences(text):
+    return _CODE_FENCE.sub('', text or '').strip()
+
+
+def _repair(fragment):
+    """แก้ข้อผิดพลาดที่ LLM ทำบ่อย: comma เกินท้าย, single quote, label ที่ไม่มีเครื่องหมายคำพูด"""
+    fragment = _TRAILING_COMMA.sub(r'\1', fragment)
+    if '"' not in fragment:
+        fragment = fragment.replace("'", '"')
+    return _BARE_LABEL.sub(r': "\1"\2', fragment)
+
+
+def iter_json_objects(text):
+    """
+    yield (object, repaired) ของทุก JSON object ระดับบนสุดที่ decode ได้ในข้อความ โดยข้ามส่วนที่เสียไป
+    ใช้กู้รายการที่ดีจาก array ที่ถูกตัดกลางทางหรือมีบางรายการผิดรูปแบบ
+    """
+    pos = text.find('{')
+    while pos != -1:
+        try:
+            value, end = _decoder.raw_decode(text, pos)
+            repaired = False
+        except json.JSONDecodeError:
+            end = text.find('}', pos) + 1
+            if not end:
+                return
+            try:
+                value = json.loads(_repair(text[pos:end]))
+                repaired = True
+            except json.JSONDecodeError:
+                pos = text.find('{', pos + 1)
+                continue
+        if isinstance(value, dict):
+            yield value, repaired
+        pos = text.find('{', end)
+
+
+def _normalize_id(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+
+def parse_labeled_items(text, expected_ids, label_key='sentiment', labels=SENTIMENT_LABELS, id_key='id'):
+    """
+    คืนค่า dict id -> label (ตัวพิมพ์ใหญ่) เฉพาะรายการที่ id (key ชื่อ id_key) อยู่ใน expected_ids และ label ถูกต้อง
+    ถ้า array ทั้งก้อน decode ได้จะใช้ตรงๆ ไม่งั้นจะกู้ทีละ object; id ที่ซ้ำกันใช้ตัวแรก
+    id ที่ไม่อยู่ในผลลัพธ์ถือว่าหายไป (ผู้เรียกส่งไปวิเคราะห์ใหม่เฉพาะ id เหล่านั้น)
+    """
+    expected_ids = set(expected_ids)
+    cleaned = strip_code_fences(text)
+    items = None
+    start, end = cleaned.find('['), cleaned.rfind(']')
+    if start != -1 and end > start:
+        try:
+            decoded = json.loads(cleaned[start:end + 1])
+            if isinstance(decoded, list):
+                items = [(item, False) for item in decoded]
+        except json.JSONDecodeError:
+            pass
+    clean = items is not None
+    if not clean:
+        items = list(iter_json_objects(cleaned))
+
+    results = {}
+    invalid = repaired = 0
+    for item, was_repaired in items:
+        if not isinstance(item, dict):
+            invalid += 1
+            continue
+        item_id = _normalize_id(item.get(id_key))
+        label = str(item.get(label_key, '')).strip().upper()
+        if item_id not in expected_ids or label not in labels or item_id in results:
+            invalid += 1
+            continue
+        results[item_id] = label
+        repaired += was_repaired
+
+    with _counters_lock:
+        _counters['responses'] += 1
+        if not results:
+            _counters['unparseable_responses'] += 1
+        elif clean:
+            _counters['clean_responses'] += 1
+        else:
+            _counters['salvaged_responses'] += 1
+            _counters['salvaged_items'] += len(results)
+        _counters['valid_items'] += len(results)
+        _counters['repaired_items'] += repaired
+        _counters['invalid_items'] += invalid
+        _counters['missing_items'] += len(expected_ids) - len(results)
+    return results
+
+
+def parse_json_object(text, required_keys=()):
+    """
+    คืนค่า JSON object ตัวแรกในคำตอบ (ข้าม code fence และข้อความนำหน้า/ต่อท้าย)
+    ถ้าไม่พบ หรือขาด key ใน required_keys จะโยน ValueError (LLMGateway จึงไม่เก็บคำตอบนี้ลงแคช)
+    """
+    cleaned = strip_code_fences(text)
+    for value, _ in iter_json_objects(cleaned):
+        missing = [key for key in required_keys if key not in value]
+        if missing:
+            raise ValueError(f"JSON response is missing keys: {', '.join(missing)}")
+        return value
+    raise ValueError("No JSON object found in AI response")
@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+
+from sentiment_cache import classify_with_cache
+
+# ==============================================================================
+# ทะเบียนโมเดล (Model Registry) สำหรับโมเดลสำรองของ transformers
+# ==============================================================================
+SENTIMENT_MODEL_NAME = "lxyuan/distilbert-base-multilingual-cased-sentiments-student"
+
+_registry_lock = threading.Lock()
+_model_locks = {}
+_pipelines = {}
+_model_stats = {}
+_stats_hooks = []
+
+
+def _current_rss_mb():
+    """
+    อ่านหน่วยความจำที่ process ใช้อยู่ (RSS) เป็นเมกะไบต์
+    ใช้ /proc บน Linux และถอยไปใช้ resource (ค่าสูงสุด) บนระบบอื่น
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS รายงานเป็น bytes ส่วน Linux รายงานเป็น kilobytes
+        return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+    except Exception:
+        return None
+
+
+def add_stats_hook(callback):
+    """
+    ลงทะเบียนฟังก์ชันที่จะถูกเรียกทุกครั้งที่โหลดโมเดลเสร็จ
+    callback จะได้รับ dictionary สถิติของโมเดลนั้น (ชื่อ, เวลาโหลด, หน่วยความจำ)
+    """
+    with _registry_lock:
+        _stats_hooks.append(callback)
+
+
+def get_model_stats():
+    """คืนค่าสำเนาสถิติของทุกโมเดลที่เคยโหลดใน process นี้ (รวมสถิติการรันของ FallbackInferenceEngine)"""
+    with _registry_lock:
+        stats = {name: dict(model_stats) for name, model_stats in _model_stats.items()}
+        for name, loaded in _pipelines.items():
+            if hasattr(loaded, 'get_stats'):
+                stats[name]['inference'] = loaded.get_stats()
+        return stats
+
+
+def _load_once(key, loader):
+    """
+    โหลดออบเจกต์ของโมเดลด้วย loader() ครั้งเดียวต่อ key และใช้ร่วมกันทั้ง process
+    เรียกพร้อมกันหลาย request ได้อย่างปลอดภัย พร้อมบันทึกเวลาโหลด/หน่วยความจำลง get_model_stats()
+    """
+    loaded = _pipelines.get(key)
+    if loaded is not None:
+        return loaded
+
+    with _registry_lock:
+        model_lock = _model_locks.setdefault(key, threading.Lock())
+
+    # ล็อกแยกต่อโมเดล: request อื่นจะรอโมเดลตัวเดียวกันโหลดเสร็จ แทนที่จะโหลดซ้ำ
+    with model_lock:
+        loaded = _pipelines.get(key)
+        if loaded is not None:
+            return loaded
+
+        print(f"Registry: Loading sentiment model '{key}'...")
+        rss_before = _current_rss_mb()
+        started = time.perf_counter()
+        loaded = loader()
+        load_seconds = time.perf_counter() - started
+        rss_after = _current_rss_mb()
+
+        stats = {
+            'model': key,
+            'load_seconds': round(load_seconds, 3),
+            'rss_before_mb': round(rss_before, 1) if rss_before is not None else None,
+            'rss_after_mb': round(rss_after, 1) if rss_after is not None else None,
+            'rss_delta_mb': round(rss_after - rss_before, 1) if None not in (rss_before, rss_after) else None,
+            'loaded_at': int(time.time()),
+        }
+        with _registry_lock:
+            _pipelines[key] = loaded
+            _model_stats[key] = stats
+            hooks = list(_stats_hooks)
+        print(f"Registry: Model loaded in {stats['load_seconds']}s (RSS delta: {stats['rss_delta_mb']} MB)")
+
+    for hook in hooks:
+        try:
+            hook(dict(stats))
+        except Exception as e:
+            print(f"Registry: Stats hook failed: {e}")
+    return loaded
+
+
+def get_sentiment_pipeline(model_name=SENTIMENT_MODEL_NAME):
+    """
+    คืนค่า pipeline วิเคราะห์ความรู้สึกที่ใช้ร่วมกันทั้ง process
+    โหลดครั้งแรกเมื่อถูกเรียก (lazy) และเรียกพร้อมกันหลาย request ได้อย่างปลอดภัย
+    """
+    def load():
+        from transformers import pipeline
+        return pipeline("sentiment-analysis", model=model_name)
+
+    return _load_once(model_name, load)
+
+
+def register_pipeline(pipeline, model_name=SENTIMENT_MODEL_NAME):
+    """ใช้ pipeline ที่สร้างไว้แล้วแทนการโหลดจาก transformers (เช่น pipeline ปลอมใน benchmark)"""
+    return _load_once(model_name, lambda: pipeline)
+
+
+def get_fallback_backend():
+    """
+    backend ของโมเดลสำรองจาก FALLBACK_BACKEND: 'pipeline' (ค่าเริ่มต้น, transformers pipeline แบบเดิม)
+    หรือ FallbackInferenceEngine แบบ 'torch', 'quantized', 'onnx' (ต้องเปิดเอง จนกว่าจะมีผลวัดบนเครื่องจริง)
+    """
+    return (os.environ.get('FALLBACK_BACKEND') or 'pipeline').strip().lower()
+
+
+def get_inference_engine(model_name=SENTIMENT_MODEL_NAME, backend=None):
+    """คืนค่า FallbackInferenceEngine ที่ใช้ร่วมกันทั้ง process (หนึ่งตัวต่อโมเดลต่อ backend)"""
+    backend = backend or get_fallback_backend()
+
+    def load():
+        from fallback_inference import FallbackInferenceEngine
+        return FallbackInferenceEngine(model_name, backend=backend)
+
+    return _load_once(f"{model_name}#{backend}", load)
+
+
+def predict_labels(titles, model_name=SENTIMENT_MODEL_NAME, use_cache=True):
+    """
+    วิเคราะห์หัวข้อข่าวด้วยโมเดลสำรอง และคืนค่า label ตัวพิมพ์ใหญ่ตามลำดับ titles
+    หัวข้อที่เคยวิเคราะห์แล้วจะดึงจาก SentimentCache แทนการรันโมเดลซ้ำ
+    """
+    if not titles:
+        return []
+    backend = get_fallback_backend()
+
+    def run_model(batch_titles):
+        if backend == 'pipeline':
+            sentiment_analyzer = get_sentiment_pipeline(model_name)
+            return [result['label'].upper() for result in sentiment_analyzer(batch_titles)]
+        return get_inference_engine(model_name, backend).predict(batch_titles)
+
+    if not use_cache:
+        return run_model(list(titles))
+    return classify_with_cache(list(titles), run_model, _cache_model_name(model_name, backend), 'raw')
+
+
+def predict_scored(titles, model_name=SENTIMENT_MODEL_NAME, use_cache=True):
+    """
+    เหมือน predict_labels แต่คืนค่า list ของ (label, score) โดย score คือความน่าจะเป็นของ label นั้น (0-1)
+    ใช้กับ sentiment_cascade เพื่อเลือกว่าข่าวไหนมั่นใจพอ และข่าวไหนต้องส่งต่อให้ Gemini
+    """
+    if not titles:
+        return []
+    backend = get_fallback_backend()
+
+    def run_model(batch_titles):
+        if backend == 'pipeline':
+            sentiment_analyzer = get_sentiment_pipeline(model_name)
+            scored = [(result['label'].upper(), float(result['score'])) for result in sentiment_analyzer(batch_titles)]
+        else:
+            scored = get_inference_engine(model_name, backend).predict_scored(batch_titles)
+        # SentimentCache เก็บค่าเป็นข้อความ จึงเก็บเป็น "LABEL|score"
+        return [f"{label}|{score:.4f}" for label, score in scored]
+
+    if use_cache:
+        values = classify_with_cache(list(titles), run_model, _cache_model_name(model_name, backend), 'scored')
+    else:
+        values = run_model(list(titles))
+    results = []
+    for value in values:
+        label, _, score = value.partition('|')
+        results.append((label, float(score)))
+    return results
+
+
+def _cache_model_name(model_name, backend):
+    # โมเดล int8/ONNX อาจให้ผลต่างจากโมเดลเดิมเล็กน้อย จึงแยกแคชตาม backend
+    return model_name if backend in ('pipeline', 'torch') else f"{model_name}#{backend}"
+
+
+def warm_up_if_enabled(model_name=SENTIMENT_MODEL_NAME):
+    """
+    โหลดโมเดลล่วงหน้าตอนเริ่มระบบ เมื่อตั้งค่า WARM_SENTIMENT_MODEL=1 เท่านั้น
+    ค่าเริ่มต้นคือไม่โหลด เพื่อไม่ให้ worker ที่ไม่เคยใช้แผนสำรองเสียหน่วยความจำ
+    """
+    if os.environ.get('WARM_SENTIMENT_MODEL', '').strip().lower() not in ('1', 'true', 'yes'):
+        return False
+    try:
+        if get_fallback_backend() == 'pipeline':
+            get_sentiment_pipeline(model_name)
+        else:
+            get_inference_engine(model_name)
+        return True
+    except Exception as e:
+        print(f"Registry: Warm-up failed ({e}), model will be loaded on first use.")
+        return False
@@ -0,0 +1,192 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from circuit_breaker import CircuitOpenError, get_breaker
+from ttl_cache import TTLCache
+
+# ==============================================================================
+# ตัวเชื่อมต่อ NewsAPI ที่ใช้ร่วมกันทั้งสอง engine
+# (connection pool, timeout, แคชรายหน้าแบบสั้น และดึงทีละหน้าตามงบจำนวนข่าว)
+# ทุก request ผ่าน circuit breaker 'newsapi' เมื่อวงจรเปิดจะใช้ข้อมูลในแคช (แม้หมดอายุ) แทนการรอ timeout
+# ==============================================================================
+DEFAULT_BASE_URL = 'https://newsapi.org/v2'
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_ARTICLES = 100
+DEFAULT_CACHE_TTL = 120
+DEFAULT_POOL_SIZE = 10
+
+
+class NewsApiError(Exception):
+    """NewsAPI ตอบกลับเป็น error (status != 'ok') หรือเชื่อมต่อไม่ได้"""
+
+    def __init__(self, message, code=None, status_code=None):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class NewsApiClient:
+    """
+    ไคลเอนต์ NewsAPI แบบใช้ requests.Session เดียว (reuse การเชื่อมต่อ TLS)
+    ทุก request มี connect/read timeout และผลลัพธ์แต่ละหน้าถูกแคชไว้ตาม keyword
+    เมื่อแคชหมดอายุจะส่ง If-None-Match / If-Modified-Since ไปตรวจก่อน ถ้าได้ 304 ก็ใช้ข้อมูลเดิม
+    """
+
+    def __init__(self, api_key, base_url=None, connect_timeout=None, read_timeout=None,
+                 page_size=None, max_articles=None, cache_ttl=None, session=None, breaker=None):
+        self.api_key = api_key
+        self.base_url = (base_url or os.environ.get('NEWS_API_BASE_URL', DEFAULT_BASE_URL)).rstrip('/')
+        self.timeout = (
+            connect_timeout or _env_float('NEWS_API_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            read_timeout or _env_float('NEWS_API_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        )
+        self.page_size = int(page_size or _env_float('NEWS_API_PAGE_SIZE', DEFAULT_PAGE_SIZE))
+        self.max_articles = int(max_articles or _env_float('NEWS_API_MAX_ARTICLES', DEFAULT_MAX_ARTICLES))
+        self.cache = TTLCache(maxsize=512, ttl=cache_ttl or _env_float('NEWS_API_CACHE_TTL', DEFAULT_CACHE_TTL))
+        self.stats = {'requests': 0, 'cache_hits': 0, 'not_modified': 0, 'errors': 0,
+                      'stale_served': 0, 'short_circuited': 0}
+        self._stats_lock = threading.Lock()
+        self.session = session or self._build_session()
+        self.breaker = breaker or get_breaker('newsapi')
+
+    @staticmethod
+    def _build_session():
+        pool_size = int(_env_float('NEWS_API_POOL_SIZE', DEFAULT_POOL_SIZE))
+        retry = Retry(total=2, connect=2, read=0, backoff_factor=0.3,
+                      status_forcelist=(502, 503, 504), allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get_page(self, keyword, page=1, language='th', sort_by='publishedAt'):
+        """ดึงข่าว 1 หน้า (คืนค่า dict JSON จาก NewsAPI) โดยใช้แคชถ้ายังไม่หมดอายุ"""
+        params = {'q': keyword, 'language': language, 'sortBy': sort_by,
+                  'page': page, 'pageSize': self.page_size}
+        cache_key = tuple(sorted(params.items()))
+
+        cached = self.cache.get_entry(cache_key)
+        headers = {'X-Api-Key': self.api_key or ''}
+        if cached is not None:
+            (payload, validators), age = cached
+            if age <= self.cache.ttl:
+                self._count('cache_hits')
+                return payload
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        try:
+            token = self.breaker.before_call()
+        except CircuitOpenError as e:
+            if cached is not None:
+                self._count('stale_served')
+                return cached[0][0]
+            self._count('short_circuited')
+            raise NewsApiError(str(e)) from e
+
+        self._count('requests')
+        try:
+            response = self.session.get(f"{self.base_url}/everything", params=params,
+                                        headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            self._count('errors')
+            self.breaker.record(token, False, e)
+            raise NewsApiError(f"Connection error: {e}") from e
+        # 4xx อื่นๆ (เช่น keyword ไม่ถูกต้อง) เป็นปัญหาของคำขอ ไม่ใช่ NewsAPI ล่ม
+        healthy = response.status_code < 500 and response.status_code != 429
+        self.breaker.record(token, healthy, None if healthy else f"HTTP {response.status_code}")
+
+        if response.status_code == 304 and cached is not None:
+            self._count('not_modified')
+            payload, validators = cached[0]
+            self.cache.set(cache_key, (payload, validators))
+            return payload
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            self._count('errors')
+            raise NewsApiError(f"Invalid JSON from NewsAPI (HTTP {response.status_code})",
+                               status_code=response.status_code) from e
+
+        if data.get('status') != 'ok':
+            self._count('errors')
+            raise NewsApiError(data.get('message') or f"HTTP {response.status_code}",
+                               code=data.get('code'), status_code=response.status_code)
+
+        validators = {'etag': response.headers.get('ETag'),
+                      'last_modified': response.headers.get('Last-Modified')}
+        self.cache.set(cache_key, (data, validators))
+        return data
+
+    def iter_articles(self, keyword, language='th', sort_by='publishedAt', max_articles=None):
+        """
+        generator ที่คืนข่าวทีละรายการ และดึงหน้าถัดไปเมื่อจำเป็นเท่านั้น (lazy)
+        หยุดเมื่อครบงบ max_articles, หมดผลลัพธ์ หรือ NewsAPI ไม่ให้ดึงหน้าถัดไป
+        """
+        budget = max_articles or self.max_articles
+        yielded = 0
+        page = 1
+        while yielded < budget:
+            try:
+                data = self.get_page(keyword, page=page, language=language, sort_by=sort_by)
+            except NewsApiError as e:
+                if page == 1:
+                    raise
+                # เช่น maximumResultsReached ของแพ็กเกจฟรี: คืนเท่าที่ได้มาแล้ว
+                print(f"NewsClient: Stopped paging at page {page}: {e}")
+                return
+
+            articles = data.get('articles') or []
+            for article in articles:
+                if yielded >= budget:
+                    return
+                yielded += 1
+                yield article
+
+            total_results = data.get('totalResults') or 0
+            if len(articles) < self.page_size or page * self.page_size >= total_results:
+                return
+            page += 1
+
+    def fetch_articles(self, keyword, language='th', sort_by='publishedAt', max_articles=None):
+        return list(self.iter_articles(keyword, language=language, sort_by=sort_by, max_articles=max_articles))
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['cache'] = self.cache.get_stats()
+        return stats
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_default_client(api_key):
+    """คืนค่า NewsApiClient ที่ใช้ร่วมกันทั้ง process (1 ตัวต่อ API key)"""
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = NewsApiClient(api_key)
+        return client
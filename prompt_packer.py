@@ -0,0 +1,117 @@
+import os
+import threading
+from collections import deque
+
+from rolling_stats import percentiles_ms
+
+# ==============================================================================
+# แบ่งหัวข้อข่าวเป็น batch ตามงบ token ต่อ request (แทนจำนวนข่าวคงที่ต่อ batch)
+# - ประมาณ token จากจำนวนตัวอักษร (ASCII ~4 ตัวต่อ token, ภาษาไทย/อื่นๆ ~2.5 ตัวต่อ token)
+# - เติมข่าวลงแต่ละ request จนเกิน GEMINI_BATCH_TOKEN_BUDGET (นับทั้ง prompt และคำตอบที่คาดไว้)
+# - บันทึกจำนวน batch, token ต่อ batch (ที่ประมาณ/ที่ Gemini รายงาน) และ latency ต่อ batch
+# ==============================================================================
+DEFAULT_TOKEN_BUDGET = 2000
+DEFAULT_MAX_ITEMS = 80
+ASCII_CHARS_PER_TOKEN = 4.0
+OTHER_CHARS_PER_TOKEN = 2.5
+# "12. " หน้าหัวข้อข่าว + ขึ้นบรรทัดใหม่
+LINE_OVERHEAD_TOKENS = 3
+# {"i":12,"s":"NEGATIVE"}, ในคำตอบต่อหนึ่งข่าว
+OUTPUT_TOKENS_PER_ITEM = 10
+MAX_SAMPLES = 500
+
+
+def _env_number(name, default, cast=int):
+    value = os.environ.get(name)
+    return cast(value) if value else default
+
+
+def estimate_tokens(text, scale=None):
+    """
+    ประมาณจำนวน token แบบไม่ต้องเรียก API (count_tokens เป็น network call)
+    scale มาจาก GEMINI_TOKEN_ESTIMATE_SCALE ตั้งเป็นค่า actual_to_estimate ใน get_stats() เพื่อปรับให้ตรงขึ้น
+    """
+    scale = scale if scale is not None else _env_number('GEMINI_TOKEN_ESTIMATE_SCALE', 1.0, float)
+    ascii_chars = sum(1 for char in text if char < '\x80')
+    other_chars = len(text) - ascii_chars
+    return max(1, round((ascii_chars / ASCII_CHARS_PER_TOKEN + other_chars / OTHER_CHARS_PER_TOKEN) * scale))
+
+
+class PromptPacker:
+    """
+    pack(titles, overhead_tokens) คืนค่า list ของ batch (list ของ index ใน titles) ตามลำดับเดิม
+    แต่ละ batch มี token (overhead + หัวข้อข่าว + คำตอบที่คาดไว้) ไม่เกิน token_budget และข่าวไม่เกิน max_items
+    หัวข้อข่าวที่ยาวเกินงบเพียงข่าวเดียวจะได้ batch ของตัวเอง
+    """
+
+    def __init__(self, token_budget=None, max_items=None):
+        self.token_budget = token_budget or _env_number('GEMINI_BATCH_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)
+        self.max_items = max_items or _env_number('GEMINI_BATCH_MAX_ITEMS', DEFAULT_MAX_ITEMS)
+        self.stats = {'requests': 0, 'items': 0, 'estimated_tokens': 0, 'prompt_tokens': 0,
+                      'output_tokens': 0, 'reported_estimated_tokens': 0}
+        self._latencies = deque(maxlen=MAX_SAMPLES)
+        self._batch_tokens = deque(maxlen=MAX_SAMPLES)
+        self._batch_items = deque(maxlen=MAX_SAMPLES)
+        self._lock = threading.Lock()
+
+    def item_tokens(self, title):
+        return estimate_tokens(title) + LINE_OVERHEAD_TOKENS + OUTPUT_TOKENS_PER_ITEM
+
+    def pack(self, titles, overhead_tokens):
+        batches, current, used = [], [], overhead_tokens
+        for index, title in enumerate(titles):
+            cost = self.item_tokens(title)
+            if current and (used + cost > self.token_budget or len(current) >= self.max_items):
+                batches.append(current)
+                current, used = [], overhead_tokens
+            current.append(index)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def record(self, items, estimated_tokens, seconds, usage=None):
+        """บันทึกผลของ request หนึ่งครั้ง usage คือ response.usage_metadata ของ Gemini (ถ้ามี)"""
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['items'] += items
+            self.stats['estimated_tokens'] += estimated_tokens
+            if prompt_tokens:
+                self.stats['prompt_tokens'] += prompt_tokens
+                self.stats['output_tokens'] += output_tokens
+                self.stats['reported_estimated_tokens'] += estimated_tokens
+            self._latencies.append(seconds)
+            self._batch_tokens.append(prompt_tokens + output_tokens or estimated_tokens)
+            self._batch_items.append(items)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = list(self._latencies)
+            batch_tokens = list(self._batch_tokens)
+            batch_items = list(self._batch_items)
+        stats['token_budget'] = self.token_budget
+        stats['max_items'] = self.max_items
+        stats['p50_ms'], stats['p95_ms'] = percentiles_ms(latencies)
+        stats['avg_items_per_batch'] = round(sum(batch_items) / len(batch_items), 1) if batch_items else None
+        stats['avg_tokens_per_batch'] = round(sum(batch_tokens) / len(batch_tokens)) if batch_tokens else None
+        stats['max_tokens_per_batch'] = max(batch_tokens) if batch_tokens else None
+        # token จริง (prompt + คำตอบ) ต่อ token ที่ประมาณไว้ ใช้ตั้ง GEMINI_TOKEN_ESTIMATE_SCALE
+        if stats['reported_estimated_tokens']:
+            actual = stats['prompt_tokens'] + stats['output_tokens']
+            stats['actual_to_estimate'] = round(actual / stats['reported_estimated_tokens'], 3)
+        return stats
+
+
+_default_packer = None
+_default_packer_lock = threading.Lock()
+
+
+def get_default_packer():
+    global _default_packer
+    with _default_packer_lock:
+        if _default_packer is None:
+            _default_packer = PromptPacker()
+        return _default_packer
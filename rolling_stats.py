@@ -0,0 +1,79 @@
+import math
+
+# ==============================================================================
+# สถิติสะสม (count, sum, sum of squares) สำหรับคำนวณค่าเฉลี่ย/ส่วนเบี่ยงเบนมาตรฐาน
+# ใช้ทั้งกับ rollup รายชั่วโมง/รายวันใน history.db และการตรวจจับความผิดปกติ
+# percentiles_ms ใช้สรุป latency (p50/p95) ในหน้าสถิติต่างๆ
+# ==============================================================================
+
+
+class RunningStats:
+    """
+    เก็บเฉพาะ count, total และ total_sq จึงอัปเดตได้ใน O(1) และรวมหลายช่วงเวลาเข้าด้วยกันได้
+    std ใช้สูตร sample standard deviation (ddof=1) ให้ตรงกับ pandas
+    """
+
+    __slots__ = ('count', 'total', 'total_sq')
+
+    def __init__(self, count=0, total=0.0, total_sq=0.0):
+        self.count = count
+        self.total = total
+        self.total_sq = total_sq
+
+    @classmethod
+    def from_values(cls, values):
+        stats = cls()
+        for value in values:
+            stats.add(value)
+        return stats
+
+    def add(self, value, weight=1):
+        self.count += weight
+        self.total += value * weight
+        self.total_sq += value * value * weight
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        return self
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def variance(self):
+        if self.count < 2:
+            return None
+        # ป้องกันค่าติดลบเล็กน้อยจาก floating point
+        return max(0.0, (self.total_sq - self.total * self.total / self.count) / (self.count - 1))
+
+    @property
+    def std(self):
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+    def zscore(self, value):
+        std = self.std
+        if std is None or std == 0:
+            return None
+        return (value - self.mean) / std
+
+    def threshold(self, sigmas=2):
+        """เกณฑ์แจ้งเตือนแบบ mean + sigmas * std"""
+        if self.std is None:
+            return None
+        return self.mean + sigmas * self.std
+
+    def as_dict(self):
+        return {'count': self.count, 'mean': self.mean, 'std': self.std}
+
+
+def percentiles_ms(samples):
+    """คืนค่า (p50, p95) หน่วยมิลลิวินาทีของเวลาเป็นวินาที หรือ (None, None) ถ้ายังไม่มีข้อมูล"""
+    if not samples:
+        return None, None
+    samples = sorted(samples)
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return round(samples[len(samples) // 2] * 1000, 1), round(p95 * 1000, 1)
@@ -0,0 +1,223 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+# ==============================================================================
+# แคชผลวิเคราะห์ความรู้สึกรายหัวข้อข่าว (เก็บเป็นไฟล์ SQLite ข้าง history.db)
+# ตำแหน่งไฟล์: SENTIMENT_CACHE_PATH, หรือ sentiment_cache.db ข้าง HISTORY_DB_PATH ถ้าตั้งไว้,
+# หรือในโฟลเดอร์ของโค้ด (ไม่ขึ้นกับ working directory ที่สั่งรัน)
+# ==============================================================================
+DEFAULT_CACHE_PATH = 'sentiment_cache.db'
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 50000
+EVICT_EVERY_WRITES = 200
+
+# ท้ายหัวข้อแบบ " - xxx" ตัดออกเฉพาะเมื่อ xxx เป็นชื่อสำนักข่าวที่รู้จัก (หรือตรงกับ source ของข่าวนั้น)
+# ไม่ตัดทุกข้อความสั้นๆ เพราะ "X ล่ม - ลูกค้าโวย" กับ "X ล่ม - แก้ไขแล้ว" เป็นคนละเรื่องกัน
+# เพิ่มชื่อสำนักข่าวได้ด้วย NEWS_SOURCE_NAMES (คั่นด้วย comma)
+KNOWN_SOURCES = (
+    'ไทยรัฐ', 'ไทยรัฐออนไลน์', 'Thairath', 'ข่าวสด', 'Khaosod', 'มติชน', 'มติชนออนไลน์', 'Matichon',
+    'เดลินิวส์', 'Dailynews', 'ประชาชาติธุรกิจ', 'Prachachat', 'กรุงเทพธุรกิจ', 'Bangkok Biz News',
+    'ฐานเศรษฐกิจ', 'Thansettakij', 'ผู้จัดการออนไลน์', 'MGR Online', 'โพสต์ทูเดย์', 'Post Today', 'Bangkok Post',
+    'The Nation', 'Nation TV', 'เนชั่นทีวี', 'Thai PBS', 'ไทยพีบีเอส', 'PPTV', 'PPTV HD 36', 'Amarin TV',
+    'อมรินทร์ทีวี', 'ช่อง 3', 'Ch3 Plus', 'Workpoint', 'เวิร์คพอยท์', 'Sanook', 'Kapook', 'The Standard',
+    'Spring News', 'สปริงนิวส์', 'ข่าวหุ้น', 'Kaohoon', 'ทันหุ้น', 'Brand Inside', 'Positioning', 'Marketeer',
+    'Blognone', 'Techsauce', 'Beartai', 'แบไต๋',
+)
+_SOURCE_SUFFIX = re.compile(r'\s+[-|–]\s+([^-|–]{1,40})$')
+_SOURCE_NOISE = re.compile(r'^www\.|\.(co\.th|in\.th|or\.th|go\.th|com|net|org|tv)$|[\s.]+')
+_PUNCTUATION = re.compile(r'[\"\'“”‘’«»!?.,:;()\[\]{}…]+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def get_cache_path():
+    """
+    SENTIMENT_CACHE_PATH ถ้าตั้งไว้, ไม่เช่นนั้นวางข้าง HISTORY_DB_PATH (ถ้าตั้งไว้)
+    หรือในโฟลเดอร์ของโมดูลนี้ (ค่าเริ่มต้น history.db เป็น path สัมพัทธ์ จึงใช้ระบุตำแหน่งแน่นอนไม่ได้)
+    """
+    path = os.environ.get('SENTIMENT_CACHE_PATH')
+    if path:
+        return path
+    db_path = os.environ.get('HISTORY_DB_PATH')
+    folder = os.path.dirname(os.path.abspath(db_path)) if db_path else os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(folder, DEFAULT_CACHE_PATH)
+
+
+def source_key(name):
+    """ชื่อสำนักข่าวในรูปที่เทียบกันได้ ('Thairath.co.th', 'thairath' และ 'Thai Rath' ได้ค่าเดียวกัน)"""
+    return _SOURCE_NOISE.sub('', unicodedata.normalize('NFC', name or '').lower().strip())
+
+
+_KNOWN_SOURCE_KEYS = frozenset(source_key(name) for name in
+                               KNOWN_SOURCES + tuple(os.environ.get('NEWS_SOURCE_NAMES', '').split(','))) - {''}
+
+
+def strip_source_suffix(text, source=None):
+    """ตัด " - ชื่อสำนักข่าว" ท้ายหัวข้อ เมื่อเป็นสำนักข่าวที่รู้จักหรือตรงกับ source (article['source']['name'])"""
+    match = _SOURCE_SUFFIX.search(text)
+    if match is None:
+        return text
+    key = source_key(match.group(1))
+    if key in _KNOWN_SOURCE_KEYS or (source and key == source_key(source)):
+        return text[:match.start()]
+    return text
+
+
+def normalize_title(title, source=None):
+    """
+    ทำหัวข้อข่าวให้อยู่ในรูปมาตรฐานก่อนนำไปทำ key
+    (Unicode NFC, ตัวพิมพ์เล็ก, ตัดชื่อสำนักข่าวท้ายหัวข้อ, ตัดเครื่องหมายวรรคตอน, ยุบช่องว่าง)
+    """
+    text = unicodedata.normalize('NFC', title or '').lower().strip()
+    text = strip_source_suffix(text, source)
+    text = _PUNCTUATION.sub(' ', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def title_hash(title):
+    return hashlib.sha256(normalize_title(title).encode('utf-8')).hexdigest()[:32]
+
+
+class SentimentCache:
+    """
+    แคชแบบถาวรที่ key คือ hash ของหัวข้อข่าว + ชื่อโมเดล + เวอร์ชัน prompt
+    มีอายุ (TTL) และจำกัดจำนวนรายการ (ลบรายการที่ไม่ได้ใช้นานที่สุดออกก่อน)
+    """
+
+    def __init__(self, path=None, ttl_seconds=None, max_entries=None):
+        self.path = path or get_cache_path()
+        self.ttl_seconds = ttl_seconds or int(os.environ.get('SENTIMENT_CACHE_TTL', DEFAULT_TTL_SECONDS))
+        self.max_entries = max_entries or int(os.environ.get('SENTIMENT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES))
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS sentiment_cache (
+                title_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                sentiment TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                PRIMARY KEY (title_hash, model, prompt_version)
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_sentiment_cache_last_used ON sentiment_cache (last_used_at)')
+        self._conn.commit()
+
+    def get_many(self, titles, model, prompt_version):
+        """คืนค่า dict {title: sentiment} เฉพาะหัวข้อที่อยู่ในแคชและยังไม่หมดอายุ"""
+        hashes = {}
+        for title in titles:
+            hashes.setdefault(title_hash(title), []).append(title)
+        found = {}
+        now = time.time()
+        with self._lock:
+            keys = list(hashes)
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT title_hash, sentiment FROM sentiment_cache "
+                    f"WHERE model = ? AND prompt_version = ? AND created_at >= ? AND title_hash IN ({placeholders})",
+                    (model, prompt_version, now - self.ttl_seconds, *chunk)
+                ).fetchall()
+                for hash_value, sentiment in rows:
+                    for title in hashes[hash_value]:
+                        found[title] = sentiment
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE sentiment_cache SET last_used_at = ? WHERE title_hash = ? AND model = ? AND prompt_version = ?",
+                        [(now, hash_value, model, prompt_version) for hash_value, _ in rows]
+                    )
+            self._conn.commit()
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(titles) - len(found)
+        return found
+
+    def put_many(self, labels, model, prompt_version):
+        """บันทึก dict {title: sentiment} ลงแคช"""
+        if not labels:
+            return
+        now = time.time()
+        rows = {title_hash(title): sentiment for title, sentiment in labels.items()}
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentiment_cache (title_hash, model, prompt_version, sentiment, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(hash_value, model, prompt_version, sentiment, now, now) for hash_value, sentiment in rows.items()]
+            )
+            self.stats['writes'] += len(rows)
+            self._writes_since_evict += len(rows)
+            if self._writes_since_evict >= EVICT_EVERY_WRITES:
+                self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        """ลบรายการที่หมดอายุ แล้วตัดรายการที่ใช้ล่าสุดนานที่สุดออกจนไม่เกิน max_entries"""
+        self._writes_since_evict = 0
+        expired = self._conn.execute("DELETE FROM sentiment_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM sentiment_cache WHERE rowid IN "
+                "(SELECT rowid FROM sentiment_cache ORDER BY last_used_at LIMIT ?)", (overflow,)
+            )
+        self.stats['evictions'] += expired + max(0, overflow)
+
+    def clear(self):
+        """ลบทุกรายการในแคช (เช่น ก่อนวัดเวลาแบบไม่มีแคชใน benchmark)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM sentiment_cache")
+            self._conn.commit()
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = self._conn.execute("SELECT COUNT(*) FROM sentiment_cache").fetchone()[0]
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        return stats
+
+
+def classify_with_cache(titles, classify, model, prompt_version, cache=None):
+    """
+    คืนค่า list ของ sentiment ตามลำดับ titles โดยส่งเฉพาะหัวข้อที่ไม่อยู่ในแคชไปให้ classify
+    classify(titles) ต้องคืน list ที่ยาวเท่ากัน ค่า None หมายถึงวิเคราะห์ไม่สำเร็จ (จะไม่ถูกเก็บลงแคช)
+    """
+    cache = cache or get_default_cache()
+    cached = cache.get_many(titles, model, prompt_version)
+
+    # หัวข้อที่ซ้ำกัน (เช่น ข่าวเดียวกันจากหลายสำนัก) ส่งไปวิเคราะห์ครั้งเดียว
+    misses = {}
+    for title in titles:
+        if title not in cached:
+            misses.setdefault(title_hash(title), title)
+    miss_titles = list(misses.values())
+    if miss_titles:
+        print(f"Cache: {len(titles) - len(miss_titles)} hits, sending {len(miss_titles)} headlines to '{model}'")
+        fresh = dict(zip(miss_titles, classify(miss_titles)))
+        cache.put_many({title: label for title, label in fresh.items() if label is not None}, model, prompt_version)
+        labels_by_hash = {title_hash(title): label for title, label in fresh.items()}
+        for title in titles:
+            if title not in cached:
+                cached[title] = labels_by_hash.get(title_hash(title))
+    return [cached.get(title) for title in titles]
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = SentimentCache()
+        return _default_cache
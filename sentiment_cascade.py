@@ -0,0 +1,122 @@
+import os
+import threading
+
+import model_registry
+from sentiment_rules import apply_sentiment_rules, match_lexicon
+
+# ==============================================================================
+# Cascade router: วิเคราะห์ด้วยโมเดลในเครื่อง + กฎคำศัพท์ก่อน แล้วส่งให้ Gemini เฉพาะข่าวที่ไม่มั่นใจ
+# เปิดด้วย SENTIMENT_CASCADE=1 และปรับเกณฑ์ความมั่นใจด้วย CASCADE_CONFIDENCE (0-1)
+# ดูสัดส่วนที่ตรงกับการใช้ Gemini ล้วน เทียบกับจำนวนครั้งที่ประหยัดได้: python -m benchmarks.cascade
+# ==============================================================================
+DEFAULT_CONFIDENCE = 0.85
+
+_stats = {'headlines': 0, 'local': 0, 'escalated': 0, 'conflicts': 0, 'llm_failed_items': 0}
+_stats_lock = threading.Lock()
+
+
+def is_enabled():
+    return os.environ.get('SENTIMENT_CASCADE', '').strip().lower() in ('1', 'true', 'yes')
+
+
+def get_confidence_threshold():
+    return float(os.environ.get('CASCADE_CONFIDENCE', DEFAULT_CONFIDENCE))
+
+
+def get_cascade_stats():
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['escalation_rate'] = round(stats['escalated'] / stats['headlines'], 3) if stats['headlines'] else 0.0
+    return stats
+
+
+def first_pass(titles):
+    """
+    คืนค่า list ของ (label, confidence, reason) ตามลำดับ titles จากโมเดลในเครื่อง (softmax score) และกฎคำศัพท์
+    - 'agree': คำในพจนานุกรมชี้ทางเดียวกับโมเดล ความไม่แน่นอนของโมเดลลดลงครึ่งหนึ่ง
+    - 'model': ไม่พบคำในพจนานุกรม ใช้ score ของโมเดลตรงๆ
+    - 'conflict': พบทั้งคำบวกและลบ หรือคำในพจนานุกรมขัดกับโมเดล ความมั่นใจเป็น 0 (ส่งให้ Gemini เสมอ)
+    """
+    results = []
+    for title, (label, score) in zip(titles, model_registry.predict_scored(titles)):
+        has_negative, has_positive = match_lexicon(title)
+        polarities = {polarity for polarity, found in (('NEGATIVE', has_negative), ('POSITIVE', has_positive)) if found}
+        if not polarities:
+            results.append((label, score, 'model'))
+        elif polarities == {label}:
+            results.append((label, 1 - (1 - score) / 2, 'agree'))
+        else:
+            results.append((label, 0.0, 'conflict'))
+    return results
+
+
+def classify_with_cascade(articles, classify_llm, threshold=None):
+    """
+    วิเคราะห์ข่าวแบบ cascade คืนค่ารูปแบบเดียวกับ analyze_sentiment_with_gemini
+    classify_llm(articles) ถูกเรียกเฉพาะข่าวที่ความมั่นใจต่ำกว่า threshold
+    ข่าวที่ Gemini วิเคราะห์ไม่สำเร็จ (sentiment เป็น None หรือโยน exception) จะใช้ label ของโมเดลในเครื่อง
+    + กฎคำศัพท์ (เหมือนแผนสำรองเดิม)
+    โมเดลในเครื่องโหลดไม่ได้จะโยน exception ออกไปให้ผู้เรียกใช้ Gemini กับทุกข่าวแทน
+    """
+    if not articles:
+        return []
+    threshold = get_confidence_threshold() if threshold is None else threshold
+    titles = [article['title'] for article in articles]
+    routed = first_pass(titles)
+    sentiments = [label for label, _, _ in routed]
+    uncertain = [index for index, (_, confidence, _) in enumerate(routed) if confidence < threshold]
+    print(f"Cascade: {len(titles) - len(uncertain)}/{len(titles)} headlines labeled locally, "
+          f"{len(uncertain)} sent to Gemini (confidence < {threshold:g}).")
+
+    llm_sentiments = [None] * len(uncertain)
+    if uncertain:
+        try:
+            llm_results = classify_llm([articles[index] for index in uncertain])
+            llm_sentiments = [result['sentiment'] for result in llm_results]
+        except Exception as e:
+            print(f"Warning: Gemini failed in cascade ({e}), using local labels with rules...")
+    failed = 0
+    for index, sentiment in zip(uncertain, llm_sentiments):
+        if sentiment is None:
+            failed += 1
+            sentiment = apply_sentiment_rules(routed[index][0], titles[index])
+        sentiments[index] = sentiment
+
+    with _stats_lock:
+        _stats['headlines'] += len(titles)
+        _stats['local'] += len(titles) - len(uncertain)
+        _stats['escalated'] += len(uncertain)
+        _stats['conflicts'] += sum(reason == 'conflict' for _, _, reason in routed)
+        _stats['llm_failed_items'] += failed
+
+    return [
+        {'title': article['title'], 'url': article['url'], 'sentiment': sentiment}
+        for article, sentiment in zip(articles, sentiments)
+    ]
+
+
+def evaluate_thresholds(reference_labels, routed, thresholds, count_batches):
+    """
+    เทียบ cascade กับการใช้ Gemini ล้วน (reference_labels) ที่แต่ละ threshold จากการรัน first_pass ครั้งเดียว
+    ข่าวที่ถูกส่งต่อถือว่าได้ label เดียวกับ reference (Gemini ตอบเหมือนเดิม)
+    count_batches(indices) คืนจำนวน request ที่ต้องใช้กับข่าวชุดนั้น (เช่น len(plan_batches(...)))
+    คืนค่า list ของ dict: สัดส่วนที่ตรงกัน, สัดส่วนที่ตรงกันเฉพาะข่าวที่ตัดสินในเครื่อง และจำนวนครั้งที่เรียก Gemini
+    """
+    total = len(reference_labels)
+    baseline_calls = count_batches(list(range(total)))
+    rows = []
+    for threshold in thresholds:
+        local = [index for index, (_, confidence, _) in enumerate(routed) if confidence >= threshold]
+        local_set = set(local)
+        local_agree = sum(routed[index][0] == reference_labels[index] for index in local)
+        llm_calls = count_batches([index for index in range(total) if index not in local_set])
+        rows.append({
+            'threshold': threshold,
+            'local_share': round(len(local) / total, 4) if total else 0.0,
+            'agreement': round((total - len(local) + local_agree) / total, 4) if total else 1.0,
+            'local_agreement': round(local_agree / len(local), 4) if local else None,
+            'llm_calls': llm_calls,
+            'baseline_llm_calls': baseline_calls,
+            'calls_saved': round(1 - llm_calls / baseline_calls, 4) if baseline_calls else 0.0,
+        })
+    return rows
@@ -0,0 +1,154 @@
+import re
+import threading
+
+# ==============================================================================
+# ระบบกฎคำศัพท์ (Rule-based) สำหรับแผนสำรอง
+# คอมไพล์พจนานุกรมทั้งหมดเป็น regex เดียวแบบ trie ตั้งแต่ตอน import
+# ==============================================================================
+# --- พจนานุกรมคำศัพท์สำหรับแผนสำรอง ---
+NEGATIVE_KEYWORDS = [
+    "ล่ม", "ร้องเรียน", "ข้อมูลรั่ว", "ตกต่ำ", "วิกฤต", "ปัญหา", "ขัดข้อง", "ฟ้อง", "เสียหาย",
+    "แฉ", "โกง", "ทุจจริต", "ดราม่า", "ร้องทุกข์", "ตกฮวบ", "ขาดทุน", "หนี้สิน", "ล้มละลาย",
+    "ถดถอย", "ซบเซา", "ลดลง", "ต่ำสุด", "ติดลบ", "ย่ำแย่", "หดตัว", "ชะลอตัว", "ผันผวน",
+    "เสี่ยง", "ฟองสบู่", "ฉ้อโกง", "ยักยอก", "ฟอกเงิน", "ผิดนัดชำระ", "ถูกปรับ", "คว่ำบาตร",
+    "ภาษีเพิ่ม", "เงินเฟ้อ", "ว่างงาน", "ห่วย", "แย่", "ไม่ดี", "ช้า", "ล่าช้า", "มีตำหนิ",
+    "ใช้งานไม่ได้", "อันตราย", "ไม่ปลอดภัย", "คุณภาพต่ำ", "ของปลอม", "ไม่ได้มาตรฐาน",
+    "ยกเลิกบริการ", "ปิดปรับปรุง", "ไม่พอใจ", "โวย", "ประท้วง", "เรียกร้อง", "เดือดร้อน",
+    "ถูกหลอก", "เอาเปรียบ", "บริการแย่", "อื้อฉาว", "ข่าวฉาว", "เสื่อมเสีย", "ถูกวิจารณ์",
+    "ตำหนิ", "โจมตี", "ขัดแย้ง", "ถูกสอบสวน", "ดำเนินคดี", "ละเมิด", "ผิดกฎหมาย", "ปกปิด",
+    "ปิดบัง", "ซ่อนเร้น", "ปฏิเสธ", "ปลดออก", "เลิกจ้าง", "ปิดกิจการ", "ยุติ", "ล้มเหลว",
+    "อุปสรรค", "ผลกระทบ", "วุ่นวาย", "กังวล", "น่าเป็นห่วง", "เลวร้าย", "หนัก", "สาหัส",
+    "รุนแรง", "สูญเสีย", "เสียชีวิต", "บาดเจ็บ", "ภัยพิบัติ", "ฉุกเฉิน", "เตือนภัย"
+]
+POSITIVE_KEYWORDS = [
+    "กำไร", "สูงสุด", "เปิดตัว", "สำเร็จ", "รางวัล", "ชื่นชม", "ขยาย", "พัฒนา", "ร่วมมือ",
+    "อันดับ 1", "เติบโต", "สถิติใหม่", "พุ่ง", "ทะยาน", "เพิ่มขึ้น", "ขยายตัว", "แข็งแกร่ง",
+    "มั่นคง", "ผลประกอบการดี", "โบนัส", "ปันผล", "เกินคาด", "ฟื้นตัว", "ตลาดกระทิง",
+    "ลงทุนเพิ่ม", "ซื้อกิจการ", "ระดมทุน", "ยอดเยี่ยม", "ดีเลิศ", "คุณภาพสูง", "นวัตกรรม",
+    "รุ่นใหม่", "ทันสมัย", "สะดวก", "รวดเร็ว", "ปลอดภัย", "ได้มาตรฐาน", "เป็นที่ยอมรับ",
+    "ได้รับความนิยม", "ขายดี", "หมดเกลี้ยง", "พึงพอใจ", "ประทับใจ", "ตอบรับดี", "แห่ซื้อ",
+    "ยอดจองถล่มทลาย", "สนับสนุน", "เชื่อมั่น", "ภักดี", "ภาพลักษณ์ดี", "เป็นผู้นำ",
+    "สร้างชื่อเสียง", "ได้รับการยกย่อง", "ผ่านการรับรอง", "มาตรฐานสากล", "MOU", "พันธมิตร",
+    "วิสัยทัศน์", "บรรลุเป้าหมาย", "ฉลอง", "ครบรอบ", "แต่งตั้ง", "โปรโมท", "เลื่อนตำแหน่ง",
+    "วิสัยทัศน์กว้างไกล", "โอกาส", "อนาคต", "สดใส", "ก้าวหน้า", "ยกระดับ", "ส่งเสริม",
+    "ช่วยเหลือ", "บริจาค", "คืนสู่สังคม", "CSR", "สร้างสรรค์", "ยิ่งใหญ่", "ประสบความสำเร็จ",
+    "น่ายินดี", "ข่าวดี", "ศักยภาพ", "แข็งแกร่ง", "โดดเด่น"
+]
+NEGATION_WORDS = [
+    "ไม่", "มิ", "มิใช่", "หามิได้", "ไม่ใช่", "ไม่มี", "ไร้", "ปราศจาก", "ยังไม่", "ไม่ได้",
+    "ไม่เคย", "ไม่เคยมี", "มิได้", "ปฏิเสธ", "ไม่ยอม", "ไม่ยอมรับ", "คัดค้าน", "ไม่เห็นด้วย",
+    "โต้แย้ง", "ขัดขวาง", "ยับยั้ง", "ขาด", "ขาดแคลน", "ว่างเปล่า", "สูญ", "สิ้น", "หมด",
+    "หมดสิ้น", "สูญสิ้น", "ปราศจากซึ่ง", "หยุด", "ยุติ", "ยกเลิก", "งด", "ละเว้น", "เลิก",
+    "เพิกถอน", "ชะงัก", "ระงับ", "เลื่อน", "ป้องกัน", "หลีกเลี่ยง", "ห้าม", "เว้น", "ปลอดจาก",
+    "พ้นจาก", "ไม่แน่ใจ", "ไม่ชัดเจน", "คลุมเครือ", "น่าสงสัย", "ไม่ยืนยัน", "ไม่ใช่ว่า",
+    "ไม่เชิงว่า", "ไม่ได้หมายความว่า", "ไม่จำเป็นต้อง", "ยากที่จะ", "เป็นไปไม่ได้", "ยังไม่มี",
+    "ไร้วี่แวว", "นอกเหนือจาก", "ยกเว้น", "โดยไม่มี", "โดยปราศจาก"
+]
+
+
+def _trie_pattern(words):
+    """
+    แปลงรายการคำเป็น regex รูป trie เช่น ['ขาด', 'ขาดทุน'] -> 'ขาด(?:ทุน)?'
+    ที่แต่ละตำแหน่ง regex จะเจอคำที่ยาวที่สุดที่ขึ้นต้นตรงนั้นก่อนเสมอ
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def build(node):
+        is_terminal = '' in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if is_terminal:
+            return '(?:' + body + ')?'
+        return body
+
+    return build(trie)
+
+
+class CompiledLexicon:
+    """
+    พจนานุกรมที่คอมไพล์แล้ว: สแกนข้อความรอบเดียวเพื่อหาทุกคำในพจนานุกรม (รวมคำที่ซ้อนทับกัน)
+    และตรวจคำปฏิเสธที่อยู่หน้าคำนั้น ("ไม่" + คำ หรือ "ไม่ " + คำ) ไปพร้อมกัน
+    ให้ผลเหมือนการไล่ตรวจทีละคำแบบเดิมทุกประการ
+    """
+
+    def __init__(self, negative_keywords, positive_keywords, negation_words):
+        self.negative = frozenset(negative_keywords)
+        self.positive = frozenset(positive_keywords)
+        self.negations = frozenset(negation_words)
+        self._negation_lengths = sorted({len(word) for word in self.negations})
+        keywords = self.negative | self.positive
+        self._pattern = re.compile('(' + _trie_pattern(keywords) + ')')
+        # คำที่ขึ้นต้นตำแหน่งเดียวกันกับคำที่ยาวที่สุด ต้องเป็น prefix ของคำนั้นเสมอ
+        self._prefixes = {
+            word: tuple(other for other in keywords if word.startswith(other))
+            for word in keywords
+        }
+
+    def _is_negated_at(self, text, position):
+        for length in self._negation_lengths:
+            if length > position:
+                break
+            if text[position - length:position] in self.negations:
+                return True
+            if (length < position and text[position - 1] == ' '
+                    and text[position - 1 - length:position - 1] in self.negations):
+                return True
+        return False
+
+    def match(self, text):
+        """คืนค่า (พบคำเชิงลบที่ไม่ถูกปฏิเสธ, พบคำเชิงบวกที่ไม่ถูกปฏิเสธ)"""
+        present = set()
+        negated = set()
+        search = self._pattern.search
+        position = 0
+        # ค้นต่อจากตำแหน่งถัดไปของคำที่เจอ (ไม่ใช่ท้ายคำ) เพื่อให้เจอคำที่ซ้อนอยู่ข้างในด้วย
+        while True:
+            found = search(text, position)
+            if found is None:
+                break
+            start = found.start()
+            words = self._prefixes[found.group(1)]
+            present.update(words)
+            if self._is_negated_at(text, start):
+                negated.update(words)
+            position = start + 1
+        valid = present - negated
+        return not valid.isdisjoint(self.negative), not valid.isdisjoint(self.positive)
+
+
+_lexicon = CompiledLexicon(NEGATIVE_KEYWORDS, POSITIVE_KEYWORDS, NEGATION_WORDS)
+_lexicon_lock = threading.Lock()
+
+
+def reload_lexicons(negative_keywords=None, positive_keywords=None, negation_words=None):
+    """คอมไพล์พจนานุกรมใหม่ (เช่น หลังแก้รายการคำ) และสลับมาใช้ทันทีโดยไม่ต้องรีสตาร์ท"""
+    global _lexicon
+    compiled = CompiledLexicon(
+        NEGATIVE_KEYWORDS if negative_keywords is None else negative_keywords,
+        POSITIVE_KEYWORDS if positive_keywords is None else positive_keywords,
+        NEGATION_WORDS if negation_words is None else negation_words,
+    )
+    with _lexicon_lock:
+        _lexicon = compiled
+    return compiled
+
+
+def match_lexicon(text):
+    """คืนค่า (พบคำเชิงลบ, พบคำเชิงบวก) ในหัวข้อข่าว โดยไม่นับคำที่ถูกปฏิเสธ"""
+    return _lexicon.match(text.lower())
+
+
+def apply_sentiment_rules(initial_label, text):
+    has_negative, has_positive = match_lexicon(text)
+    if has_negative:
+        return "NEGATIVE"
+    if initial_label == "NEUTRAL" and has_positive:
+        return "POSITIVE"
+    return initial_label
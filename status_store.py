@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import history_store
+
+# ==============================================================================
+# ที่เก็บสถานะวิกฤตล่าสุด (สำหรับ /api/crisis_status ที่ ESP8266 เรียกเป็นระยะ)
+# - MemoryStatusStore: เก็บใน process เดียว (เหมาะกับ flask run / worker เดียว)
+# - SQLiteStatusStore: เก็บใน SQLite ใช้ร่วมกันได้ทุก worker ของ gunicorn
+# ทั้งสองแบบกำหนดเวลาหมดอายุของ alert ตอนเขียน ฝั่งอ่านจึงไม่ต้องแก้ข้อมูล
+# ==============================================================================
+DEFAULT_ALERT_TTL = 60
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+def status_etag(payload):
+    """ETag ของสถานะ (เปลี่ยนเมื่อข้อมูลที่ส่งให้อุปกรณ์เปลี่ยน รวมถึงตอนที่ alert หมดอายุ)"""
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+class StatusStore:
+    """
+    สถานะรายคำค้นหา (keyword -> status, timestamp, expires_at) และคำค้นหาปัจจุบันที่แสดงบนอุปกรณ์
+    subclass ต้องมี _read_state(keyword), _read_version() และ _write(...)
+    """
+
+    def __init__(self, alert_ttl=None):
+        self.alert_ttl = alert_ttl or int(os.environ.get('ALERT_DURATION_SECONDS', DEFAULT_ALERT_TTL))
+
+    def set_current(self, keyword):
+        """เปลี่ยนคำค้นหาที่แสดงบนอุปกรณ์ทันที (เช่น ตอนผู้ใช้กดค้นหา แม้ยังวิเคราะห์ไม่เสร็จ)"""
+        self._write(keyword, None, None, None, make_current=True)
+
+    def update(self, keyword, status, timestamp=None, make_current=True):
+        """บันทึกผลล่าสุดของ keyword โดย alert จะหมดอายุหลัง alert_ttl วินาที"""
+        timestamp = int(timestamp or time.time())
+        expires_at = timestamp + self.alert_ttl if status == 'alert' else None
+        self._write(keyword, status, timestamp, expires_at, make_current=make_current)
+
+    def get(self, keyword=None, now=None):
+        """
+        คืนค่า {keyword, status, timestamp} ของ keyword ที่ระบุ (หรือคำค้นหาปัจจุบันถ้าไม่ระบุ)
+        alert ที่หมดอายุแล้วจะแสดงเป็น normal โดยไม่ต้องเขียนกลับ
+        """
+        keyword, state = self._read_state(keyword)
+        status, timestamp, expires_at = state or ('normal', 0, None)
+        if expires_at is not None and (now or time.time()) > expires_at:
+            status = 'normal'
+        return {'keyword': keyword, 'status': status or 'normal', 'timestamp': timestamp or 0}
+
+    def _next_expiry(self, keyword, now):
+        _, state = self._read_state(keyword)
+        if state and state[0] == 'alert' and state[2] is not None and state[2] >= now:
+            return state[2] - now
+        return None
+
+    def wait_for_change(self, keyword, etag, timeout):
+        """
+        long-poll: รอจน ETag ของสถานะเปลี่ยนจาก etag หรือครบ timeout วินาที แล้วคืนค่าสถานะล่าสุด
+        ตื่นเองตอนที่ alert หมดอายุด้วย อุปกรณ์จึงเห็นการกลับเป็น normal ตรงเวลา
+        """
+        deadline = time.time() + timeout
+        while True:
+            version = self._read_version()
+            payload = self.get(keyword)
+            now = time.time()
+            if status_etag(payload) != etag or now >= deadline:
+                return payload
+            wait = deadline - now
+            expiry = self._next_expiry(keyword, now)
+            if expiry is not None:
+                wait = min(wait, expiry + 0.05)
+            self._wait(version, wait)
+
+
+    def poll(self, keyword=None, known_etags=(), wait=0):
+        """
+        ตรรกะของ /api/crisis_status: คืนค่า (payload, etag) โดย payload เป็น None ถ้าอุปกรณ์มีข้อมูลล่าสุดอยู่แล้ว (304)
+        known_etags คือ ETag จาก If-None-Match และ wait > 0 คือรอแบบ long-poll
+        """
+        payload = self.get(keyword)
+        etag = status_etag(payload)
+        if wait > 0 and etag in known_etags:
+            payload = self.wait_for_change(keyword, etag, wait)
+            etag = status_etag(payload)
+        if etag in known_etags:
+            return None, etag
+        return payload, etag
+
+
+class MemoryStatusStore(StatusStore):
+
+    def __init__(self, alert_ttl=None):
+        super().__init__(alert_ttl)
+        self._current = None
+        self._states = {}
+        self._version = 0
+        self._changed = threading.Condition()
+
+    def _read_state(self, keyword):
+        with self._changed:
+            keyword = keyword or self._current
+            return keyword, self._states.get(keyword)
+
+    def _read_version(self):
+        with self._changed:
+            return self._version
+
+    def _write(self, keyword, status, timestamp, expires_at, make_current):
+        with self._changed:
+            if status is not None:
+                self._states[keyword] = (status, timestamp, expires_at)
+            now = time.time()
+            for name, (old_status, old_timestamp, old_expires_at) in list(self._states.items()):
+                if old_expires_at is not None and old_expires_at < now:
+                    self._states[name] = ('normal', old_timestamp, None)
+            if make_current:
+                self._current = keyword
+            self._version += 1
+            self._changed.notify_all()
+
+    def _wait(self, version, timeout):
+        with self._changed:
+            if self._version == version:
+                self._changed.wait(timeout)
+
+
+class SQLiteStatusStore(StatusStore):
+    """
+    เก็บสถานะในตาราง crisis_status / crisis_status_meta (อยู่ใน history.db โดยค่าเริ่มต้น)
+    ทุก worker อ่านไฟล์เดียวกันจึงตอบตรงกัน การเขียนแต่ละครั้งเพิ่ม version เพื่อให้ long-poll รู้ว่ามีข้อมูลใหม่
+    การรอข้าม process ใช้การเช็ก version ทุก poll_interval วินาที (อ่านแถวเดียว ถูกมากใน WAL mode)
+    """
+
+    def __init__(self, path=None, alert_ttl=None, poll_interval=None):
+        super().__init__(alert_ttl)
+        self.path = path or os.environ.get('STATUS_DB_PATH') or history_store.get_db_path()
+        self.poll_interval = poll_interval or float(os.environ.get('STATUS_POLL_INTERVAL', DEFAULT_POLL_INTERVAL))
+
+    def _conn(self):
+        return history_store.get_connection(self.path)
+
+    def _read_state(self, keyword):
+        conn = self._conn()
+        if keyword is None:
+            row = conn.execute("SELECT value FROM crisis_status_meta WHERE name = 'current'").fetchone()
+            keyword = row[0] if row else None
+        row = conn.execute(
+            "SELECT status, timestamp, expires_at FROM crisis_status WHERE keyword = ?", (keyword,)
+        ).fetchone()
+        return keyword, row
+
+    def _read_version(self):
+        row = self._conn().execute("SELECT value FROM crisis_status_meta WHERE name = 'version'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _write(self, keyword, status, timestamp, expires_at, make_current):
+        conn = self._conn()
+        with conn:
+            if status is not None:
+                conn.execute(
+                    "INSERT INTO crisis_status (keyword, status, timestamp, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (keyword) DO UPDATE SET status = excluded.status, "
+                    "timestamp = excluded.timestamp, expires_at = excluded.expires_at",
+                    (keyword, status, timestamp, expires_at)
+                )
+            # ล้าง alert ที่หมดอายุแล้วไปพร้อมกับการเขียน ตารางจึงไม่มีสถานะค้าง
+            conn.execute("UPDATE crisis_status SET status = 'normal', expires_at = NULL "
+                         "WHERE expires_at IS NOT NULL AND expires_at < ?", (int(time.time()),))
+            if make_current:
+                conn.execute("INSERT OR REPLACE INTO crisis_status_meta (name, value) VALUES ('current', ?)",
+                             (keyword,))
+            conn.execute("INSERT INTO crisis_status_meta (name, value) VALUES ('version', 1) "
+                         "ON CONFLICT (name) DO UPDATE SET value = value + 1")
+
+    def _wait(self, version, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline and self._read_version() == version:
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.time())))
+
+
+def create_status_store(kind=None):
+    """เลือกที่เก็บตาม STATUS_STORE ('sqlite' ค่าเริ่มต้น หรือ 'memory')"""
+    kind = (kind or os.environ.get('STATUS_STORE', 'sqlite')).lower()
+    if kind == 'memory':
+        return MemoryStatusStore()
+    if kind == 'sqlite':
+        return SQLiteStatusStore()
+    raise ValueError(f"Unknown STATUS_STORE {kind!r}, expected 'sqlite' or 'memory'")
@@ -0,0 +1,276 @@
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import history_store
+
+# ==============================================================================
+# คิวส่งข้อความ Telegram เบื้องหลัง (ผู้เรียกไม่ต้องรอ Telegram ตอบ)
+# - ข้อความถูกเก็บในตาราง notification_outbox ก่อน จึงไม่หายเมื่อรีสตาร์ต และทุก worker ใช้คิวเดียวกัน
+# - alert ของ keyword เดียวกันภายใน coalesce window จะถูกรวมเป็นข้อความเดียว
+# - ส่งผ่าน requests.Session เดียว (มี timeout) ลองใหม่แบบ backoff และเคารพ retry_after เมื่อโดน 429
+# ==============================================================================
+DEFAULT_API_BASE = 'https://api.telegram.org'
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 10
+DEFAULT_COALESCE_WINDOW = 300
+DEFAULT_MAX_ATTEMPTS = 8
+DEFAULT_POLL_INTERVAL = 1.0
+MAX_BACKOFF = 300
+# ข้อความที่ถูกหยิบไปส่งแล้วจะถูกล็อกไว้นานเท่านี้ (ถ้า process ตายระหว่างส่ง worker อื่นจะหยิบต่อได้)
+CLAIM_LEASE = 60
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _retry_after(response):
+    """ดึง retry_after (วินาที) จากคำตอบ 429 ของ Telegram (parameters.retry_after หรือ header Retry-After)"""
+    try:
+        value = response.json().get('parameters', {}).get('retry_after')
+    except ValueError:
+        value = None
+    value = value or response.headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class TelegramNotifier:
+    """
+    notify(text, coalesce_key) บันทึกข้อความลงคิวแล้วคืนค่าทันที ตัวส่งเบื้องหลังจะส่งตามลำดับเวลาที่ถึงกำหนด
+    ข้อความที่มี coalesce_key เดียวกันและยังไม่ถูกส่ง จะถูกแทนด้วยข้อความล่าสุดพร้อมจำนวนที่รวมไว้
+    และหลังส่ง key นั้นไปแล้ว ข้อความถัดไปจะรอจนครบ coalesce_window วินาที
+    """
+
+    def __init__(self, bot_token, chat_id, api_base=None, path=None, coalesce_window=None, max_attempts=None,
+                 connect_timeout=None, read_timeout=None, poll_interval=None, session=None):
+        self.bot_token = bot_token
+        self.chat_id = chat_id
+        self.api_base = (api_base or os.environ.get('TELEGRAM_API_BASE', DEFAULT_API_BASE)).rstrip('/')
+        self.path = path or os.environ.get('NOTIFY_DB_PATH') or history_store.get_db_path()
+        self.coalesce_window = coalesce_window if coalesce_window is not None else \
+            _env_float('TELEGRAM_COALESCE_WINDOW', DEFAULT_COALESCE_WINDOW)
+        self.max_attempts = max_attempts or int(_env_float('TELEGRAM_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS))
+        self.timeout = (
+            connect_timeout or _env_float('TELEGRAM_CONNECT_TIMEOUT', DEFAULT_CONNECT_TIMEOUT),
+            read_timeout or _env_float('TELEGRAM_READ_TIMEOUT', DEFAULT_READ_TIMEOUT),
+        )
+        self.poll_interval = poll_interval or _env_float('TELEGRAM_POLL_INTERVAL', DEFAULT_POLL_INTERVAL)
+        self.session = session or self._build_session()
+        self.stats = {'queued': 0, 'coalesced': 0, 'sent': 0, 'retried': 0, 'rate_limited': 0, 'dropped': 0}
+        self.last_error = None
+        self._stats_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._paused_until = 0.0
+        self._thread = None
+
+    @property
+    def configured(self):
+        return bool(self.bot_token and self.chat_id) and "HERE" not in self.bot_token
+
+    @staticmethod
+    def _build_session():
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def _conn(self):
+        return history_store.get_connection(self.path)
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    # ----- ฝั่งผู้ส่งข้อความ -----
+
+    def notify(self, text, coalesce_key=None, parse_mode='Markdown'):
+        """บันทึกข้อความลงคิว (ไม่รอส่ง) คืนค่า True ถ้าเข้าคิวได้"""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            merged = False
+            if coalesce_key is not None:
+                row = conn.execute(
+                    "SELECT id FROM notification_outbox WHERE coalesce_key = ? AND locked_until <= ? "
+                    "ORDER BY id LIMIT 1", (coalesce_key, now)
+                ).fetchone()
+                if row:
+                    conn.execute("UPDATE notification_outbox SET text = ?, parse_mode = ?, "
+                                 "merged_count = merged_count + 1 WHERE id = ?", (text, parse_mode, row[0]))
+                    merged = True
+            if not merged:
+                conn.execute(
+                    "INSERT INTO notification_outbox (coalesce_key, text, parse_mode, created_at, next_attempt_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (coalesce_key, text, parse_mode, now, self._first_attempt_at(conn, coalesce_key, now))
+                )
+        self._count('coalesced' if merged else 'queued')
+        self._wakeup.set()
+        return True
+
+    def _first_attempt_at(self, conn, coalesce_key, now):
+        """ข้อความแรกของ key ส่งทันที ข้อความถัดไปรอจนครบ coalesce window นับจากครั้งล่าสุดที่ส่ง (หรือกำลังส่ง)"""
+        if coalesce_key is None:
+            return now
+        if conn.execute("SELECT 1 FROM notification_outbox WHERE coalesce_key = ? AND locked_until > ?",
+                        (coalesce_key, now)).fetchone():
+            return now + self.coalesce_window
+        row = conn.execute("SELECT sent_at FROM notification_last_sent WHERE coalesce_key = ?",
+                           (coalesce_key,)).fetchone()
+        return max(now, row[0] + self.coalesce_window) if row else now
+
+    # ----- ตัวส่งเบื้องหลัง -----
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='telegram-notifier', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                pause = self._paused_until - time.time()
+                row = self._claim_due() if pause <= 0 else None
+                if row is None:
+                    self._wakeup.wait(max(0.0, min(self.poll_interval, pause if pause > 0 else self._next_due_in())))
+                    self._wakeup.clear()
+                    continue
+                self._deliver(*row)
+            except Exception as e:
+                print(f"Notifier: Unexpected error: {e}")
+                self._stop.wait(self.poll_interval)
+        history_store.close_connection(self.path)
+
+    def _next_due_in(self):
+        row = self._conn().execute(
+            "SELECT MIN(MAX(next_attempt_at, locked_until)) FROM notification_outbox").fetchone()
+        return row[0] - time.time() if row and row[0] is not None else self.poll_interval
+
+    def _claim_due(self):
+        """หยิบข้อความที่ถึงกำหนดส่ง 1 รายการแล้วล็อกไว้ (UPDATE แบบมีเงื่อนไข ทำให้ worker เดียวได้ไป)"""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            row = conn.execute(
+                "SELECT id, coalesce_key, text, parse_mode, merged_count, attempts FROM notification_outbox "
+                "WHERE next_attempt_at <= ? AND locked_until <= ? ORDER BY next_attempt_at, id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if row is None:
+                return None
+            claimed = conn.execute("UPDATE notification_outbox SET locked_until = ? WHERE id = ? AND locked_until <= ?",
+                                   (now + CLAIM_LEASE, row[0], now)).rowcount
+        return row if claimed else None
+
+    def _message_text(self, coalesce_key, text, merged_count):
+        if merged_count <= 1:
+            return text
+        return (f"{text}\n\n(รวม {merged_count} การแจ้งเตือนของ {coalesce_key} "
+                f"ในช่วง {self.coalesce_window / 60:g} นาที)")
+
+    def _deliver(self, message_id, coalesce_key, text, parse_mode, merged_count, attempts):
+        payload = {'chat_id': self.chat_id, 'text': self._message_text(coalesce_key, text, merged_count)}
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        try:
+            response = self.session.post(f"{self.api_base}/bot{self.bot_token}/sendMessage",
+                                         json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            return self._retry(message_id, attempts, f"connection error: {e}")
+
+        if response.status_code == 200:
+            self._delivered(message_id, coalesce_key, merged_count)
+        elif response.status_code == 429:
+            retry_after = _retry_after(response) or min(MAX_BACKOFF, 2.0 ** attempts)
+            # Telegram จำกัดอัตราทั้งแชต จึงหยุดส่งข้อความอื่นด้วยจนกว่าจะครบเวลา
+            self._paused_until = time.time() + retry_after
+            self._count('rate_limited')
+            self._retry(message_id, attempts, f"429 rate limited, retry after {retry_after:g}s", delay=retry_after)
+        elif response.status_code == 400 and parse_mode and "can't parse entities" in response.text:
+            # Markdown ในข้อความเสีย (เช่น _ หรือ * ในหัวข้อข่าว) ส่งใหม่เป็นข้อความธรรมดา
+            self._retry(message_id, attempts, response.text, delay=0, parse_mode=None)
+        elif response.status_code >= 500:
+            self._retry(message_id, attempts, f"{response.status_code}, {response.text}")
+        else:
+            self._drop(message_id, f"{response.status_code}, {response.text}")
+
+    def _delivered(self, message_id, coalesce_key, merged_count):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM notification_outbox WHERE id = ?", (message_id,))
+            if coalesce_key is not None:
+                conn.execute("INSERT OR REPLACE INTO notification_last_sent (coalesce_key, sent_at) VALUES (?, ?)",
+                             (coalesce_key, time.time()))
+        self._count('sent')
+        print("ส่งการแจ้งเตือนผ่าน Telegram สำเร็จ" + (f" (รวม {merged_count} ข้อความ)" if merged_count > 1 else ""))
+
+    def _retry(self, message_id, attempts, error, delay=None, **updates):
+        attempts += 1
+        self.last_error = error
+        if attempts >= self.max_attempts:
+            return self._drop(message_id, f"{error} (after {attempts} attempts)")
+        if delay is None:
+            # exponential backoff + jitter
+            delay = min(MAX_BACKOFF, 2.0 ** attempts) + random.uniform(0, 1.0)
+        columns = ''.join(f", {name} = ?" for name in updates)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                f"UPDATE notification_outbox SET attempts = ?, next_attempt_at = ?, locked_until = 0, "
+                f"last_error = ?{columns} WHERE id = ?",
+                (attempts, time.time() + delay, error, *updates.values(), message_id)
+            )
+        self._count('retried')
+        print(f"Notifier: Telegram send failed ({error}), retrying in {delay:.1f}s")
+
+    def _drop(self, message_id, error):
+        self.last_error = error
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM notification_outbox WHERE id = ?", (message_id,))
+        self._count('dropped')
+        print(f"Error: ไม่สามารถส่ง Telegram Bot ได้: {error}")
+
+    # ----- สถานะ -----
+
+    def pending_count(self):
+        return self._conn().execute("SELECT COUNT(*) FROM notification_outbox").fetchone()[0]
+
+    def flush(self, timeout=10):
+        """รอจนคิวว่าง (หรือครบ timeout) คืนค่า True ถ้าส่งหมดแล้ว"""
+        deadline = time.time() + timeout
+        while self.pending_count():
+            if time.time() >= deadline:
+                return False
+            self._wakeup.set()
+            time.sleep(0.05)
+        return True
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats.update(pending=self.pending_count(), coalesce_window=self.coalesce_window,
+                     paused_for=round(max(0.0, self._paused_until - time.time()), 1), last_error=self.last_error)
+        return stats
@@ -0,0 +1,55 @@
+import collections
+import os
+import re
+from functools import lru_cache
+
+from pythainlp.corpus import thai_stopwords
+from pythainlp.tokenize import word_tokenize
+
+# ==============================================================================
+# ขั้นตอนประมวลผลข้อความ: ตัดคำหัวข้อข่าวครั้งเดียว แล้วใช้ตารางความถี่ร่วมกัน
+# ทั้ง Word Cloud และประเด็นร้อน (top keywords)
+# ==============================================================================
+TOKEN_CACHE_SIZE = int(os.environ.get('TOKEN_CACHE_SIZE', 4096))
+THAI_WORD = re.compile(r"[ก-๙]+")
+
+# โหลดรายการ stopword ครั้งเดียวตอนเริ่มโปรแกรม (เดิมเรียก thai_stopwords() ทุกครั้งที่สกัดคำ)
+STOPWORDS = frozenset(thai_stopwords())
+
+
+@lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokenize_headline(title):
+    """ตัดคำหัวข้อข่าว 1 รายการด้วย newmm (แคชตามหัวข้อข่าว หัวข้อเดิมจะไม่ถูกตัดคำซ้ำ)"""
+    return tuple(token.strip() for token in word_tokenize(title, engine='newmm') if token.strip())
+
+
+class FrequencyTable:
+    """ความถี่ของคำที่ไม่ใช่ stopword จากหัวข้อข่าวหลายรายการ ใช้ร่วมกันระหว่าง Word Cloud และประเด็นร้อน"""
+
+    def __init__(self, counts):
+        self.counts = counts
+
+    @classmethod
+    def from_headlines(cls, headlines):
+        counts = collections.Counter()
+        for title in headlines:
+            counts.update(token for token in tokenize_headline(title) if token not in STOPWORDS)
+        return cls(counts)
+
+    def __bool__(self):
+        return bool(self.counts)
+
+    def top_keywords(self, limit=5):
+        """คำที่พบบ่อยที่สุด (ไม่นับตัวเลขและคำยาวตัวอักษรเดียว)"""
+        keywords = [word for word, _ in self.counts.most_common()
+                    if not word.isnumeric() and len(word) > 1]
+        return keywords[:limit]
+
+    def wordcloud_frequencies(self):
+        """ความถี่เฉพาะคำภาษาไทย สำหรับ WordCloud.generate_from_frequencies()"""
+        return {word: count for word, count in self.counts.items() if THAI_WORD.fullmatch(word)}
+
+
+def get_token_cache_stats():
+    info = tokenize_headline.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxsize': info.maxsize}
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+# ==============================================================================
+# แคชในหน่วยความจำแบบมีอายุ (TTL) และจำกัดขนาด (LRU) ใช้ร่วมกันหลายโมดูล
+# ==============================================================================
+
+
+class TTLCache:
+    """
+    แคช key -> value ที่ปลอดภัยเมื่อใช้หลาย thread
+    รายการที่เกินอายุจะไม่ถูกคืนจาก get() แต่ยังอ่านผ่าน get_entry() ได้ (ใช้ทำ conditional request)
+    เมื่อจำนวนเกิน maxsize จะลบรายการที่ใช้ล่าสุดนานที่สุดออกก่อน
+    """
+
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_entry(self, key):
+        """คืนค่า (value, age_seconds) แม้รายการจะหมดอายุแล้ว หรือ None ถ้าไม่มี key นี้"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            self._data.move_to_end(key)
+            stored_at, value = entry
+            return value, time.monotonic() - stored_at
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.stats['misses'] += 1
+                return default
+            self._data.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self._data)
+        return stats
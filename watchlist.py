@@ -0,0 +1,253 @@
+import heapq
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import history_store
+from gemini_scheduler import RateLimiter
+
+# ==============================================================================
+# ตัวเฝ้าระวังรายชื่อแบรนด์ (Watchlist Scheduler) ที่ทำงานเบื้องหลังตลอดเวลา
+# ==============================================================================
+DEFAULT_INTERVAL_SECONDS = 900
+DEFAULT_JITTER = 0.1
+DEFAULT_NEWSAPI_RPM = 30
+DEFAULT_WORKERS = 2
+
+
+def _interval_from_env():
+    return float(os.environ.get('WATCHLIST_INTERVAL', DEFAULT_INTERVAL_SECONDS))
+
+
+def _newsapi_rpm_from_env():
+    return int(os.environ.get('WATCHLIST_NEWSAPI_RPM', DEFAULT_NEWSAPI_RPM))
+
+
+def effective_interval(interval, newsapi_rpm, keyword_count):
+    # ถ้าจำนวน keyword ต้องใช้คำขอเกินงบต่อนาที ให้ยืดรอบออกเพื่อคุมค่าใช้จ่ายรวม
+    return max(interval, keyword_count * 60.0 / newsapi_rpm)
+
+
+def normalize_keyword(keyword):
+    """
+    รูปมาตรฐานของ keyword (ยุบช่องว่าง, ตัวพิมพ์ใหญ่) ใช้เป็น key เดียวกันทั้งงานวิเคราะห์ สถานะ และประวัติ
+    "ais" กับ "AIS" จึงเป็น keyword เดียวกัน (NewsAPI ค้นหาแบบไม่สนตัวพิมพ์อยู่แล้ว)
+    """
+    return ' '.join((keyword or '').split()).upper()
+
+
+def parse_keywords(value):
+    """แปลงสตริงคั่นด้วย comma/บรรทัดใหม่ เป็นรายการ keyword (normalize_keyword) ที่ไม่ซ้ำ (คงลำดับเดิม)"""
+    seen = []
+    for keyword in (value or '').replace('\n', ',').split(','):
+        keyword = normalize_keyword(keyword)
+        if keyword and keyword not in seen:
+            seen.append(keyword)
+    return seen
+
+
+class WatchlistScheduler:
+    """
+    ดึงข่าวของทุก keyword ในรายการเป็นรอบๆ โดยกระจายเวลาเริ่มไม่ให้ชนกัน (stagger) และสุ่มเลื่อนเล็กน้อย (jitter)
+    ทุกคำขอไป NewsAPI ใช้งบรวมเดียวกัน (newsapi_rpm) ถ้า keyword เยอะจนเกินงบ รอบของแต่ละ keyword จะยืดออกเอง
+    ส่งเฉพาะข่าวที่ publishedAt ใหม่กว่า high-water mark ของ keyword นั้นไปยัง process(keyword, articles)
+    รอบแรกของ keyword ที่ยังไม่มี high-water mark ข่าวที่ดึงได้เป็นข่าวย้อนหลังทั้งหมด จึงส่งให้ warmup แทน
+    (สร้าง baseline โดยไม่แจ้งเตือน) แล้วตั้ง high-water mark ไว้ รอบถัดไปจึงเริ่มส่งให้ process
+
+    fetch(keyword) -> list ของข่าวดิบจาก NewsAPI (ต้องมี 'publishedAt')
+    process(keyword, new_articles) -> dict สรุปผล (เช่น {'status': 'alert'})
+    warmup(keyword, backlog_articles) -> ไม่บังคับ (ถ้าไม่ระบุจะตั้ง high-water mark อย่างเดียว)
+    """
+
+    def __init__(self, keywords, fetch, process, warmup=None, interval=None, jitter=None, newsapi_rpm=None,
+                 workers=None):
+        self.interval = interval or _interval_from_env()
+        self.jitter = jitter if jitter is not None else float(os.environ.get('WATCHLIST_JITTER', DEFAULT_JITTER))
+        self.newsapi_rpm = newsapi_rpm or _newsapi_rpm_from_env()
+        self.fetch = fetch
+        self.process = process
+        self.warmup = warmup
+        self.rate_limiter = RateLimiter(self.newsapi_rpm)
+        self._executor = ThreadPoolExecutor(max_workers=workers or DEFAULT_WORKERS, thread_name_prefix='watchlist')
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._queue = []
+        self._status = {}
+        # กระจายรอบแรกของแต่ละ keyword ให้ห่างกันเท่าๆ กันตลอด 1 รอบ
+        keywords = list(keywords)
+        for index, keyword in enumerate(keywords):
+            self.add_keyword(keyword, delay=index * self._effective_interval(len(keywords)) / len(keywords))
+
+    # ------------------------------------------------------------------ keywords
+    def add_keyword(self, keyword, delay=None):
+        """
+        เพิ่ม keyword เข้ารายการเฝ้าระวัง รอบแรกจะเริ่มหลัง delay วินาที
+        (ค่าเริ่มต้นคือสุ่มภายใน 1 รอบ เพื่อไม่ให้ชนกับ keyword ที่มีอยู่แล้ว)
+        """
+        if delay is None:
+            delay = random.uniform(0, self.interval)
+        state = history_store.get_watchlist_state(keyword) or {}
+        with self._lock:
+            if keyword in self._status:
+                return False
+            next_run = time.time() + delay
+            self._status[keyword] = {
+                'keyword': keyword,
+                'high_water_mark': state.get('high_water_mark'),
+                'next_run_at': next_run,
+                'last_run_at': state.get('last_run_at'),
+                'last_status': state.get('last_status'),
+                'last_error': None,
+                'last_new_articles': 0,
+                'runs': 0,
+                'running': False,
+            }
+            heapq.heappush(self._queue, (next_run, keyword))
+        self._wakeup.set()
+        return True
+
+    def remove_keyword(self, keyword):
+        with self._lock:
+            return self._status.pop(keyword, None) is not None
+
+    def _effective_interval(self, keyword_count=None):
+        if keyword_count is None:
+            keyword_count = len(self._status)
+        return effective_interval(self.interval, self.newsapi_rpm, keyword_count)
+
+    def _reschedule(self, keyword):
+        interval = self._effective_interval()
+        next_run = time.time() + interval * (1 + random.uniform(-self.jitter, self.jitter))
+        with self._lock:
+            status = self._status.get(keyword)
+            if status is None:
+                return
+            status['next_run_at'] = next_run
+            heapq.heappush(self._queue, (next_run, keyword))
+        self._wakeup.set()
+
+    # ------------------------------------------------------------------ run
+    def run_keyword(self, keyword):
+        """ดึงและประมวลผล keyword 1 รอบ (เรียกตรงได้ เช่น ตอนทดสอบหรือสั่งรันทันที)"""
+        with self._lock:
+            status = self._status.get(keyword)
+            if status is None or status['running']:
+                return None
+            status['running'] = True
+            high_water_mark = status['high_water_mark']
+        summary = None
+        try:
+            self.rate_limiter.acquire()
+            articles = self.fetch(keyword) or []
+            new_articles = [a for a in articles
+                            if a.get('publishedAt') and (high_water_mark is None or a['publishedAt'] > high_water_mark)]
+            if new_articles and high_water_mark is None:
+                if self.warmup:
+                    self.warmup(keyword, new_articles)
+                summary = {'status': 'warmup'}
+                high_water_mark = max(a['publishedAt'] for a in new_articles)
+                print(f"Watchlist: '{keyword}' seeded from {len(new_articles)} backlog articles (no alerts)")
+            elif new_articles:
+                summary = self.process(keyword, new_articles) or {}
+                high_water_mark = max(a['publishedAt'] for a in new_articles)
+            with self._lock:
+                status.update(high_water_mark=high_water_mark, last_error=None, last_new_articles=len(new_articles),
+                              last_status=(summary or {}).get('status', status['last_status']))
+        except Exception as e:
+            print(f"Watchlist: '{keyword}' failed: {e}")
+            with self._lock:
+                status['last_error'] = str(e)
+        finally:
+            with self._lock:
+                status['running'] = False
+                status['runs'] += 1
+                status['last_run_at'] = time.time()
+            self._reschedule(keyword)
+            with self._lock:
+                snapshot = dict(status)
+            history_store.save_watchlist_state(
+                keyword, snapshot['high_water_mark'], snapshot['last_run_at'], snapshot['last_status'],
+                next_run_at=snapshot['next_run_at'], last_error=snapshot['last_error'],
+                last_new_articles=snapshot['last_new_articles'])
+        return summary
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                due = self._queue[0] if self._queue else None
+            wait = None if due is None else due[0] - time.time()
+            if wait is None or wait > 0:
+                self._wakeup.clear()
+                self._wakeup.wait(timeout=wait)
+                continue
+            with self._lock:
+                next_run, keyword = heapq.heappop(self._queue)
+                status = self._status.get(keyword)
+                # รายการที่ถูกลบหรือถูกเลื่อนเวลาไปแล้วจะถูกข้าม
+                if status is None or status['next_run_at'] != next_run:
+                    continue
+            self._executor.submit(self.run_keyword, keyword)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='watchlist-scheduler', daemon=True)
+            self._thread.start()
+            print(f"Watchlist: Monitoring {len(self._status)} keywords every ~{self._effective_interval():.0f}s")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._executor.shutdown(wait=False)
+
+    def get_status(self):
+        with self._lock:
+            keywords = [dict(status) for status in self._status.values()]
+        return {
+            'interval_seconds': self._effective_interval(),
+            'newsapi_rpm': self.newsapi_rpm,
+            'keywords': sorted(keywords, key=lambda status: status['next_run_at']),
+        }
+
+
+def get_watchlist_status(keywords):
+    """
+    สถานะ watchlist จาก history.db (ใช้ได้ทุก worker) แทนสถานะในหน่วยความจำของ scheduler
+    ที่มีอยู่แค่ใน process ที่ถือ acquire_process_lock
+    """
+    keywords = list(keywords)
+    states = history_store.get_watchlist_states(keywords)
+    rows = []
+    for keyword in keywords:
+        state = states.get(keyword) or {}
+        rows.append(dict({field: state.get(field) for field in history_store.WATCHLIST_STATE_FIELDS},
+                         keyword=keyword, last_new_articles=state.get('last_new_articles') or 0))
+    newsapi_rpm = _newsapi_rpm_from_env()
+    return {
+        'interval_seconds': effective_interval(_interval_from_env(), newsapi_rpm, len(keywords)),
+        'newsapi_rpm': newsapi_rpm,
+        # keyword ที่ยังไม่เคยรัน (next_run_at เป็น None) อยู่ท้ายรายการ
+        'keywords': sorted(rows, key=lambda row: (row['next_run_at'] is None, row['next_run_at'] or 0)),
+    }
+
+
+def acquire_process_lock(path='watchlist.lock'):
+    """
+    ล็อกไฟล์เพื่อให้มี scheduler ทำงานแค่ process เดียวต่อเครื่อง (เช่น gunicorn หลาย worker)
+    คืนค่า file object ที่ต้องเก็บไว้ตลอดอายุ process หรือ None ถ้ามี process อื่นถือล็อกอยู่
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return open(path, 'a')
+    handle = open(path, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
@@ -0,0 +1,240 @@
+import hashlib
+import io
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from wordcloud import WordCloud
+
+from ttl_cache import TTLCache
+
+# ==============================================================================
+# การสร้างและเก็บภาพ Word Cloud แบบ content-addressed
+# ชื่อไฟล์มาจาก hash ของความถี่คำ + การตั้งค่าฟอนต์ ข้อความชุดเดิมจึงได้ภาพเดิมโดยไม่ต้องวาดใหม่
+# การวาดทำบน thread แยก และมีตัวเก็บกวาด (janitor) ลบภาพเก่าตามอายุ/จำนวน/ขนาดรวม
+# ==============================================================================
+# กรณีออนไลน์ใช้ WORDCLOUD_FONT_PATH=fonts/Sarabun-Regular.ttf
+DEFAULT_FONT_PATH = 'C:/Windows/Fonts/tahoma.ttf'
+DEFAULT_IMAGE_DIR = 'static/images'
+DEFAULT_MAX_FILES = 500
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 3600
+JANITOR_INTERVAL_SECONDS = 60
+DEFAULT_WAIT_SECONDS = 10
+# ไฟล์ .pending ที่เก่ากว่านี้ถือว่าค้างจาก worker ที่ตายระหว่างวาด (ไม่ต้องรอ)
+PENDING_MARKER_MAX_AGE = 120
+FILE_PREFIX = 'wordcloud_'
+KEY_PATTERN = re.compile(r'[0-9a-f]{20}')
+
+# random_state คงที่ เพื่อให้ความถี่คำชุดเดียวกันวาดออกมาเป็นภาพเดียวกันเสมอ
+RENDER_SETTINGS = {
+    'width': 800,
+    'height': 400,
+    'background_color': 'white',
+    'regexp': r"[ก-๙]+",
+    'random_state': 42,
+}
+
+
+class WordCloudStore:
+    """
+    submit(frequencies) คืนค่า key ทันที (วาดภาพต่อเบื้องหลัง) และ get_png(key) คืนค่า bytes ของภาพ (รอถ้ายังวาดไม่เสร็จ)
+    in_memory=True (WORDCLOUD_IN_MEMORY=1) จะเก็บ PNG ไว้ในหน่วยความจำแทนการเขียนไฟล์
+    (เหมาะกับ worker เดียวหรือดิสก์แบบอ่านอย่างเดียว)
+    """
+
+    def __init__(self, image_dir=None, font_path=None, max_files=None, max_bytes=None, max_age=None,
+                 in_memory=None, workers=1):
+        self.image_dir = image_dir or os.environ.get('WORDCLOUD_IMAGE_DIR', DEFAULT_IMAGE_DIR)
+        self.font_path = font_path or os.environ.get('WORDCLOUD_FONT_PATH', DEFAULT_FONT_PATH)
+        self.max_files = max_files or int(os.environ.get('WORDCLOUD_MAX_FILES', DEFAULT_MAX_FILES))
+        self.max_bytes = max_bytes or int(os.environ.get('WORDCLOUD_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.max_age = max_age or int(os.environ.get('WORDCLOUD_MAX_AGE', DEFAULT_MAX_AGE))
+        if in_memory is None:
+            in_memory = os.environ.get('WORDCLOUD_IN_MEMORY', '0') == '1'
+        self.in_memory = in_memory
+        self._memory = TTLCache(maxsize=self.max_files, ttl=self.max_age)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='wordcloud')
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._last_cleanup = 0.0
+        self.stats = {'renders': 0, 'reused': 0, 'failed': 0, 'deleted': 0, 'render_seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    # ------------------------------------------------------------------ keys
+    def cache_key(self, frequencies):
+        raw = json.dumps([sorted(frequencies.items()), RENDER_SETTINGS, self.font_path],
+                         ensure_ascii=False, sort_keys=True)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+    def image_path(self, key):
+        return os.path.join(self.image_dir, f'{FILE_PREFIX}{key}.png')
+
+    def pending_path(self, key):
+        """ไฟล์บอก worker อื่นว่าภาพนี้กำลังวาดอยู่ (มีเฉพาะระหว่างวาด)"""
+        return self.image_path(key) + '.pending'
+
+    def _is_pending_elsewhere(self, key):
+        try:
+            return time.time() - os.path.getmtime(self.pending_path(key)) < PENDING_MARKER_MAX_AGE
+        except OSError:
+            return False
+
+    # ------------------------------------------------------------------ render
+    def submit(self, frequencies):
+        """
+        เริ่มสร้าง Word Cloud จากความถี่คำ {คำ: จำนวน} คืนค่า key ของภาพ (หรือ None ถ้าไม่มีคำ/ไม่มีฟอนต์)
+        ถ้ามีภาพของความถี่คำชุดนี้อยู่แล้วจะใช้ซ้ำทันที
+        """
+        if not frequencies:
+            return None
+        if not os.path.exists(self.font_path):
+            print(f"Error: ไม่สามารถสร้าง Word Cloud ได้: ไม่พบฟอนต์ {self.font_path}")
+            return None
+        key = self.cache_key(frequencies)
+        with self._lock:
+            if key in self._pending:
+                self._count('reused')
+                return key
+            if self._exists(key):
+                self._count('reused')
+                return key
+            if not self.in_memory:
+                os.makedirs(self.image_dir, exist_ok=True)
+                open(self.pending_path(key), 'w').close()
+            self._pending[key] = self._executor.submit(self._render, key, frequencies)
+        return key
+
+    def _exists(self, key):
+        if self.in_memory:
+            return self._memory.get(key) is not None
+        path = self.image_path(key)
+        if not os.path.exists(path):
+            return False
+        # แตะเวลาแก้ไขไฟล์ เพื่อให้ janitor ลบภาพที่ไม่ได้ใช้นานที่สุดก่อน
+        os.utime(path)
+        return True
+
+    def _render(self, key, frequencies):
+        started = time.perf_counter()
+        try:
+            wordcloud = WordCloud(font_path=self.font_path, **RENDER_SETTINGS).generate_from_frequencies(frequencies)
+            buffer = io.BytesIO()
+            wordcloud.to_image().save(buffer, format='PNG', optimize=True)
+            data = buffer.getvalue()
+            if self.in_memory:
+                self._memory.set(key, data)
+            else:
+                path = self.image_path(key)
+                os.makedirs(self.image_dir, exist_ok=True)
+                # เขียนไฟล์ชั่วคราวแล้วเปลี่ยนชื่อ ผู้อ่านจึงไม่เห็นไฟล์ที่เขียนไม่ครบ
+                temp_path = f'{path}.{threading.get_ident()}.tmp'
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(temp_path, path)
+            self._count('renders')
+            self._count('render_seconds', time.perf_counter() - started)
+            return data
+        except Exception as e:
+            self._count('failed')
+            print(f"Error: ไม่สามารถสร้าง Word Cloud ได้: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+            if not self.in_memory:
+                try:
+                    os.remove(self.pending_path(key))
+                except FileNotFoundError:
+                    pass
+                self.cleanup_if_due()
+
+    def get_png(self, key, timeout=DEFAULT_WAIT_SECONDS):
+        """
+        คืนค่า bytes ของภาพ (รอภาพที่กำลังวาดได้สูงสุด timeout วินาที) หรือ None ถ้าไม่มี
+        รอเฉพาะภาพที่กำลังวาดอยู่จริง (ใน worker นี้ หรือ worker อื่นที่สร้างไฟล์ .pending ไว้)
+        key ที่ไม่มีใครวาดจะคืนค่า None ทันที
+        """
+        if not KEY_PATTERN.fullmatch(key):
+            return None
+        with self._lock:
+            future = self._pending.get(key)
+        if future is not None:
+            try:
+                return future.result(timeout=timeout)
+            except Exception:
+                return None
+        if self.in_memory:
+            return self._memory.get(key)
+        path = self.image_path(key)
+        deadline = time.time() + timeout
+        # worker อื่นกำลังวาดภาพนี้อยู่ รอให้ไฟล์ปรากฏ (เลิกรอถ้าวาดไม่สำเร็จจนไฟล์ .pending หายไป)
+        while not os.path.exists(path):
+            if time.time() >= deadline or not self._is_pending_elsewhere(key):
+                # ไฟล์ .pending ถูกลบหลังภาพเขียนเสร็จ จึงเช็กไฟล์ภาพซ้ำอีกครั้งก่อนเลิกรอ
+                if not os.path.exists(path):
+                    return None
+                break
+            time.sleep(0.1)
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    # ------------------------------------------------------------------ janitor
+    def cleanup_if_due(self):
+        now = time.time()
+        if now - self._last_cleanup < JANITOR_INTERVAL_SECONDS:
+            return 0
+        self._last_cleanup = now
+        return self.cleanup()
+
+    def cleanup(self):
+        """ลบภาพที่เก่ากว่า max_age แล้วลบภาพที่ใช้ล่าสุดนานที่สุดจนเหลือไม่เกิน max_files / max_bytes"""
+        try:
+            names = [name for name in os.listdir(self.image_dir)
+                     if name.startswith(FILE_PREFIX) and name.endswith('.png')]
+        except FileNotFoundError:
+            return 0
+        files = []
+        for name in names:
+            path = os.path.join(self.image_dir, name)
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((info.st_mtime, info.st_size, path))
+        files.sort()
+
+        now = time.time()
+        total_bytes = sum(size for _, size, _ in files)
+        deleted = 0
+        for index, (mtime, size, path) in enumerate(files):
+            remaining = len(files) - index
+            if now - mtime <= self.max_age and remaining <= self.max_files and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            deleted += 1
+        if deleted:
+            self._count('deleted', deleted)
+            print(f"WordCloud: Removed {deleted} old images")
+        return deleted
+
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['pending'] = len(self._pending)
+        stats['in_memory'] = self.in_memory
+        return stats